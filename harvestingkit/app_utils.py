@@ -25,7 +25,9 @@ from harvestingkit.bibrecord import (record_add_field,
                                      create_record,
                                      record_xml_output)
 from harvestingkit.utils import add_nations_field
+from harvestingkit.instrumentation import timed
 from harvestingkit.minidom_utils import (get_value_in_tag,
+                                         parse_front,
                                          xml_to_text)
 from xml.dom.minidom import parse
 
@@ -47,9 +49,15 @@ class APPParser(object):
             print >> sys.stderr, "Can't find doi: %s" % err
         return doi
 
+    @timed('app.get_article')
     def get_article(self, path):
         return parse(open(path))
 
+    @timed('app.get_article_front')
+    def get_article_front(self, path):
+        """Return the article parsed up to the end of its ArticleInfo."""
+        return parse_front(path, ('ArticleInfo',))
+
     def get_title(self, xml):
         try:
             return get_value_in_tag(xml, "ArticleTitle")
@@ -208,6 +216,7 @@ class APPParser(object):
                 references.append((label, authors, doi, issue, page, title, volume, year))
         return references
 
+    @timed('app.get_record')
     def get_record(self, f_path, publisher=None, collection=None, logger=None):
         #path = abspath(join(f_path, pardir))
         xml = self.get_article(f_path)
@@ -28,10 +28,18 @@ from harvestingkit.bibrecord import (
     create_record,
     record_xml_output,
 )
-from harvestingkit.minidom_utils import (get_value_in_tag,
+from harvestingkit.minidom_utils import (get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         get_value_in_tag,
                                          xml_to_text,
                                          get_all_text)
 from harvestingkit.jats_package import JatsPackage
+from harvestingkit.instrumentation import timed
+
+# Elements of a mixed-citation read for a reference
+CITATION_TAGS = ('institution', 'pub-id', 'collab', 'person-group', 'source',
+                 'volume', 'issue', 'page-range', 'year', 'ext-link',
+                 'publisher-name', 'publisher-loc', 'article-title')
 
 
 class ApsPackageXMLError(Exception):
@@ -51,49 +59,51 @@ class ApsPackage(JatsPackage):
         label = get_value_in_tag(ref, 'label')
         label = re.sub('\D', '', label)
         for innerref in ref.getElementsByTagName('mixed-citation'):
+            # The citation is walked once for all its fields
+            elements = get_elements_by_tag_names(innerref, CITATION_TAGS)
             ref_type = innerref.getAttribute('publication-type')
-            institution = get_value_in_tag(innerref, 'institution')
+            institution = get_value_in_elements(elements, 'institution')
             report_no = ''
-            for tag in innerref.getElementsByTagName('pub-id'):
-                if tag.getAttribute('pub-id-type') == 'other':
+            doi = ''
+            arxiv = ''
+            for tag in elements['pub-id']:
+                pub_id_type = tag.getAttribute('pub-id-type')
+                if pub_id_type == 'other':
                     if tag.hasChildNodes():
                         report_no = get_all_text(tag)
-            doi = ''
-            for tag in innerref.getElementsByTagName('pub-id'):
-                if tag.getAttribute('pub-id-type') == 'doi':
+                elif pub_id_type == 'doi':
                     doi = xml_to_text(tag)
-            collaboration = get_value_in_tag(innerref, 'collab')
+                elif pub_id_type == 'arxiv':
+                    if tag.hasChildNodes():
+                        arxiv = get_all_text(tag)
+            collaboration = get_value_in_elements(elements, 'collab')
             authors = []
-            person_groups = innerref.getElementsByTagName('person-group')
-            for author_group in person_groups:
-                if author_group.getAttribute('person-group-type') == 'author':
-                    for author in author_group.getElementsByTagName('string-name'):
-                        if author.hasChildNodes():
-                            authors.append(get_all_text(author))
             editors = []
-            for editor_group in person_groups:
-                if editor_group.getAttribute('person-group-type') == 'editor':
-                    for editor in editor_group.getElementsByTagName('string-name'):
-                        if editor.hasChildNodes():
-                            editors.append(get_all_text(editor))
-            journal = get_value_in_tag(innerref, 'source')
+            for group in elements['person-group']:
+                group_type = group.getAttribute('person-group-type')
+                if group_type == 'author':
+                    names = authors
+                elif group_type == 'editor':
+                    names = editors
+                else:
+                    continue
+                for name in group.getElementsByTagName('string-name'):
+                    if name.hasChildNodes():
+                        names.append(get_all_text(name))
+            journal = get_value_in_elements(elements, 'source')
             journal, volume = fix_journal_name(journal, self.journal_mappings)
-            volume += get_value_in_tag(innerref, 'volume')
+            volume += get_value_in_elements(elements, 'volume')
             if journal == 'J.High Energy Phys.' or journal == 'JHEP':
-                issue = get_value_in_tag(innerref, 'issue')
+                issue = get_value_in_elements(elements, 'issue')
                 volume = volume[2:] + issue
                 journal = 'JHEP'
-            page = get_value_in_tag(innerref, 'page-range')
-            year = get_value_in_tag(innerref, 'year')
-            external_link = get_value_in_tag(innerref, 'ext-link')
-            arxiv = ''
-            for tag in innerref.getElementsByTagName('pub-id'):
-                if tag.getAttribute('pub-id-type') == 'arxiv':
-                    if tag.hasChildNodes():
-                        arxiv = get_all_text(tag)
+            page = get_value_in_elements(elements, 'page-range')
+            year = get_value_in_elements(elements, 'year')
+            external_link = get_value_in_elements(elements, 'ext-link')
             arxiv = format_arxiv_id(arxiv)
-            publisher = get_value_in_tag(innerref, 'publisher-name')
-            publisher_location = get_value_in_tag(innerref, 'publisher-loc')
+            publisher = get_value_in_elements(elements, 'publisher-name')
+            publisher_location = get_value_in_elements(elements,
+                                                       'publisher-loc')
             if publisher_location:
                 publisher = publisher_location + ': ' + publisher
             unstructured_text = []
@@ -116,7 +126,8 @@ class ApsPackage(JatsPackage):
                         else:
                             text = text[:-1]
                     elif text.startswith('Seminar,'):
-                        article_title = get_value_in_tag(innerref, 'article-title')
+                        article_title = get_value_in_elements(
+                            elements, 'article-title')
                         text = institution + " Seminar, \"" + article_title + "\""
                         institution = ''
                     elif text == u'\u201d':
@@ -140,6 +151,7 @@ class ApsPackage(JatsPackage):
                 label, arxiv, publisher, institution, unstructured_text, external_link,\
                 report_no, editors
 
+    @timed('aps.add_references')
     def _add_references(self, rec):
         """ Adds the reference to the record """
         for ref in self.document.getElementsByTagName('ref'):
@@ -210,6 +222,7 @@ class ApsPackage(JatsPackage):
                 else:
                     record_add_field(rec, '999', ind1='C', ind2='5', subfields=subfields)
 
+    @timed('aps.get_record')
     def get_record(self, xml_file):
         """ Reads a xml file in JATS format and returns
             a xml string in marc format """
@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Throughput benchmarks of the publisher parsers and MARCXML converters.
+
+Every target converts the test fixtures ``scale`` times in a process of
+its own, and reports the records converted per second and the peak
+resident memory of that process::
+
+    python -m harvestingkit.benchmarks --scale 200 --output new.json
+    python -m harvestingkit.benchmarks --compare old.json new.json
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import sys
+import copy
+import json
+import time
+import shutil
+import logging
+import platform
+import resource
+import tempfile
+import multiprocessing
+
+from Queue import Empty
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from datetime import datetime
+
+import pkg_resources
+
+TARGETS = OrderedDict()
+
+
+def benchmark(name):
+    """Register a benchmark target.
+
+    The decorated function takes the scale and a scratch folder, and
+    returns a callable running the benchmark and the number of records
+    it converts.
+    """
+    def register(setup):
+        TARGETS[name] = setup
+        return setup
+    return register
+
+
+def get_fixture(name):
+    return pkg_resources.resource_filename('harvestingkit.tests',
+                                           os.path.join('data', name))
+
+
+def repeat(function, scale):
+    """Return a callable running function scale times."""
+    def run():
+        for dummy in xrange(scale):
+            function()
+    return run
+
+
+def get_journal_mappings():
+    from harvestingkit.tests import journal_mappings
+    return journal_mappings
+
+
+def get_springer_layout(folder, fixture, name):
+    """Copy fixture where the Springer parsers expect it, with its PDF."""
+    os.makedirs(os.path.join(folder, 'BodyRef', 'PDF'))
+    open(os.path.join(folder, 'BodyRef', 'PDF', name + '.pdf'), 'w').close()
+    path = os.path.join(folder, name + '_nlm.xml')
+    shutil.copy(get_fixture(fixture), path)
+    return path
+
+
+def get_marcxml_records(fixture):
+    with open(get_fixture(fixture)) as marcxml:
+        return re.findall(r'<record\b.*?</record>', marcxml.read(), re.S)
+
+
+def get_bibrecords(fixture, scale):
+    from harvestingkit.bibrecord import BibRecordPackage
+    package = BibRecordPackage(get_fixture(fixture))
+    package.parse()
+    return [copy.deepcopy(record) for dummy in xrange(scale)
+            for record in package.get_records()]
+
+
+@benchmark('elsevier.consyn')
+def elsevier_consyn(scale, folder):
+    from harvestingkit.elsevier_package import ElsevierPackage
+    package = ElsevierPackage(CONSYN=True,
+                              journal_mappings=get_journal_mappings())
+    path = get_fixture('sample_consyn_record.xml')
+    return repeat(lambda: package.get_record(path, test=True), scale), scale
+
+
+@benchmark('elsevier.scoap3')
+def elsevier_scoap3(scale, folder):
+    from harvestingkit.elsevier_package import ElsevierPackage
+    package = ElsevierPackage(no_harvest=True)
+    package._found_issues = [get_fixture('sample_elsevier_540_issue')]
+    package._build_doi_mapping()
+    path = get_fixture('sample_elsevier_540_document_output.xml')
+    return repeat(lambda: package.get_record(path, test=True, no_pdf=True),
+                  scale), scale
+
+
+@benchmark('aps')
+def aps(scale, folder):
+    from harvestingkit.aps_package import ApsPackage
+    package = ApsPackage(get_journal_mappings())
+    path = get_fixture('sample_aps_record.xml')
+    return repeat(lambda: package.get_record(path), scale), scale
+
+
+@benchmark('world_scientific')
+def world_scientific(scale, folder):
+    from harvestingkit.world_scientific_package import WorldScientific
+    package = WorldScientific(get_journal_mappings())
+    path = get_fixture('sample_ws_record.xml')
+    return repeat(lambda: package.get_record(path), scale), scale
+
+
+@benchmark('edpsciences')
+def edpsciences(scale, folder):
+    from harvestingkit.edpsciences_package import EDPSciencesPackage
+    package = EDPSciencesPackage(get_journal_mappings())
+    path = get_fixture('sample_edpsciences_record.xml')
+    return repeat(lambda: package.get_record(path), scale), scale
+
+
+@benchmark('edpsciences.rich')
+def edpsciences_rich(scale, folder):
+    from harvestingkit.edpsciences_package import EDPSciencesPackage
+    package = EDPSciencesPackage(get_journal_mappings())
+    path = get_fixture('sample_edpsciences_rich_record.xml')
+    return repeat(lambda: package.get_record_rich(path), scale), scale
+
+
+@benchmark('jats')
+def jats(scale, folder):
+    from harvestingkit.jats_utils import JATSParser
+    parser = JATSParser()
+    path = get_springer_layout(folder, 'sample_aps_record.xml', 'article')
+    logger = logging.getLogger('harvestingkit.benchmarks')
+    return repeat(lambda: parser.get_record(path, publisher='Springer',
+                                            collection='SCOAP3',
+                                            logger=logger), scale), scale
+
+
+@benchmark('nlm')
+def nlm(scale, folder):
+    from harvestingkit.nlm_utils import NLMParser
+    parser = NLMParser()
+    path = get_springer_layout(folder, 'sample_aps_record.xml', 'article')
+    logger = logging.getLogger('harvestingkit.benchmarks')
+    return repeat(lambda: parser.get_record(path, publisher='Oxford',
+                                            collection='SCOAP3',
+                                            logger=logger), scale), scale
+
+
+@benchmark('app')
+def app(scale, folder):
+    from harvestingkit.app_utils import APPParser
+    parser = APPParser()
+    path = get_fixture('sample_app_record.xml')
+    return repeat(lambda: parser.get_record(path, publisher='Springer',
+                                            collection='SCOAP3'),
+                  scale), scale
+
+
+@benchmark('pos')
+def pos(scale, folder):
+    from xml.dom.minidom import parse
+    from harvestingkit.pos_package import PosPackage
+    package = PosPackage()
+    document = parse(get_fixture('sample_pos_record.xml'))
+    return repeat(lambda: package.get_record(document), scale), scale
+
+
+@benchmark('inspire2cds')
+def inspire2cds(scale, folder):
+    from harvestingkit.inspire_cds_package.from_inspire import Inspire2CDS
+    records = get_bibrecords('sample_inspire_oai.xml', scale)
+    return lambda: Inspire2CDS.convert_all(records), len(records)
+
+
+@benchmark('cds2inspire')
+def cds2inspire(scale, folder):
+    from harvestingkit.bibrecord import BibRecordPackage
+    from harvestingkit.inspire_cds_package.from_inspire import Inspire2CDS
+    from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+    # The CDS input is the conversion of the INSPIRE fixture
+    package = BibRecordPackage(
+        Inspire2CDS.convert_all(get_bibrecords('sample_inspire_oai.xml', 1)))
+    package.parse()
+    records = [copy.deepcopy(record) for dummy in xrange(scale)
+               for record in package.get_records()]
+    return lambda: CDS2Inspire.convert_all(records), len(records)
+
+
+@benchmark('bibrecord.create_record')
+def bibrecord_create_record(scale, folder):
+    from harvestingkit.bibrecord import create_record
+    records = get_marcxml_records('sample_bibrecord.xml')
+
+    def run():
+        for dummy in xrange(scale):
+            for record in records:
+                create_record(record)
+    return run, len(records) * scale
+
+
+@benchmark('bibrecord.record_xml_output')
+def bibrecord_record_xml_output(scale, folder):
+    from harvestingkit.bibrecord import create_record, record_xml_output
+    records = [create_record(record)[0] for record
+               in get_marcxml_records('sample_bibrecord.xml')]
+
+    def run():
+        for dummy in xrange(scale):
+            for record in records:
+                record_xml_output(record)
+    return run, len(records) * scale
+
+
+@benchmark('minidom_utils.xml_to_text')
+def minidom_utils_xml_to_text(scale, folder):
+    from xml.dom.minidom import parseString
+    from harvestingkit.minidom_utils import xml_to_text
+    # An abstract of 100 paragraphs with 50 nested inline elements each
+    paragraph = ('<p>Decay of the <italic>B<sup>0</sup> meson</italic>'
+                 + '<bold>x <sub>%d</sub>' * 50 + '</bold>' * 50 + '</p>')
+    abstract = parseString('<abstract>%s</abstract>' % (
+        ''.join(paragraph % tuple(range(50)) for dummy in xrange(100)),))
+
+    def run():
+        for dummy in xrange(scale):
+            xml_to_text(abstract)
+            xml_to_text(abstract, delimiter='', tag_to_remove='sub')
+    return run, 2 * scale
+
+
+def run_target(name, scale, queue):
+    """Run a target in the current process and put its result in queue."""
+    # The parsers report on the standard streams, which is not measured
+    devnull = open(os.devnull, 'w')
+    sys.stdout = sys.stderr = devnull
+    folder = tempfile.mkdtemp(prefix='harvestingkit_benchmark_')
+    result = {'name': name, 'scale': scale}
+    try:
+        run, records = TARGETS[name](scale, folder)
+        start = time.time()
+        run()
+        seconds = time.time() - start
+        result.update({
+            'records': records,
+            'seconds': seconds,
+            'records_per_sec': records / seconds if seconds else None,
+        })
+    except Exception as err:
+        result['error'] = repr(err)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    # ru_maxrss is in kilobytes on Linux
+    result['peak_rss_kb'] = resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss
+    queue.put(result)
+
+
+def get_result(name, scale, process, queue):
+    """Return the result of the target run by process.
+
+    A process dying before reporting, e.g. on a segmentation fault or
+    killed when out of memory, gives a result with its exit code as the
+    error.
+    """
+    while True:
+        try:
+            return queue.get(timeout=1)
+        except Empty:
+            if not process.is_alive():
+                break
+    try:
+        # Put right before exiting
+        return queue.get(timeout=1)
+    except Empty:
+        return {'name': name, 'scale': scale,
+                'error': "Exited with code %s" % (process.exitcode,)}
+
+
+def run_benchmarks(names=None, scale=100):
+    """Run the targets, each in a new process, and return the results."""
+    results = []
+    for name in names or TARGETS.keys():
+        if name not in TARGETS:
+            raise KeyError("Unknown benchmark target: %s" % (name,))
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_target,
+                                          args=(name, scale, queue))
+        process.start()
+        results.append(get_result(name, scale, process, queue))
+        process.join()
+    return {
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': scale,
+        'results': results,
+    }
+
+
+def format_results(report):
+    lines = ["%-30s %10s %10s %14s %12s" % ('target', 'records', 'seconds',
+                                            'records/sec', 'peak RSS MB')]
+    for result in report['results']:
+        if 'error' in result:
+            lines.append("%-30s %s" % (result['name'], result['error']))
+            continue
+        lines.append("%-30s %10d %10.3f %14.1f %12.1f" % (
+            result['name'], result['records'], result['seconds'],
+            result['records_per_sec'] or 0, result['peak_rss_kb'] / 1024.0))
+    return "\n".join(lines)
+
+
+def format_comparison(old, new):
+    """Compare the throughput of two reports, target by target."""
+    old_results = dict((result['name'], result)
+                       for result in old['results'] if 'error' not in result)
+    lines = ["%-30s %14s %14s %8s" % ('target', 'old rec/sec',
+                                      'new rec/sec', 'change')]
+    for result in new['results']:
+        previous = old_results.get(result['name'])
+        if 'error' in result or not previous or \
+                not previous['records_per_sec']:
+            continue
+        change = result['records_per_sec'] / previous['records_per_sec'] - 1
+        lines.append("%-30s %14.1f %14.1f %+7.1f%%" % (
+            result['name'], previous['records_per_sec'],
+            result['records_per_sec'], change * 100))
+    return "\n".join(lines)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('targets', nargs='*',
+                        help='targets to run, all by default: %s'
+                        % (', '.join(TARGETS),))
+    parser.add_argument('-n', '--scale', type=int, default=100,
+                        help='number of times each fixture is converted')
+    parser.add_argument('-o', '--output',
+                        help='file to save the results to, as JSON')
+    parser.add_argument('-c', '--compare', nargs=2,
+                        metavar=('OLD', 'NEW'),
+                        help='compare two saved results instead')
+    args = parser.parse_args()
+    if args.compare:
+        with open(args.compare[0]) as old, open(args.compare[1]) as new:
+            print(format_comparison(json.load(old), json.load(new)))
+        return
+    report = run_benchmarks(args.targets, args.scale)
+    print(format_results(report))
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
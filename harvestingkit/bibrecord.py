@@ -41,6 +41,7 @@ from .utils import (
     create_logger,
 )
 from .html_utils import MathMLParser
+from .instrumentation import timed
 from .etree_utils import (
     element_tree_oai_records,
     element_tree_collection_to_records,
@@ -1216,6 +1217,7 @@ def record_get_field_values(rec, tag, ind1=" ", ind2=" ", code="",
     return tmp
 
 
+@timed('bibrecord.record_xml_output')
 def record_xml_output(rec, tags=None, order_fn=None):
     """Generate the XML for record 'rec'.
 
@@ -57,6 +57,55 @@ for loc in CFG_POSSIBLE_CONFIG_PATHS:
 CFG_FTP_CONNECTION_ATTEMPTS = 3
 CFG_FTP_TIMEOUT_SLEEP_DURATION = 2
 
+# Files of a delivered package needed to build the records. The rest of
+# the package (figures, supplementary material) is never extracted.
+CFG_ELSEVIER_PACKAGE_MEMBERS = ['dataset.xml', 'issue.xml', 'main.xml',
+                                'main.pdf', 'main_a-2b.pdf']
+CFG_SPRINGER_PACKAGE_MEMBERS = ['*.xml', '*.xml.scoap', '*.pdf']
+
+# Number of worker processes extracting the delivered packages.
+CFG_EXTRACTION_PROCESSES = 4
+
+# Size of the HTTP connection pools: number of hosts and connections per host.
+CFG_HTTP_POOL_CONNECTIONS = 10
+CFG_HTTP_POOL_MAXSIZE = 10
+
+# Number of figures and plot archives of a record downloaded at once.
+CFG_PLOT_DOWNLOAD_WORKERS = 8
+
+# Springer web crawler: pages fetched at once from a host, and pages
+# requested per second from a host (unlimited when None).
+CFG_SPRINGER_CRAWLER_CONCURRENCY = 4
+CFG_SPRINGER_CRAWLER_RATE = 5
+
+# Number of Hindawi OAI-PMH records looked up in the repository at once.
+CFG_HINDAWI_LOOKUP_BATCH_SIZE = 200
+
+# Number of threads calling refextract at once.
+CFG_REFEXTRACT_WORKERS = 4
+
+# Number of records matched to the database with a single search.
+CFG_MATCH_BATCH_SIZE = 100
+
+# Folder of the on-disk download cache (disabled when empty) and its
+# maximum size in bytes.
+CFG_DOWNLOAD_CACHE_PATH = os.environ.get('HARVESTINGKIT_DOWNLOAD_CACHE', '')
+CFG_DOWNLOAD_CACHE_MAX_SIZE = 2 * 1024 ** 3
+
+# Folder the harvest runs write their metrics to (disabled when empty),
+# in the Prometheus textfile collector format ('prometheus') or as JSON.
+CFG_METRICS_PATH = os.environ.get('HARVESTINGKIT_METRICS_PATH', '')
+CFG_METRICS_FORMAT = os.environ.get('HARVESTINGKIT_METRICS_FORMAT',
+                                    'prometheus')
+
+# Time the stages of the conversions and harvests (see instrumentation.py),
+# always on when the metrics are written.
+CFG_INSTRUMENTATION = bool(os.environ.get('HARVESTINGKIT_PROFILE')
+                           or CFG_METRICS_PATH)
+
+# Write the log records from a background thread, off the conversions.
+CFG_LOGGING_QUEUE = bool(os.environ.get('HARVESTINGKIT_LOGGING_QUEUE'))
+
 
 NATIONS_DEFAULT_MAP = {"Algeria": "Algeria",
                        "Argentina": "Argentina",
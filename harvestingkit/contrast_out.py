@@ -18,14 +18,18 @@
 ## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
 
 import sys
+import json
 import time
 from datetime import datetime
 
 from socket import timeout as socket_timeout_exception
 
-from os import listdir
+from os import (listdir,
+                makedirs)
 from os.path import (join,
-                     walk)
+                     walk,
+                     exists,
+                     basename)
 from tempfile import mkdtemp
 from xml.dom.minidom import parse
 
@@ -55,26 +59,45 @@ except ImportError:
 try:
     from invenio.errorlib import register_exception
 except ImportError:
-    register_exception = lambda a=1, b=2: True
+    register_exception = lambda *args, **kwargs: True
 
 from .ftp_utils import FtpHandler
 from .scoap3utils import (MD5Error,
                           NoNewFiles,
                           LoginException,
                           MissingTagException,
-                          extract_package as scoap3utils_extract_package)
+                          extract_packages)
 from .contrast_out_utils import (contrast_out_cmp,
                                  find_package_name)
-from .minidom_utils import xml_to_text
+from .minidom_utils import (get_elements_by_tag_names,
+                            xml_to_text)
+from .instrumentation import count, timed
+from .metrics import report_metrics
+from .doi_store import DOIStore
+from .harvest_state import (HarvestState,
+                            STATUS_EXTRACTED,
+                            STATUS_FAILED,
+                            file_digest)
 
 from configparser import load_config
 
 from .config import (CFG_CONFIG_PATH,
+                     CFG_ELSEVIER_PACKAGE_MEMBERS,
+                     CFG_EXTRACTION_PROCESSES,
                      CFG_FTP_CONNECTION_ATTEMPTS,
                      CFG_FTP_TIMEOUT_SLEEP_DURATION)
 
 CFG_READY_PACKAGES = join(CFG_CONTRASTOUT_DOWNLOADDIR, "ready_pkgs")
 CFG_TAR_FILES = join(CFG_CONTRASTOUT_DOWNLOADDIR, "tar_files")
+CFG_HARVEST_STATE_DB = join(CFG_CONTRASTOUT_DOWNLOADDIR, "harvest_state.db")
+CFG_DATASET_INDEXES = join(CFG_CONTRASTOUT_DOWNLOADDIR, "dataset_indexes")
+CFG_DOI_STORE_DB = join(CFG_CONTRASTOUT_DOWNLOADDIR, "doi_store.db")
+
+
+def _decode_index(obj):
+    """Return the paths of a saved index as str, as xml_to_text does."""
+    return dict((key, value.encode('utf-8') if isinstance(value, unicode)
+                 else value) for key, value in obj.iteritems())
 
 
 class ContrastOutConnector(object):
@@ -90,6 +113,13 @@ class ContrastOutConnector(object):
         self.path_r_pkg = []
         self.logger = logger
         self.packages_delivery = []
+        self.state = HarvestState(CFG_HARVEST_STATE_DB)
+        # Issue metadata of the DOIs, kept for the later deliveries
+        self.doi_store = DOIStore(CFG_DOI_STORE_DB)
+        # Path of a dataset.xml -> its index, see _get_dataset
+        self._datasets = {}
+        # Name of a package -> folder it was extracted to
+        self.package_dirs = {}
 
         self.config = load_config(CFG_CONFIG_PATH, {'ELSEVIER': []})
 
@@ -123,8 +153,11 @@ class ContrastOutConnector(object):
         else:
             self.files_list = self.ftp.ls()[0]
         if new_only:
-            self.files_list = (set(self.files_list)
-                               - set(listdir(CFG_READY_PACKAGES)))
+            if self.state.is_empty():
+                # First run with the state store: import what was
+                # processed before from the local copies.
+                self.state.seed(listdir(CFG_READY_PACKAGES))
+            self.files_list = self.state.filter_new(self.files_list)
 
         return self.files_list
 
@@ -142,6 +175,7 @@ class ContrastOutConnector(object):
                 self.path_r_pkg.append(pkg_path)
                 try:
                     self.ftp.download(filename, CFG_READY_PACKAGES)
+                    self.state.add_package(filename, pkg_path)
                 except:
                     error_msg = "Error downloading file %s of %s: %s"
                     self.logger.error(error_msg % (i, total_count,
@@ -169,6 +203,7 @@ class ContrastOutConnector(object):
                 package_key = xml_to_text(filename)
                 self.retrieved_packages[package_key] = xml_to_text(md5_val)
 
+        count('packages.seen', len(self.retrieved_packages))
         return self.retrieved_packages
 
     def _download_tars(self, check_integrity=True):
@@ -187,8 +222,11 @@ class ContrastOutConnector(object):
             self.retrieved_packages_unpacked.append(unpack_path)
             try:
                 self.ftp.download(filename, CFG_TAR_FILES)
+                count('packages.downloaded')
                 self.retrieved_packages_unpacked.append(unpack_path)
                 self.packages_delivery.append((filename[0:-4], datetime.now()))
+                self.state.add_package(filename, unpack_path,
+                                       self.retrieved_packages[filename])
             except:
                 register_exception(alert_admin=True,
                                    prefix="Elsevier package download failed.")
@@ -208,6 +246,7 @@ class ContrastOutConnector(object):
                 if our_md5 != md5:
                     raise MD5Error(filename)
             except MD5Error:
+                self.state.set_status(filename, STATUS_FAILED)
                 register_exception(alert_admin=True,
                                    prefix="Elsevier MD5 error.")
                 self.logger.error(("MD5 error: %s\n"
@@ -216,14 +255,40 @@ class ContrastOutConnector(object):
 
     def _extract_packages(self):
         """
-        Extract a package in a new temporary directory.
+        Extract the files of the packages in new directories, in parallel.
+
+        Yields the names of the packages found in each file, i.e. of the
+        folders holding a dataset.xml, as soon as the file is extracted,
+        so that their articles are listed while the others are unpacked.
         """
         self.path_unpacked = mkdtemp(prefix="scoap3_package_",
                                      dir=CFG_TMPSHAREDDIR)
-        for path in self.retrieved_packages_unpacked:
-            scoap3utils_extract_package(path, self.path_unpacked, self.logger)
-
-        return self.path_unpacked
+        # The same file must not be extracted twice concurrently. The
+        # folders are numbered rather than named after the files, as
+        # find_package_name takes the first part of a path naming a package.
+        packages = [(path, join(self.path_unpacked, str(i)))
+                    for i, path in enumerate(
+                        sorted(set(self.retrieved_packages_unpacked)))]
+        extracted = set()
+        for path, dummy, dataset_dirs in extract_packages(
+                packages, self.logger,
+                patterns=CFG_ELSEVIER_PACKAGE_MEMBERS,
+                article_markers=[('dataset.xml',)],
+                processes=CFG_EXTRACTION_PROCESSES):
+            extracted.add(path)
+            self.state.set_status(basename(path), STATUS_EXTRACTED)
+            for dataset_dir in dataset_dirs:
+                self.package_dirs[basename(dataset_dir)] = dataset_dir
+                yield basename(dataset_dir)
+        for path, dummy in packages:
+            if path not in extracted:
+                self.state.set_status(basename(path), STATUS_FAILED)
+
+    def _get_package_dir(self, name):
+        """Return the folder of a package, named e.g. CERN00001S.ready.xml."""
+        package = name.split('.')[0]
+        return self.package_dirs.get(package, join(self.path_unpacked,
+                                                   package))
 
     def _get_text_from_journal_item(self, journal_item, tag_list):
         try:
@@ -238,32 +303,90 @@ class ContrastOutConnector(object):
             raise MissingTagException("One of the searched tags (%s) "
                                       "is not valid." % (", ".join(tag_list)))
 
+    def _index_dataset(self, dataset_xml):
+        """Return the issues and journal items listed in a dataset.xml."""
+        def get_pathnames(journal_item, *tag_lists):
+            try:
+                return dict((key, self._get_text_from_journal_item(
+                    journal_item, tag_list)) for key, tag_list in tag_lists)
+            except MissingTagException as err:
+                return {'error': err.message}
+
+        elements = get_elements_by_tag_names(dataset_xml, ('journal-issue',
+                                                           'journal-item'))
+        issues = [get_pathnames(journal_issue, ('xml', ['ml', 'pathname']))
+                  for journal_issue in elements['journal-issue']]
+        items = [get_pathnames(journal_item, ('xml', ['ml', 'pathname']),
+                               ('pdf', ['web-pdf', 'pathname']))
+                 for journal_item in elements['journal-item']]
+        return {'issues': issues, 'items': items}
+
+    def _get_dataset(self, name):
+        """
+        Return the index of the dataset.xml manifest of a package.
+
+        The index lists the pathnames of the issues and journal items of
+        the package, or the error found reading them. Each manifest is
+        parsed once for the issue and article crawlers, and its index is
+        saved under CFG_DATASET_INDEXES with the digest of the manifest,
+        so the later runs on the same package, e.g. with run_locally,
+        do not parse it again.
+        """
+        package = name.split('.')[0]
+        dataset_link = join(self._get_package_dir(name), 'dataset.xml')
+        if dataset_link in self._datasets:
+            return self._datasets[dataset_link]
+        digest = file_digest(dataset_link)
+        index_link = join(CFG_DATASET_INDEXES, package + '.json')
+        index = None
+        if exists(index_link):
+            try:
+                with open(index_link) as index_file:
+                    index = json.load(index_file, object_hook=_decode_index)
+            except ValueError:
+                self.logger.warning("Ignoring the broken index %s"
+                                    % (index_link,))
+        if index is None or index.get('digest') != digest:
+            index = self._index_dataset(parse(dataset_link))
+            index['digest'] = digest
+            try:
+                if not exists(CFG_DATASET_INDEXES):
+                    makedirs(CFG_DATASET_INDEXES)
+                with open(index_link, 'w') as index_file:
+                    json.dump(index, index_file)
+            except (IOError, OSError) as err:
+                self.logger.warning("Could not save the index of %s: %s"
+                                    % (dataset_link, err))
+        self._datasets[dataset_link] = index
+        return index
+
+    def _get_index_pathname(self, journal_item, key):
+        """Return a pathname of an indexed issue or journal item."""
+        if 'error' in journal_item:
+            raise MissingTagException(journal_item['error'])
+        return journal_item[key]
+
     def _get_issues(self):
         if "path_unpacked" in self.__dict__:
             for name in self.files_list:
-                dataset_link = join(self.path_unpacked, name.split('.')[0],
-                                    'dataset.xml')
-
                 try:
-                    dataset_xml = parse(dataset_link)
+                    dataset = self._get_dataset(name)
                 except Exception:
                     register_exception(alert_admin=True, prefix=("Elsevier error reading dataset.xml file."))
                     error_msg = "Error reading dataset.xml file: %s"
-                    self.logger.error(error_msg % (dataset_link,))
+                    self.logger.error(error_msg % (
+                        join(self._get_package_dir(name), 'dataset.xml'),))
                     continue
 
-                journal_issues = dataset_xml.getElementsByTagName('journal-issue')
+                journal_issues = dataset['issues']
                 if journal_issues:
                     for journal_issue in journal_issues:
                         try:
-                            tag_list = ['ml', 'pathname']
-                            filename = (self
-                                        ._get_text_from_journal_item(journal_issue,
-                                                                     tag_list))
+                            filename = self._get_index_pathname(journal_issue,
+                                                                'xml')
                             self.logger.info("Found issue %s in %s."
                                              % (filename, name))
-                            pathname = join(self.path_unpacked,
-                                            name.split('.')[0],
+                            pathname = join(self._get_package_dir(name),
                                             filename)
                             self.found_issues.append(pathname)
                         except Exception as err:
@@ -275,20 +398,29 @@ class ContrastOutConnector(object):
                     def visit(arg, dirname, names):
                         if "issue.xml" in names:
                             self.found_issues.append(join(dirname, "issue.xml"))
-                    walk(join(self.path_unpacked, name.split('.')[0]), visit, None)
+                    walk(self._get_package_dir(name), visit, None)
         return self.found_issues
 
-    def _get_metadata_and_fulltex_dir(self):
+    def _get_metadata_and_fulltex_dir(self, names=None):
+        """
+        Return the articles listed in the dataset.xml of the packages.
+
+        names are the packages to look into, those of files_list by
+        default. It may be _extract_packages, to list the articles of
+        each package as soon as it is extracted.
+        """
         print("Retrieving journal items directories.")
 
-        total_count = len(self.files_list)
+        if names is None:
+            names = self.files_list
 
-        for i, name in enumerate(self.files_list, start=1):
-            dataset_link = join(self.path_unpacked, name.split('.')[0],
-                                'dataset.xml')
+        # The packages are counted as they come, names may be a generator
+        i = 0
+        for i, name in enumerate(names, start=1):
+            dataset_link = join(self._get_package_dir(name), 'dataset.xml')
 
             try:
-                dataset_xml = parse(dataset_link)
+                dataset = self._get_dataset(name)
             except Exception:
                 register_exception(alert_admin=True,
                                    prefix=("Elsevier error reading "
@@ -297,24 +429,18 @@ class ContrastOutConnector(object):
                                   % (dataset_link,))
                 continue
 
-            journal_items = dataset_xml.getElementsByTagName('journal-item')
-            self.logger.info(("%s of %s: Getting metadata and fulltex "
-                              "directories for %i journal items.")
-                             % (i, total_count, len(journal_items),))
+            journal_items = dataset['items']
+            self.logger.info(("Package %s (%s): Getting metadata and "
+                              "fulltex directories for %i journal items.")
+                             % (i, name, len(journal_items),))
             for journal_item in journal_items:
                 try:
-                    tag_list = ['ml', 'pathname']
-                    xml_pathname = join(self.path_unpacked,
-                                        name.split('.')[0],
-                                        (self._get_text_from_journal_item(
-                                            journal_item,
-                                            tag_list)))
-                    tag_list = ['web-pdf', 'pathname']
-                    pdf_pathname = join(self.path_unpacked,
-                                        name.split('.')[0],
-                                        (self._get_text_from_journal_item(
-                                            journal_item,
-                                            tag_list)))
+                    xml_pathname = join(self._get_package_dir(name),
+                                        self._get_index_pathname(journal_item,
+                                                                 'xml'))
+                    pdf_pathname = join(self._get_package_dir(name),
+                                        self._get_index_pathname(journal_item,
+                                                                 'pdf'))
 
                     self.found_articles.append(dict(xml=xml_pathname,
                                                     pdf=pdf_pathname,
@@ -325,9 +451,11 @@ class ContrastOutConnector(object):
                     self.logger.error("%s", err.message)
                     continue
 
-            self.logger.info(("%s of %s: Found articles: %i.")
-                             % (i, total_count, len(self.found_articles),))
+            self.logger.info(("Package %s (%s): Found articles: %i.")
+                             % (i, name, len(self.found_articles),))
 
+        self.logger.info("Found %i articles in %i packages."
+                         % (len(self.found_articles), i))
         self.sort_results()
         return self.found_articles
 
@@ -336,6 +464,8 @@ class ContrastOutConnector(object):
                                      key=lambda x: find_package_name(x['xml']),
                                      cmp=contrast_out_cmp)
 
+    @report_metrics('elsevier', start=True)
+    @timed('elsevier.harvest')
     def run(self, run_localy=False):
         if not run_localy:
             try:
@@ -362,5 +492,4 @@ class ContrastOutConnector(object):
                 self.retrieved_packages_unpacked.append(join(CFG_TAR_FILES, p))
             for p in listdir(CFG_READY_PACKAGES):
                 self.files_list.append(p.strip(".ready.xml"))
-        self._extract_packages()
-        self._get_metadata_and_fulltex_dir()
+        self._get_metadata_and_fulltex_dir(self._extract_packages())
@@ -0,0 +1,418 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Synthetic inputs of any size, derived from the test fixtures.
+
+The records and articles of the fixtures are replicated with unique
+identifiers, so that the packages and converters can be run offline on
+production sized inputs::
+
+    python -m harvestingkit.corpus_generator marcxml records.xml -n 100000
+    python -m harvestingkit.corpus_generator oai response.xml -n 10000 -d 0.1
+    python -m harvestingkit.corpus_generator jats articles/ -n 100 -a 3000
+    python -m harvestingkit.corpus_generator elsevier CERN00001 -n 500 \\
+        --archive CERN00001.tar
+    python -m harvestingkit.corpus_generator springer JHEP -n 500 \\
+        --archive JHEP.zip
+"""
+
+from __future__ import print_function
+
+import os
+import re
+import random
+import tarfile
+import zipfile
+
+from argparse import ArgumentParser
+from xml.dom.minidom import parse
+
+from .benchmarks import get_fixture
+
+RECORD_RE = re.compile(r'<record\b.*?</record>', re.S)
+RECID_RE = re.compile(r'(<(?:marc:)?controlfield tag="001">)[^<]*(<)')
+DOI_RE = re.compile(r'(<(?:marc:)?subfield code="a">10\.\d{4,}/[^<]*)(<)')
+OAI_IDENTIFIER_RE = re.compile(r'(<identifier>oai:[^<]*:)\d+(</identifier>)')
+OAI_HEADER_RE = re.compile(r'<header>.*?</header>', re.S)
+INCLUDE_ITEMS_RE = re.compile(r'<ce:include-item>.*</ce:include-item>', re.S)
+
+SURNAMES = ('Smith', 'Rossi', 'Novak', 'Garcia', 'Muller', 'Kowalski',
+            'Dubois', 'Tanaka', 'Ivanov', 'Silva', 'Nielsen', 'Papadopoulos')
+GIVEN_NAMES = ('John', 'Maria', 'Jan', 'Ana', 'Peter', 'Anna', 'Luca',
+               'Yuki', 'Sergei', 'Joao', 'Eva', 'Nikos')
+
+# The raw and resolved versions of the Elsevier fixtures
+ELSEVIER_ISSUE_FIXTURES = (os.path.join('sample_elsevier_issue', 'issue.xml'),
+                           os.path.join('sample_elsevier_issue',
+                                        'resolved_issue.xml'))
+ELSEVIER_ARTICLE_FIXTURES = ('sample_elsevier_document_input.xml',
+                             'sample_elsevier_document_output.xml')
+ELSEVIER_ISSN = '0370-2693'
+ELSEVIER_DOI = '10.1016/j.physletb.2017.%06d'
+ELSEVIER_PII = 'S0370-2693(17)%05d-%d'
+ELSEVIER_ISSUE_PII = 'S0370-2693(17)X%04d-0'
+SPRINGER_DOI = '10.1007/JHEP01(2017)%06d'
+SPRINGER_ARTICLE = '13130_2017_Article_%d'
+APS_DOI = '10.1103/PhysRevD.95.%06d'
+
+
+def read_fixture(name):
+    with open(get_fixture(name)) as fixture:
+        return fixture.read()
+
+
+def get_records(fixture):
+    return RECORD_RE.findall(read_fixture(fixture))
+
+
+def set_text(element, tag_name, value):
+    """Replace the content of the first tag_name element of element."""
+    nodes = element.getElementsByTagName(tag_name)
+    if nodes:
+        node = nodes[0]
+        while node.firstChild:
+            node.removeChild(node.firstChild)
+        node.appendChild(element.ownerDocument.createTextNode(value))
+
+
+def replicate(elements, count, update):
+    """
+    Replace the sibling elements by count copies of them.
+
+    The copies cycle over the original elements and are updated with
+    ``update(copy, number)`` before being inserted where the originals
+    stood.
+    """
+    parent = elements[0].parentNode
+    elements = [element for element in elements
+                if element.parentNode is parent]
+    following = elements[-1].nextSibling
+    for element in elements:
+        parent.removeChild(element)
+    for number in range(1, count + 1):
+        copy = elements[(number - 1) % len(elements)].cloneNode(True)
+        update(copy, number)
+        parent.insertBefore(copy, following)
+
+
+def generate_marcxml(output, count, fixture='sample_inspire.xml', start=1):
+    """
+    Write a MARCXML collection of count records to output.
+
+    The records of fixture are repeated with new recids and DOIs, which
+    are made unique by appending the recid to them.
+    """
+    templates = get_records(fixture)
+    with open(output, 'w') as marcxml:
+        marcxml.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      '<collection xmlns="http://www.loc.gov/MARC21/slim">\n')
+        for recid in xrange(start, start + count):
+            record = templates[recid % len(templates)]
+            record = RECID_RE.sub(r'\g<1>%d\g<2>' % (recid,), record)
+            record = DOI_RE.sub(r'\g<1>.%d\g<2>' % (recid,), record)
+            marcxml.write(record + '\n')
+        marcxml.write('</collection>\n')
+    return count
+
+
+def generate_oai_pmh(output, count, deleted=0.1, seed=0,
+                     fixture='sample_inspire_oai.xml', start=1):
+    """
+    Write an OAI-PMH ListRecords response of count records to output.
+
+    A fraction deleted of the records, chosen at random, only have a
+    header with a deleted status, as OAI-PMH reports deleted records.
+    """
+    rng = random.Random(seed)
+    content = read_fixture(fixture)
+    head = content[:content.index('<ListRecords>') + len('<ListRecords>')]
+    templates = RECORD_RE.findall(content)
+    with open(output, 'w') as oai:
+        oai.write(head + '\n')
+        for recid in xrange(start, start + count):
+            record = templates[recid % len(templates)]
+            record = OAI_IDENTIFIER_RE.sub(r'\g<1>%d\g<2>' % (recid,), record)
+            if rng.random() < deleted:
+                header = OAI_HEADER_RE.search(record).group()
+                record = '<record>%s</record>' % (
+                    header.replace('<header>', '<header status="deleted">'),)
+            else:
+                record = RECID_RE.sub(r'\g<1>%d\g<2>' % (recid,), record)
+                record = DOI_RE.sub(r'\g<1>.%d\g<2>' % (recid,), record)
+            oai.write(record + '\n')
+        oai.write('</ListRecords>\n</OAI-PMH>\n')
+    return count
+
+
+def build_jats_article(authors=1, references=22, seed=0,
+                       fixture='sample_aps_record.xml'):
+    """Return the JATS fixture with the given numbers of authors and
+    references, as UTF-8 encoded XML."""
+    rng = random.Random(seed)
+    document = parse(get_fixture(fixture))
+
+    def update_author(contrib, number):
+        set_text(contrib, 'surname', rng.choice(SURNAMES))
+        set_text(contrib, 'given-names', rng.choice(GIVEN_NAMES))
+
+    def update_reference(ref, number):
+        ref.setAttribute('id', 'c%d' % (number,))
+        set_text(ref, 'label', '[%d]' % (number,))
+
+    contribs = [contrib for contrib
+                in document.getElementsByTagName('contrib')
+                if contrib.getAttribute('contrib-type') == 'author']
+    replicate(contribs, authors, update_author)
+    replicate(document.getElementsByTagName('ref'), references,
+              update_reference)
+    return document.toxml('utf-8')
+
+
+def build_app_article(authors=2, references=2, seed=0,
+                      fixture='sample_app_record.xml'):
+    """Return the A++ fixture with the given numbers of authors and
+    citations, as UTF-8 encoded XML."""
+    rng = random.Random(seed)
+    document = parse(get_fixture(fixture))
+
+    def update_author(author, number):
+        set_text(author, 'FamilyName', rng.choice(SURNAMES))
+        set_text(author, 'GivenName', rng.choice(GIVEN_NAMES))
+
+    def update_citation(citation, number):
+        citation.setAttribute('ID', 'CR%d' % (number,))
+        set_text(citation, 'CitationNumber', '[%d]' % (number,))
+
+    replicate(document.getElementsByTagName('Author'), authors,
+              update_author)
+    replicate(document.getElementsByTagName('Citation'), references,
+              update_citation)
+    return document.toxml('utf-8')
+
+
+def get_first(content, pattern):
+    return re.search(pattern, content).group(1)
+
+
+def generate_jats_articles(folder, count, authors=1, references=22, seed=0):
+    """Write count JATS articles with different DOIs in folder."""
+    article = build_jats_article(authors, references, seed)
+    doi = get_first(article, r'<article-id pub-id-type="doi">([^<]*)<')
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    for number in xrange(1, count + 1):
+        with open(os.path.join(folder, '%06d.xml' % (number,)), 'w') as out:
+            out.write(article.replace(doi, APS_DOI % (number,)))
+    return count
+
+
+def generate_springer_delivery(folder, count, authors=2, references=2,
+                               seed=0, markup='app'):
+    """
+    Write a Springer delivery of count articles in folder.
+
+    Every article has its own directory with the metadata, either in A++
+    (``markup='app'``) or in JATS (``markup='jats'``), and an empty PDF
+    in ``BodyRef/PDF``.
+    """
+    if markup == 'app':
+        article = build_app_article(authors, references, seed)
+        doi = get_first(article, r'<ArticleDOI>([^<]*)<')
+        suffix = '.xml.scoap'
+    else:
+        article = build_jats_article(authors, references, seed)
+        doi = get_first(article, r'<article-id pub-id-type="doi">([^<]*)<')
+        suffix = '_nlm.xml'
+    for number in xrange(1, count + 1):
+        name = SPRINGER_ARTICLE % (number,)
+        path = os.path.join(folder, 'JOU=13130', 'VOL=2017.1',
+                            'ISU=1', 'ART=%d' % (number,))
+        os.makedirs(os.path.join(path, 'BodyRef', 'PDF'))
+        with open(os.path.join(path, name + suffix), 'w') as out:
+            out.write(article.replace(doi, SPRINGER_DOI % (number,)))
+        open(os.path.join(path, 'BodyRef', 'PDF', name + '.pdf'),
+             'w').close()
+    return count
+
+
+def make_issue(template, number, articles):
+    """Return the issue template as issue number, listing the articles,
+    given as (pii, doi) pairs."""
+    item = re.search(r'<ce:include-item>.*?</ce:include-item>',
+                     template, re.S).group()
+    item_pii = get_first(item, r'<ce:pii>([^<]*)<')
+    item_doi = get_first(item, r'<ce:doi>([^<]*)<')
+    first_page = get_first(item, r'(<ce:first-page>[^<]*<)')
+    last_page = get_first(item, r'(<ce:last-page>[^<]*<)')
+    items = []
+    for position, (pii, doi) in enumerate(articles):
+        page = 10 * position + 1
+        items.append(item.replace(item_pii, pii).replace(item_doi, doi)
+                     .replace(first_page, '<ce:first-page>%d<' % (page,))
+                     .replace(last_page, '<ce:last-page>%d<' % (page + 9,)))
+    issue = (template
+             .replace(get_first(template, r'<ce:pii>([^<]*)<'),
+                      ELSEVIER_ISSUE_PII % (number,))
+             .replace(get_first(template, r'(<vol-first>[^<]*<)'),
+                      '<vol-first>%d<' % (number,)))
+    return INCLUDE_ITEMS_RE.sub(lambda match: ''.join(items), issue, 1)
+
+
+def make_article(template, pii, doi):
+    """Return the article template with the given PII and DOI."""
+    return (template
+            .replace(get_first(template, r'<ce:pii>([^<]*)<'), pii, 1)
+            .replace(get_first(template, r'<ce:doi>([^<]*)<'), doi, 1))
+
+
+def generate_elsevier_package(folder, count, articles_per_issue=50,
+                              resolved=True, dataset=True):
+    """
+    Write an Elsevier package of count articles in folder.
+
+    The articles are grouped in issues of articles_per_issue, each with
+    an issue.xml listing them, and have a main.xml and an empty main.pdf.
+    With resolved, the resolved_issue.xml and resolved_main.xml files the
+    DTD normalization would produce are written as well, so the package
+    is processed without xmllint. With dataset, a dataset.xml manifest
+    lists the issues and articles, as in the ContrastOut deliveries.
+    """
+    issue_templates = [read_fixture(name) for name in ELSEVIER_ISSUE_FIXTURES]
+    article_templates = [read_fixture(name)
+                         for name in ELSEVIER_ARTICLE_FIXTURES]
+    if not resolved:
+        issue_templates = issue_templates[:1]
+        article_templates = article_templates[:1]
+
+    def write(path, contents):
+        for prefix, content in zip(('', 'resolved_'), contents):
+            with open(os.path.join(folder, os.path.dirname(path),
+                                   prefix + os.path.basename(path)),
+                      'w') as out:
+                out.write(content)
+
+    issues = []
+    items = []
+    for first in xrange(1, count + 1, articles_per_issue):
+        number = len(issues) + 1
+        issue_path = os.path.join(ELSEVIER_ISSN.replace('-', ''),
+                                  'v%d' % (number,))
+        articles = []
+        for article in xrange(first, min(first + articles_per_issue,
+                                         count + 1)):
+            pii = ELSEVIER_PII % (article, article % 10)
+            doi = ELSEVIER_DOI % (article,)
+            article_path = os.path.join(issue_path, re.sub(r'\W', '', pii))
+            os.makedirs(os.path.join(folder, article_path))
+            write(os.path.join(article_path, 'main.xml'),
+                  [make_article(template, pii, doi)
+                   for template in article_templates])
+            open(os.path.join(folder, article_path, 'main.pdf'), 'w').close()
+            articles.append((pii, doi))
+            items.append(article_path)
+        write(os.path.join(issue_path, 'issue.xml'),
+              [make_issue(template, number, articles)
+               for template in issue_templates])
+        issues.append(issue_path)
+
+    if dataset:
+        with open(os.path.join(folder, 'dataset.xml'), 'w') as manifest:
+            manifest.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                           '<dataset><dataset-content>\n')
+            for issue_path in issues:
+                manifest.write(
+                    '<journal-issue><ml><pathname>%s</pathname></ml>'
+                    '</journal-issue>\n'
+                    % (os.path.join(issue_path, 'issue.xml'),))
+            for article_path in items:
+                manifest.write(
+                    '<journal-item><ml><pathname>%s</pathname></ml>'
+                    '<web-pdf><pathname>%s</pathname></web-pdf>'
+                    '</journal-item>\n'
+                    % (os.path.join(article_path, 'main.xml'),
+                       os.path.join(article_path, 'main.pdf')))
+            manifest.write('</dataset-content></dataset>\n')
+    return count
+
+
+def make_archive(folder, output):
+    """
+    Pack folder, under its own name, in a zip or tar archive.
+
+    The format follows the extension of output: ``.zip``, ``.tar``,
+    ``.tar.gz`` or ``.tgz``.
+    """
+    folder = os.path.normpath(folder)
+    root = os.path.dirname(folder)
+    if output.endswith('.zip'):
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for dirname, dummy, filenames in os.walk(folder):
+                for filename in filenames:
+                    path = os.path.join(dirname, filename)
+                    archive.write(path, os.path.relpath(path, root))
+    else:
+        mode = 'w:gz' if output.endswith(('.tar.gz', '.tgz')) else 'w'
+        with tarfile.open(output, mode) as archive:
+            archive.add(folder, os.path.basename(folder))
+    return output
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('kind', choices=('marcxml', 'oai', 'jats',
+                                         'elsevier', 'springer'))
+    parser.add_argument('output',
+                        help='file (marcxml, oai) or folder to write to')
+    parser.add_argument('-n', '--count', type=int, default=1000,
+                        help='number of records or articles')
+    parser.add_argument('-a', '--authors', type=int,
+                        help='number of authors of every article')
+    parser.add_argument('-r', '--references', type=int,
+                        help='number of references of every article')
+    parser.add_argument('-d', '--deleted', type=float, default=0.1,
+                        help='fraction of deleted OAI-PMH records')
+    parser.add_argument('-m', '--markup', choices=('app', 'jats'),
+                        default='app', help='markup of Springer articles')
+    parser.add_argument('-s', '--seed', type=int, default=0)
+    parser.add_argument('--archive',
+                        help='also pack the folder in this zip/tar archive')
+    args = parser.parse_args()
+    sizes = dict((name, getattr(args, name))
+                 for name in ('authors', 'references')
+                 if getattr(args, name) is not None)
+    if args.kind == 'marcxml':
+        generate_marcxml(args.output, args.count)
+    elif args.kind == 'oai':
+        generate_oai_pmh(args.output, args.count, args.deleted, args.seed)
+    elif args.kind == 'jats':
+        generate_jats_articles(args.output, args.count, seed=args.seed,
+                               **sizes)
+    elif args.kind == 'elsevier':
+        generate_elsevier_package(args.output, args.count)
+    else:
+        generate_springer_delivery(args.output, args.count, seed=args.seed,
+                                   markup=args.markup, **sizes)
+    if args.archive:
+        make_archive(args.output, args.archive)
+    print("Generated %d %s items in %s" % (args.count, args.kind,
+                                           args.archive or args.output))
+
+
+if __name__ == '__main__':
+    main()
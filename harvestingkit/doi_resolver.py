@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Resolution of DOIs to the ids of the records already holding them.
+
+The DOIs of a whole delivery are resolved at once with ``prefetch`` and
+kept in memory, so converting every article only costs a dictionary
+lookup instead of a search.
+"""
+
+from .instrumentation import stage
+from .utils import get_record_fields
+
+
+class DOIResolver(object):
+    """
+    Base class of the DOI resolvers, caching the resolved DOIs.
+
+    Subclasses implement ``_lookup`` which resolves a list of DOIs in
+    as few round trips as possible.
+
+    :param batch_size: maximum number of DOIs given to ``_lookup`` at once.
+    :type batch_size: int
+    """
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self._recids = {}
+
+    def _lookup(self, dois):
+        """Return a dict mapping some of dois to lists of recids."""
+        raise NotImplementedError
+
+    def prefetch(self, dois):
+        """Resolve all the DOIs not resolved yet, batch by batch."""
+        missing = sorted(set(doi for doi in dois
+                             if doi and doi not in self._recids))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i:i + self.batch_size]
+            with stage('doi_resolver.lookup'):
+                found = self._lookup(batch)
+            for doi in batch:
+                self._recids[doi] = sorted(found.get(doi, []))
+
+    def get_recids(self, doi):
+        """Return the list of recids holding doi, possibly empty."""
+        if doi not in self._recids:
+            self.prefetch([doi])
+        return self._recids.get(doi, [])
+
+    def clear(self):
+        self._recids = {}
+
+
+class DictDOIResolver(DOIResolver):
+    """
+    Resolves DOIs against a local mapping, for tests or offline runs.
+
+    :param mapping: dict from DOI to a recid or a list of recids.
+    :type mapping: dict
+    """
+
+    def __init__(self, mapping=None, batch_size=100):
+        super(DictDOIResolver, self).__init__(batch_size)
+        self.mapping = mapping or {}
+
+    def _lookup(self, dois):
+        found = {}
+        for doi in dois:
+            recids = self.mapping.get(doi, [])
+            if not isinstance(recids, (list, tuple)):
+                recids = [recids]
+            found[doi] = list(recids)
+        return found
+
+
+class InvenioDOIResolver(DOIResolver):
+    """
+    Resolves DOIs with one Invenio search per batch of DOIs.
+
+    The 0247_a values of all the matched records are then read with a
+    single query to map them back to the DOIs, which are compared case
+    insensitively. Deleted records are ignored.
+
+    :param run_sql: runs the queries, invenio.dbquery.run_sql by default.
+    :type run_sql: callable
+    """
+
+    query = '(%s) AND NOT 980:"DELETED"'
+
+    def __init__(self, batch_size=100, run_sql=None):
+        super(InvenioDOIResolver, self).__init__(batch_size)
+        self.run_sql = run_sql
+
+    def _search(self, pattern):
+        from invenio.search_engine import perform_request_search
+        return perform_request_search(p=pattern, of="id")
+
+    def _lookup(self, dois):
+        pattern = self.query % (
+            " OR ".join('0247_a:"%s"' % (doi,) for doi in dois),)
+        wanted = {}
+        for doi in dois:
+            wanted.setdefault(doi.lower(), []).append(doi)
+        found = {}
+        recids = self._search(pattern)
+        for recid, subfields in get_record_fields(recids, '0247',
+                                                  self.run_sql):
+            for value in subfields.get('a', []):
+                for doi in wanted.get(value.lower(), []):
+                    if recid not in found.setdefault(doi, []):
+                        found[doi].append(recid)
+        return found
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Persistent mapping of the DOIs to the metadata of their issue."""
+
+from datetime import datetime
+
+from .sqlite_utils import SQLiteStore
+
+
+# Metadata stored for a DOI, in the order of the tuples of ElsevierPackage
+FIELDS = ('journal', 'issn', 'volume', 'issue', 'first_page', 'last_page',
+          'year', 'start_date')
+
+# SQLite refuses more than 999 host parameters in a single statement.
+_LOOKUP_CHUNK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    digest TEXT PRIMARY KEY,
+    updated TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dois (
+    doi TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    %s
+);
+CREATE INDEX IF NOT EXISTS dois_digest ON dois (digest);
+""" % (",\n    ".join("%s TEXT" % (field,) for field in FIELDS),)
+
+
+def _to_unicode(value):
+    """SQLite refuses the non-ASCII byte strings, these are UTF-8."""
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+class DOIStore(SQLiteStore):
+    """
+    SQLite-backed store of the issue metadata of DOIs.
+
+    The issue files are identified by the digest of their content: the
+    DOIs listed in an issue already stored are read from the store, and
+    an issue delivered again with new articles only adds them.
+
+    :param filename: path to the SQLite database. It is created, together
+                     with its folder, on first use.
+    :type filename: string
+    """
+
+    SCHEMA = _SCHEMA
+    # The values are returned as UTF-8, as read from the XML
+    TEXT_FACTORY = str
+
+    def __contains__(self, doi):
+        cursor = self.connection.execute(
+            "SELECT 1 FROM dois WHERE doi = ?", (_to_unicode(doi),))
+        return cursor.fetchone() is not None
+
+    def get(self, doi, default=None):
+        """Return the metadata tuple of doi, or default."""
+        cursor = self.connection.execute(
+            "SELECT %s FROM dois WHERE doi = ?" % (", ".join(FIELDS),),
+            (_to_unicode(doi),))
+        row = cursor.fetchone()
+        return tuple(row) if row else default
+
+    def get_issue(self, digest):
+        """Return the DOIs of an issue as a dict, or None if unknown."""
+        cursor = self.connection.execute(
+            "SELECT 1 FROM issues WHERE digest = ?", (digest,))
+        if cursor.fetchone() is None:
+            return None
+        cursor = self.connection.execute(
+            "SELECT doi, %s FROM dois WHERE digest = ?" % (", ".join(FIELDS),),
+            (digest,))
+        return dict((row[0], tuple(row[1:])) for row in cursor)
+
+    def add_issue(self, digest, dois):
+        """Record the DOIs of an issue, replacing their older metadata.
+
+        The older issues listing any of these DOIs are forgotten, so that
+        they are parsed again rather than read back partially if they are
+        delivered again.
+
+        :param digest: digest of the issue file.
+        :type digest: string
+        :param dois: metadata tuples (see FIELDS) by DOI.
+        :type dois: dict
+        """
+        keys = [_to_unicode(doi) for doi in dois]
+        replaced = set()
+        for i in range(0, len(keys), _LOOKUP_CHUNK_SIZE):
+            chunk = keys[i:i + _LOOKUP_CHUNK_SIZE]
+            replaced.update(row[0] for row in self.connection.execute(
+                "SELECT DISTINCT digest FROM dois WHERE doi IN (%s)"
+                % (", ".join("?" * len(chunk)),), chunk))
+        replaced.discard(digest)
+        with self.connection:
+            self.connection.executemany(
+                "DELETE FROM issues WHERE digest = ?",
+                ((old,) for old in replaced))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO dois (doi, digest, %s) "
+                "VALUES (?, ?, %s)" % (", ".join(FIELDS),
+                                       ", ".join("?" * len(FIELDS))),
+                ([_to_unicode(doi), digest] +
+                 [_to_unicode(value) for value in values]
+                 for doi, values in dois.iteritems()))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO issues (digest, updated) "
+                "VALUES (?, ?)", (digest, datetime.now().isoformat()))
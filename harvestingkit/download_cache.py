@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""On-disk cache of downloaded files, revalidated with conditional requests.
+
+Bodies are stored once per content (SHA-1) under ``objects/`` and the URLs
+pointing to them, with their ``ETag`` and ``Last-Modified`` validators,
+are indexed in a SQLite database. When the cache grows over its maximum
+size the least recently used bodies are evicted.
+"""
+
+import os
+import time
+import hashlib
+import threading
+
+from tempfile import mkstemp
+
+from .sqlite_utils import SQLiteStore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS urls_digest ON urls (digest);
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_accessed ON objects (accessed);
+"""
+
+
+class DownloadCache(SQLiteStore):
+    """Content-addressed cache of HTTP response bodies.
+
+    :param directory: folder holding the index and the bodies.
+    :type directory: string
+    :param max_size: maximum total size of the bodies, in bytes.
+    :type max_size: int
+    """
+
+    SCHEMA = _SCHEMA
+
+    def __init__(self, directory, max_size=2 * 1024 ** 3):
+        self.directory = directory
+        self.max_size = max_size
+        self._lock = threading.RLock()
+        if not os.path.exists(os.path.join(directory, 'objects')):
+            os.makedirs(os.path.join(directory, 'objects'))
+        super(DownloadCache, self).__init__(os.path.join(directory,
+                                                         'index.db'),
+                                            check_same_thread=False)
+
+    def object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _lookup(self, url):
+        row = self.connection.execute(
+            "SELECT etag, last_modified, digest FROM urls WHERE url = ?",
+            (url,)).fetchone()
+        if row and os.path.exists(self.object_path(row[2])):
+            return row
+        return None
+
+    def validators(self, url):
+        """Return the headers making a request for url conditional."""
+        with self._lock:
+            row = self._lookup(url)
+        headers = {}
+        if row:
+            etag, last_modified, dummy = row
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def get(self, url):
+        """Return the path of the cached body of url, or None."""
+        with self._lock:
+            row = self._lookup(url)
+            if not row:
+                return None
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE objects SET accessed = ? WHERE digest = ?",
+                    (time.time(), row[2]))
+            return self.object_path(row[2])
+
+    def store(self, url, response, chunk_size=1024 * 8):
+        """Store the body of a requests response for url.
+
+        :returns: the path of the cached body.
+        """
+        fd, temporary = mkstemp(dir=self.directory, prefix='download_')
+        sha1 = hashlib.sha1()
+        size = 0
+        with os.fdopen(fd, 'wb') as body:
+            for chunk in response.iter_content(chunk_size):
+                sha1.update(chunk)
+                size += len(chunk)
+                body.write(chunk)
+        digest = sha1.hexdigest()
+        path = self.object_path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(temporary)  # same content already cached
+            else:
+                if not os.path.exists(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                os.rename(temporary, path)
+            with self.connection:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO objects (digest, size, accessed) "
+                    "VALUES (?, ?, ?)", (digest, size, time.time()))
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO urls "
+                    "(url, etag, last_modified, digest) VALUES (?, ?, ?, ?)",
+                    (url, response.headers.get('ETag'),
+                     response.headers.get('Last-Modified'), digest))
+            self.evict(keep=digest)
+        return path
+
+    def size(self):
+        """Return the total size of the cached bodies."""
+        with self._lock:
+            return self.connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def evict(self, keep=None):
+        """Remove the least recently used bodies until under max_size."""
+        with self._lock:
+            total = self.size()
+            if total <= self.max_size:
+                return
+            rows = self.connection.execute(
+                "SELECT digest, size FROM objects ORDER BY accessed").fetchall()
+            with self.connection:
+                for digest, size in rows:
+                    if total <= self.max_size:
+                        break
+                    if digest == keep:
+                        continue
+                    try:
+                        os.remove(self.object_path(digest))
+                    except OSError:
+                        pass
+                    self.connection.execute(
+                        "DELETE FROM objects WHERE digest = ?", (digest,))
+                    self.connection.execute(
+                        "DELETE FROM urls WHERE digest = ?", (digest,))
+                    total -= size
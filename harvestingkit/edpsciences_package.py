@@ -20,7 +20,6 @@
 from __future__ import print_function
 
 import sys
-import requests
 
 from bs4 import BeautifulSoup
 from urlparse import urlparse
@@ -32,16 +31,18 @@ from harvestingkit.minidom_utils import (get_value_in_tag,
                                          xml_to_text)
 from harvestingkit.utils import (collapse_initials,
                                  fix_journal_name,
-                                 download_file)
+                                 download_file,
+                                 extract_references,
+                                 get_downloader)
 from harvestingkit.bibrecord import (
     record_add_field,
     create_record,
     record_xml_output,
 )
 
-from xml.dom.minidom import (parse,
-                             parseString)
+from xml.dom.minidom import parse
 from harvestingkit.jats_package import JatsPackage
+from harvestingkit.instrumentation import timed
 
 try:
     from invenio.config import CFG_EDPSCIENCE_OUT_FOLDER
@@ -95,22 +96,23 @@ class EDPSciencesPackage(JatsPackage):
             yield (label, ref_type, text_ref, ext_link,
                    authors, year, source, volume, page)
 
+    @timed('edpsciences.add_references')
     def _add_references(self, rec, ref_extract_callback=None):
+        references = list(self._get_references())
+        if ref_extract_callback:
+            # The unstructured references are all extracted at once
+            extracted = iter(extract_references(
+                ref_extract_callback, [ref[2] for ref in references
+                                       if ref[2]]))
         for label, ref_type, text_ref, ext_link, authors, year, \
-                source, volume, page in self._get_references():
+                source, volume, page in references:
             subfields = []
             if label:
                 subfields.append(('o', label))
             if text_ref:
                 if ref_extract_callback:
-                    ref_xml = ref_extract_callback(text_ref)
-                    dom = parseString(ref_xml)
-                    fields = dom.getElementsByTagName("datafield")[0]
-                    fields = fields.getElementsByTagName("subfield")
-                    for field in fields:
-                        data = field.firstChild.data
-                        code = field.getAttribute("code")
-                        subfields.append((code, data))
+                    fields = next(extracted)
+                    subfields.extend(fields)
                     if fields:
                         subfields.append(('9', 'refextract'))
                 else:
@@ -153,6 +155,7 @@ class EDPSciencesPackage(JatsPackage):
         abstract = abstract.replace("Conclusions..", "<br/>Conclusions:<br/>")
         return abstract
 
+    @timed('edpsciences.get_record')
     def get_record(self, fileName, ref_extract_callback=None):
         """
         Gets the Marc xml of the files in xaml_jp directory
@@ -341,6 +344,7 @@ class EDPSciencesPackage(JatsPackage):
         abstract = get_value_in_tag(self.document, 'Abstract')
         references = self.document.getElementsByTagName('Bibliomixed')
 
+        bibliomixed = []
         for reference in references:
             subfields = []
             label = reference.getAttribute('N')
@@ -362,17 +366,19 @@ class EDPSciencesPackage(JatsPackage):
                                                          ref_volume,
                                                          ref_page)))
                 reference.removeChild(tag)
-            text_ref = xml_to_text(reference)
+            bibliomixed.append((subfields, xml_to_text(reference),
+                                bibliosets))
+        if ref_extract_callback:
+            # The unstructured references are all extracted at once
+            extracted = iter(extract_references(
+                ref_extract_callback,
+                [text_ref for dummy, text_ref, dummy in bibliomixed]))
+        for subfields, text_ref, bibliosets in bibliomixed:
             if ref_extract_callback:
-                ref_xml = ref_extract_callback(text_ref)
-                dom = parseString(ref_xml)
-                fields = dom.getElementsByTagName("datafield")[0]
-                fields = fields.getElementsByTagName("subfield")
+                fields = next(extracted)
                 if fields:
                     subfields.append(('9', 'refextract'))
-                for field in fields:
-                    data = field.firstChild.data
-                    code = field.getAttribute("code")
+                for code, data in fields:
                     if code == 'm' and bibliosets:
                         continue
                     else:
@@ -441,7 +447,7 @@ class EDPSciencesPackage(JatsPackage):
 
     def _attach_fulltext(self, rec, doi):
         url = 'http://dx.doi.org/' + doi
-        page = requests.get(url)
+        page = get_downloader(retry_count=5).session.get(url)
         #url after redirect
         url = page.url
         page = page.text
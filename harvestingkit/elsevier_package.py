@@ -23,7 +23,6 @@ import re
 import sys
 import time
 import requests
-import xml.dom.minidom
 import datetime
 
 from bs4 import BeautifulSoup
@@ -42,7 +41,7 @@ from xml.dom.minidom import parse
 try:
     from invenio.errorlib import register_exception
 except ImportError:
-    register_exception = lambda a, b: True
+    register_exception = lambda *args, **kwargs: True
 
 try:
     from invenio.config import CFG_TMPSHAREDDIR, CFG_LOGDIR
@@ -62,12 +61,21 @@ from harvestingkit.scoap3utils import (
     extract_package as scoap3utils_extract_package
 )
 from harvestingkit.contrast_out_utils import find_package_name
-from harvestingkit.minidom_utils import (get_value_in_tag,
+from harvestingkit.doi_resolver import InvenioDOIResolver
+from harvestingkit.doi_store import DOIStore
+from harvestingkit.harvest_state import file_digest
+from harvestingkit.minidom_utils import (get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         get_value_in_tag,
                                          xml_to_text)
 from harvestingkit.config import CFG_DTDS_PATH as CFG_SCOAP3DTDS_PATH
+from harvestingkit.config import CFG_ELSEVIER_PACKAGE_MEMBERS
+from harvestingkit.instrumentation import count, log_summary, timed
+from harvestingkit.metrics import report_metrics
 from harvestingkit.utils import (fix_journal_name,
                                  format_arxiv_id,
                                  add_nations_field,
+                                 extract_references,
                                  fix_dashes)
 
 from harvestingkit.bibrecord import (
@@ -89,6 +97,13 @@ CFG_ELSEVIER_JID_MAP = {'PLB': 'Physics letters B',
                         'SOLMAT': 'Solar Energy Materials & Solar Cells',
                         'APCATB': 'Applied Catalysis B: Environmental',
                         'NUMA': 'Journal of Nuclear Materials'}
+# Elements of a bibliographic reference read by _get_ref
+REFERENCE_TAGS = ('ce:doi', 'ce:textref', 'ce:inter-ref', 'sb:first-page',
+                  'sb:article-number', 'sb:issue', 'sb:maintitle',
+                  'sb:volume-nr', 'sb:author', 'sb:comment', 'sb:contribution',
+                  'sb:edited-book', 'sb:book-series', 'sb:date',
+                  'sb:conference', 'sb:editors', 'sb:editor', 'sb:publisher',
+                  'sb:book')
 
 
 class ElsevierPackage(object):
@@ -107,6 +122,13 @@ class ElsevierPackage(object):
                        key: the name in the xml source files
                        value: the desired name.
     :type package_name: dict
+    :param doi_resolver: resolver of the DOIs to the existing records,
+                         by default searching the Invenio database.
+    :type doi_resolver: DOIResolver
+    :param doi_store: store of the issue metadata of the DOIs seen in the
+                      earlier runs, by default the one of the ContrastOut
+                      harvests, or an in-memory store.
+    :type doi_store: DOIStore
 
     :note: either C{package_name} or C{path} don't have to be passed to the
     constructor, in this case the Elsevier server will be harvested.
@@ -116,8 +138,12 @@ class ElsevierPackage(object):
                  run_locally=False, CONSYN=False,
                  journal_mappings={},
                  extract_nations=False,
-                 no_harvest=False):
+                 no_harvest=False,
+                 doi_resolver=None,
+                 doi_store=None):
         self.CONSYN = CONSYN
+        self.doi_resolver = doi_resolver or InvenioDOIResolver()
+        self.doi_store = doi_store or DOIStore()
         self.doi_package_name_mapping = []
         try:
             self.logger = create_logger(
@@ -143,6 +169,8 @@ class ElsevierPackage(object):
                     from harvestingkit.contrast_out import ContrastOutConnector
                     self.conn = ContrastOutConnector(self.logger)
                     self.conn.run(run_locally)
+                    if doi_store is None:
+                        self.doi_store = self.conn.doi_store
                 else:
                     if not path and package_name:
                         self.logger.info("Got package: %s" % (package_name,))
@@ -151,6 +179,8 @@ class ElsevierPackage(object):
                         from harvestingkit.contrast_out import ContrastOutConnector
                         self.conn = ContrastOutConnector(self.logger)
                         self.conn.run()
+                        if doi_store is None:
+                            self.doi_store = self.conn.doi_store
                 self._crawl_elsevier_and_find_main_xml()
                 self._crawl_elsevier_and_find_issue_xml()
                 self._build_doi_mapping()
@@ -162,7 +192,8 @@ class ElsevierPackage(object):
         """
         self.path = mkdtemp(prefix="scoap3_package_", dir=CFG_TMPSHAREDDIR)
         self.logger.debug("Extracting package: %s" % (self.package_name,))
-        scoap3utils_extract_package(self.package_name, self.path, self.logger)
+        scoap3utils_extract_package(self.package_name, self.path, self.logger,
+                                    CFG_ELSEVIER_PACKAGE_MEMBERS)
 
     def _crawl_elsevier_and_find_main_xml(self):
         """
@@ -228,6 +259,7 @@ class ElsevierPackage(object):
             rename(join(path, si_name, filename), join(path, filename))
 
 
+    @timed('elsevier.normalize_issue')
     def _normalize_issue_dir_with_dtd(self, path):
         """
         issue.xml from Elsevier assume the existence of a local DTD.
@@ -260,6 +292,7 @@ class ElsevierPackage(object):
             self.logger.error(message)
             raise ValueError(message)
 
+    @timed('elsevier.normalize_article')
     def _normalize_article_dir_with_dtd(self, path):
         """
         main.xml from Elsevier assume the existence of a local DTD.
@@ -292,21 +325,24 @@ class ElsevierPackage(object):
             self.logger.error(message)
             raise ValueError(message)
 
+    @timed('elsevier.add_references')
     def _add_references(self, xml_doc, rec, refextract_callback=None):
+        references = list(self.get_references(xml_doc))
+        if refextract_callback:
+            # The unstructured references are all extracted at once
+            extracted = iter(extract_references(
+                refextract_callback,
+                [ref[8].replace('\"', '\'') for ref in references
+                 if ref[8] and not ref[1]]))
         for label, authors, doi, issue, page, title, volume, year,\
                 textref, ext_link, isjournal, comment, journal, publisher,\
-                editors, book_title, links in self.get_references(xml_doc):
+                editors, book_title, links in references:
             subfields = []
             if textref and not authors:
                 textref = textref.replace('\"', '\'')
                 if refextract_callback:
-                    ref_xml = refextract_callback(textref)
-                    dom = xml.dom.minidom.parseString(ref_xml)
-                    fields = dom.getElementsByTagName("datafield")[0]
-                    fields = fields.getElementsByTagName("subfield")
-                    for field in fields:
-                        data = field.firstChild.data
-                        code = field.getAttribute("code")
+                    fields = next(extracted)
+                    for code, data in fields:
                         if code == 'r':
                             data = fix_dashes(data)
                         subfields.append((code, data))
@@ -369,28 +405,47 @@ class ElsevierPackage(object):
                                      subfields=subfields)
 
     def _build_doi_mapping(self):
+        """
+        Map the DOIs of the issues found to their issue metadata.
+
+        The issues already read in an earlier run, with the same content,
+        are taken from the DOI store instead of being parsed again.
+        """
         self._dois = {}
         for path in self._found_issues:
-            xml_doc = parse(open(join(path, "resolved_issue.xml")))
-            jid = get_value_in_tag(xml_doc, "jid")
-            journal = CFG_ELSEVIER_JID_MAP.get(jid, jid)
-            issn = get_value_in_tag(xml_doc, "ce:issn")
-            volume = get_value_in_tag(xml_doc, "vol-first")
-            issue = get_value_in_tag(xml_doc, "iss-first")
-            year = get_value_in_tag(xml_doc, "start-date")[:4]
-            start_date = get_value_in_tag(xml_doc, "start-date")
-            if len(start_date) is 8:
-                start_date = time.strftime(
-                    '%Y-%m-%d', time.strptime(start_date, '%Y%m%d'))
-            elif len(start_date) is 6:
-                start_date = time.strftime(
-                    '%Y-%m', time.strptime(start_date, '%Y%m'))
-            for item in xml_doc.getElementsByTagName("ce:include-item"):
-                doi = get_value_in_tag(item, "ce:doi")
-                first_page = get_value_in_tag(item, "ce:first-page")
-                last_page = get_value_in_tag(item, "ce:last-page")
-                self._dois[doi] = (journal, issn, volume, issue,
-                                   first_page, last_page, year, start_date)
+            issue_path = join(path, "resolved_issue.xml")
+            digest = file_digest(issue_path)
+            dois = self.doi_store.get_issue(digest)
+            if dois is None:
+                dois = self._get_issue_dois(issue_path)
+                self.doi_store.add_issue(digest, dois)
+            self._dois.update(dois)
+
+    @timed('elsevier.read_issue')
+    def _get_issue_dois(self, issue_path):
+        """Return the issue metadata of the DOIs listed in issue_path."""
+        dois = {}
+        xml_doc = parse(open(issue_path))
+        jid = get_value_in_tag(xml_doc, "jid")
+        journal = CFG_ELSEVIER_JID_MAP.get(jid, jid)
+        issn = get_value_in_tag(xml_doc, "ce:issn")
+        volume = get_value_in_tag(xml_doc, "vol-first")
+        issue = get_value_in_tag(xml_doc, "iss-first")
+        year = get_value_in_tag(xml_doc, "start-date")[:4]
+        start_date = get_value_in_tag(xml_doc, "start-date")
+        if len(start_date) is 8:
+            start_date = time.strftime(
+                '%Y-%m-%d', time.strptime(start_date, '%Y%m%d'))
+        elif len(start_date) is 6:
+            start_date = time.strftime(
+                '%Y-%m', time.strptime(start_date, '%Y%m'))
+        for item in xml_doc.getElementsByTagName("ce:include-item"):
+            doi = get_value_in_tag(item, "ce:doi")
+            first_page = get_value_in_tag(item, "ce:first-page")
+            last_page = get_value_in_tag(item, "ce:last-page")
+            dois[doi] = (journal, issn, volume, issue,
+                         first_page, last_page, year, start_date)
+        return dois
 
     def _get_doi(self, xml_doc):
         try:
@@ -446,9 +501,12 @@ class ElsevierPackage(object):
             print("Can't find copyright", file=sys.stderr)
 
     def get_ref_link(self, xml_doc, name):
-        links = xml_doc.getElementsByTagName('ce:inter-ref')
+        return self._get_ref_link_in(get_elements_by_tag_names(
+            xml_doc, ('ce:inter-ref',)), name)
+
+    def _get_ref_link_in(self, elements, name):
         ret = None
-        for link in links:
+        for link in elements['ce:inter-ref']:
             if name in link.getAttribute("xlink:href").encode('utf-8'):
                 ret = xml_to_text(link).strip()
         return ret
@@ -627,7 +685,9 @@ class ElsevierPackage(object):
             try:
                 return self._dois[doi] + (doi, )
             except KeyError:
-                return ('', '', '', '', '', '', '', '', doi)
+                # The issue may have been delivered in an earlier run
+                return self.doi_store.get(doi, ('', '', '', '', '', '', '',
+                                                '')) + (doi, )
 
     def get_publication_date(self, xml_doc):
         """Return the best effort start_date."""
@@ -665,24 +725,26 @@ class ElsevierPackage(object):
             return start_date
 
     def _get_ref(self, ref, label):
-        doi = get_value_in_tag(ref, "ce:doi")
-        page = get_value_in_tag(ref, "sb:first-page")
+        # The reference is walked once for all its fields
+        elements = get_elements_by_tag_names(ref, REFERENCE_TAGS)
+        doi = get_value_in_elements(elements, "ce:doi")
+        page = get_value_in_elements(elements, "sb:first-page")
         if not page:
-            page = get_value_in_tag(ref, "sb:article-number")
-        issue = get_value_in_tag(ref, "sb:issue")
-        title = get_value_in_tag(ref, "sb:maintitle")
-        volume = get_value_in_tag(ref, "sb:volume-nr")
-        tmp_issues = ref.getElementsByTagName('sb:issue')
+            page = get_value_in_elements(elements, "sb:article-number")
+        issue = get_value_in_elements(elements, "sb:issue")
+        title = get_value_in_elements(elements, "sb:maintitle")
+        volume = get_value_in_elements(elements, "sb:volume-nr")
+        tmp_issues = elements['sb:issue']
         if tmp_issues:
             year = get_value_in_tag(tmp_issues[0], "sb:date")
         else:
             year = ''
-        textref = ref.getElementsByTagName("ce:textref")
+        textref = elements["ce:textref"]
         if textref:
             textref = xml_to_text(textref[0])
-        ext_link = format_arxiv_id(self.get_ref_link(ref, 'arxiv'))
+        ext_link = format_arxiv_id(self._get_ref_link_in(elements, 'arxiv'))
         authors = []
-        for author in ref.getElementsByTagName("sb:author"):
+        for author in elements["sb:author"]:
             given_name = get_value_in_tag(author, "ce:given-name")
             surname = get_value_in_tag(author, "ce:surname")
             if given_name:
@@ -696,43 +758,43 @@ class ElsevierPackage(object):
             regex = r'\d*\.\d*'
             if not re.search(regex, ext_link):
                 ext_link = ext_link[6:]
-        comment = get_value_in_tag(ref, "sb:comment")
+        comment = get_value_in_elements(elements, "sb:comment")
         links = []
-        for link in ref.getElementsByTagName("ce:inter-ref"):
+        for link in elements["ce:inter-ref"]:
             linktext = xml_to_text(link)
             if re.search('^https?:\/\/', linktext):
                 links.append(linktext)
         title = ""
         try:
-            container = ref.getElementsByTagName("sb:contribution")[0]
+            container = elements["sb:contribution"][0]
             title = container.getElementsByTagName("sb:maintitle")[0]
             title = xml_to_text(title)
         except IndexError:
             title = ''
         except TypeError:
             title = ''
-        isjournal = ref.getElementsByTagName("sb:issue")
+        isjournal = elements["sb:issue"]
         journal = ""
         if isjournal:
             isjournal = True
             if not page:
                 page = comment
-            container = ref.getElementsByTagName("sb:issue")[0]
+            container = elements["sb:issue"][0]
             journal = get_value_in_tag(container, "sb:maintitle")
-        edited_book = ref.getElementsByTagName("sb:edited-book")
+        edited_book = elements["sb:edited-book"]
         editors = []
         book_title = ""
         publisher = ""
         if edited_book:
             # treat as a journal
-            if ref.getElementsByTagName("sb:book-series"):
-                container = ref.getElementsByTagName("sb:book-series")[0]
+            if elements["sb:book-series"]:
+                container = elements["sb:book-series"][0]
                 journal = get_value_in_tag(container, "sb:maintitle")
-                year = get_value_in_tag(ref, "sb:date")
+                year = get_value_in_elements(elements, "sb:date")
                 isjournal = True
             # conference
-            elif ref.getElementsByTagName("sb:conference"):
-                container = ref.getElementsByTagName("sb:edited-book")[0]
+            elif elements["sb:conference"]:
+                container = elements["sb:edited-book"][0]
                 maintitle = get_value_in_tag(container, "sb:maintitle")
                 conference = get_value_in_tag(
                     container, "sb:conference")
@@ -740,10 +802,9 @@ class ElsevierPackage(object):
                 # use this variable in order to get in the 'm' field
                 publisher = maintitle + ", " + conference + ", " + date
             else:
-                container = ref.getElementsByTagName(
-                    "sb:edited-book")[0]
-                if ref.getElementsByTagName("sb:editors"):
-                    for editor in ref.getElementsByTagName("sb:editor"):
+                container = elements["sb:edited-book"][0]
+                if elements["sb:editors"]:
+                    for editor in elements["sb:editor"]:
                         surname = get_value_in_tag(editor, "ce:surname")
                         firstname = get_value_in_tag(editor, "ce:given-name")
                         editors.append("%s,%s" % (surname, firstname))
@@ -753,23 +814,22 @@ class ElsevierPackage(object):
                 else:
                     title = get_value_in_tag(container, "sb:maintitle")
                 year = get_value_in_tag(container, "sb:date")
-                if ref.getElementsByTagName("sb:publisher"):
-                    container = ref.getElementsByTagName("sb:publisher")[0]
+                if elements["sb:publisher"]:
+                    container = elements["sb:publisher"][0]
                     location = get_value_in_tag(container, "sb:location")
                     publisher = get_value_in_tag(container, "sb:name")
                     if location:
                         publisher = location + ": " + publisher
-        if ref.getElementsByTagName("sb:book"):
-            if ref.getElementsByTagName("sb:book-series"):
-                book_series = ref.getElementsByTagName(
-                    "sb:book-series")[0]
+        if elements["sb:book"]:
+            if elements["sb:book-series"]:
+                book_series = elements["sb:book-series"][0]
                 title += ", " + \
                     get_value_in_tag(book_series, "sb:maintitle")
                 title += ", " + \
                     get_value_in_tag(book_series, "sb:volume-nr")
-            publisher = get_value_in_tag(ref, "sb:publisher")
+            publisher = get_value_in_elements(elements, "sb:publisher")
         if not year:
-            year = get_value_in_tag(ref, "sb:date")
+            year = get_value_in_elements(elements, "sb:date")
         year = re.sub(r'\D', '', year)
         return (label, authors, doi, issue, page, title, volume,
                 year, textref, ext_link, isjournal, comment, journal,
@@ -787,6 +847,7 @@ class ElsevierPackage(object):
     def get_article_journal(self, xml_doc):
         return CFG_ELSEVIER_JID_MAP[get_value_in_tag(xml_doc, "jid")]
 
+    @timed('elsevier.get_article')
     def get_article(self, path):
         if path.endswith('.xml'):
             data_file = path
@@ -804,12 +865,11 @@ class ElsevierPackage(object):
             raise
 
     def get_pdfa_record(self, path=None):
-        from invenio.search_engine import perform_request_search
         xml_doc = self.get_article(path)
         rec = create_record()
         dummy, dummy, dummy, dummy, dummy, dummy, dummy,\
             dummy, doi = self.get_publication_information(xml_doc)
-        recid = perform_request_search(p='0247_a:"%s" AND NOT 980:"DELETED"' % (doi,))
+        recid = self.doi_resolver.get_recids(doi)
         if recid:
             record_add_field(rec, '001', controlfield_value=recid[0])
         else:
@@ -861,6 +921,7 @@ class ElsevierPackage(object):
             license = 'CC-BY-3.0'
         return license, license_url
 
+    @timed('elsevier.get_record')
     def get_record(self, path=None, no_pdf=False,
                    test=False, refextract_callback=None):
         """Convert a record to MARCXML format.
@@ -1024,9 +1085,7 @@ class ElsevierPackage(object):
 
             record_add_field(rec, '773', subfields=subfields)
             if not no_pdf:
-                from invenio.search_engine import perform_request_search
-                query = '0247_a:"%s" AND NOT 980:DELETED"' % (doi,)
-                prev_version = perform_request_search(p=query)
+                prev_version = self.doi_resolver.get_recids(doi)
 
                 old_pdf = False
 
@@ -1082,10 +1141,14 @@ class ElsevierPackage(object):
             sys.stderr.write(message)
             return ""
 
+    @report_metrics('elsevier')
+    @timed('elsevier.bibupload')
     def bibupload_it(self):
         from invenio.bibtask import task_low_level_submission
         print(self.found_articles)
         if self.found_articles:
+            # Resolve the DOIs of the whole delivery at once
+            self.doi_resolver.prefetch(getattr(self, '_dois', {}).keys())
             if [x for x in self.found_articles if "vtex" not in x]:
                 self.logger.debug("Preparing bibupload.")
                 fd, name = mkstemp(suffix='.xml',
@@ -1095,8 +1158,12 @@ class ElsevierPackage(object):
                 print("<collection>", file=out)
                 for i, path in enumerate(self.found_articles):
                     if "vtex" not in path:
-                        print(self.get_record(path),
-                              file=out)
+                        record = self.get_record(path)
+                        if not record:
+                            count('articles.errors')
+                            continue
+                        print(record, file=out)
+                        count('articles.converted')
                         print(path, i + 1, "out of", len(self.found_articles))
                         xml_doc = self.get_article(path)
                         doi = self._get_doi(xml_doc)
@@ -1119,8 +1186,10 @@ class ElsevierPackage(object):
                 for i, path in enumerate(self.found_articles):
                     if "vtex" in path:
                         print(self.get_pdfa_record(path), file=out)
+                        count('articles.converted')
                         print(path, i + 1, "out of", len(self.found_articles))
                 print("</collection>", file=out)
                 out.close()
                 task_low_level_submission("bibupload", "admin", "-N",
                                           "Elsevier:VTEX", "-c", name_vtex)
+        log_summary(self.logger)
@@ -21,14 +21,126 @@ from __future__ import print_function
 import sys
 import os
 import time
+import json
+import logging
+import posixpath
 
 from ftplib import FTP, error_perm
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
 from os.path import join
 from os import remove, getcwd
 from urlparse import urlparse
 from netrc import netrc
 from datetime import datetime
 
+from .instrumentation import count, timed
+
+logger = logging.getLogger(__name__)
+
+
+def parse_mlsd_line(line):
+    """ Parses one line of a MLSD/MLST response.
+
+    :param line: the line as sent by the server, e.g.
+                 ``type=file;size=42;modify=20140101120000; name.zip``.
+    :type line: string
+
+    :returns: a tuple with the name of the entry and a dictionary
+              of its (lower-cased) facts.
+    """
+    facts, dummy, name = line.partition(' ')
+    result = {}
+    for fact in facts.split(';'):
+        if '=' in fact:
+            key, value = fact.split('=', 1)
+            result[key.lower()] = value
+    return name, result
+
+
+def parse_list_line(line):
+    """ Parses one line of a Unix-style LIST response into the same
+    format returned by parse_mlsd_line.
+
+    :param line: the line as sent by the server.
+    :type line: string
+
+    :returns: a tuple with the name of the entry and a dictionary
+              of its facts (only ``type`` and ``size`` are known).
+    """
+    columns = line.split()
+    if columns[0].startswith('d'):
+        entry_type = 'dir'
+    elif columns[0].startswith('-'):
+        entry_type = 'file'
+    else:
+        entry_type = 'other'
+    facts = {'type': entry_type}
+    if len(columns) > 4:
+        facts['size'] = columns[4]
+    return ' '.join(columns[8:]), facts
+
+
+def _decode(value):
+    """Return the UTF-8 byte strings as unicode, as stored in JSON."""
+    if isinstance(value, str):
+        return value.decode('utf-8')
+    return value
+
+
+class FtpListingCache(object):
+    """ Keeps the listings of remote folders together with their
+    modification time, so that folders which did not change since
+    the previous harvest do not need to be listed again.
+
+    The folders are identified by the server and their absolute path,
+    e.g. ``ftp.example.com:/data/in/EPJC``. Everything is kept as
+    unicode and the entries are returned as UTF-8, as listed.
+
+    :param filename: path of the JSON file used to persist the cache
+                     between runs. If empty the cache lives in memory.
+    :type filename: string
+    """
+    def __init__(self, filename=''):
+        self.filename = filename
+        self._folders = {}
+        if filename and os.path.exists(filename):
+            try:
+                with open(filename) as cache_file:
+                    self._folders = json.load(cache_file)
+            except ValueError:  # corrupted cache, start from scratch
+                self._folders = {}
+
+    def get(self, folder, modify):
+        """ Returns the cached entries of folder if its modification
+        time is still modify, None otherwise. """
+        cached = self._folders.get(_decode(folder))
+        if modify and cached and cached['modify'] == _decode(modify):
+            return [(name.encode('utf-8'),
+                     dict((key.encode('utf-8'), value.encode('utf-8'))
+                          for key, value in facts.iteritems()))
+                    for name, facts in cached['entries']]
+        return None
+
+    def put(self, folder, modify, entries):
+        """ Stores the entries of folder listed at time modify. """
+        if modify:
+            try:
+                self._folders[_decode(folder)] = {
+                    'modify': _decode(modify),
+                    'entries': [(_decode(name),
+                                 dict((_decode(key), _decode(value))
+                                      for key, value in facts.iteritems()))
+                                for name, facts in entries]}
+            except UnicodeDecodeError:  # only the UTF-8 names are kept
+                pass
+
+    def save(self):
+        """ Writes the cache to its file. """
+        if self.filename:
+            with open(self.filename, 'w') as cache_file:
+                json.dump(self._folders, cache_file)
+
 
 class FtpHandler(object):
     """ This class provides an interface to easily connect to an FTP server,
@@ -50,12 +162,14 @@ class FtpHandler(object):
             server = server.netloc
         elif server.path:
             server = server.path
+        self._server = server
         self._ftp = FTP(server)
         self._username = username
         self._passwd = passwd
         if netrc_file:
             logininfo = netrc(netrc_file).authenticators(server)
             self._username, _, self._passwd = logininfo
+        self._use_mlsd = True
         self.connect()
         self._home = self._ftp.pwd()
 
@@ -68,6 +182,14 @@ class FtpHandler(object):
         """ Closes the connection to the server. """
         self._ftp.close()
 
+    def clone(self):
+        """ Opens a new connection to the same server with the same
+        credentials, positioned in the current working directory. """
+        handler = FtpHandler(self._server, self._username, self._passwd)
+        handler._use_mlsd = self._use_mlsd
+        handler.cd(self._ftp.pwd())
+        return handler
+
     def download_folder(self, folder='', target_folder=''):
         """ Downloads a whole folder from the server.
         FtpHandler.download_folder() will download all the files
@@ -87,6 +209,7 @@ class FtpHandler(object):
         for fld in folders:
             self.download_folder(join(folder, fld), target_folder)
 
+    @timed('ftp.download')
     def download(self, source_file, target_folder=''):
         """ Downloads a file from the FTP server to target folder
 
@@ -122,9 +245,10 @@ class FtpHandler(object):
                 self._ftp.retrbinary('RETR %s' % (source_file,),
                                      result.write)
         except error_perm as e:  # source_file is a folder
-            print(e)
+            logger.error("Could not download %s: %s", source_file, e)
             remove(join(target_folder, source_file))
             raise
+        count('ftp.download.bytes', os.path.getsize(destination))
         self._ftp.cwd(current_folder)
 
     def cd(self, folder):
@@ -140,51 +264,172 @@ class FtpHandler(object):
                 if subfolder:
                     self._ftp.cwd(subfolder)
 
-    def ls(self, folder=''):
+    def list_entries(self, folder=''):
+        """ Lists the entries of a specific directory together with
+        their facts. MLSD is used when the server supports it,
+        otherwise the output of LIST is parsed.
+
+        :param folder: the folder to be listed.
+        :type folder: string
+
+        :returns: a list of (name, facts) tuples, where facts is
+                  a dictionary containing at least ``type``.
+        """
+        current_folder = self._ftp.pwd()
+        self.cd(folder)
+        contents = []
+        try:
+            if self._use_mlsd:
+                try:
+                    self._ftp.retrlines('MLSD', contents.append)
+                    return [parse_mlsd_line(line) for line in contents]
+                except error_perm:  # MLSD not supported by the server
+                    self._use_mlsd = False
+                    contents = []
+            self._ftp.retrlines('LIST', contents.append)
+            return [parse_list_line(line) for line in contents
+                    if line.strip() and not line.startswith('total')]
+        finally:
+            self._ftp.cwd(current_folder)
+
+    def get_modify(self, folder=''):
+        """ Returns the modification time of a folder using MLST, or an
+        empty string when the server does not support it.
+
+        :param folder: the folder to be checked.
+        :type folder: string
+        """
+        if not self._use_mlsd:
+            return ''
+        try:
+            response = self._ftp.sendcmd('MLST %s' % (folder or '.',))
+        except error_perm:
+            return ''
+        for line in response.splitlines()[1:]:
+            if line.startswith(' '):
+                return parse_mlsd_line(line.strip())[1].get('modify', '')
+        return ''
+
+    def ls(self, folder='', cache=None):
         """ Lists the files and folders of a specific directory
         default is the current working directory.
 
         :param folder: the folder to be listed.
         :type folder: string
+        :param cache: listing cache used to avoid listing the
+                      folder again if it did not change.
+        :type cache: FtpListingCache
 
         :returns: a tuple with the list of files in the folder
                   and the list of subfolders in the folder.
         """
-        current_folder = self._ftp.pwd()
-        self.cd(folder)
-        contents = []
-        self._ftp.retrlines('LIST', lambda a: contents.append(a))
-        files = filter(lambda a: a.split()[0].startswith('-'), contents)
-        folders = filter(lambda a: a.split()[0].startswith('d'), contents)
-        files = map(lambda a: ' '.join(a.split()[8:]), files)
-        folders = map(lambda a: ' '.join(a.split()[8:]), folders)
-        self._ftp.cwd(current_folder)
+        entries, dummy = self._cached_list_entries(folder, cache)
+        files = [name for name, facts in entries if facts['type'] == 'file']
+        folders = [name for name, facts in entries if facts['type'] == 'dir']
         return files, folders
 
-    def dir(self, folder='', prefix=''):
+    def _cache_key(self, folder, cwd=None):
+        """ Returns the key of folder in the listing caches: the server
+        and the absolute path of the folder. """
+        if cwd is None:
+            cwd = self._ftp.pwd()
+        return '%s:%s' % (self._server,
+                          posixpath.normpath(posixpath.join(cwd, folder)))
+
+    def _cached_list_entries(self, folder, cache, modify=None, cwd=None):
+        """ Returns a tuple with the entries of folder and a flag telling
+        whether they were listed from the server (and not the cache).
+        cwd is the working directory folder is relative to, when known. """
+        if cache is None:
+            return self.list_entries(folder), True
+        if modify is None:
+            modify = self.get_modify(folder)
+        key = self._cache_key(folder, cwd)
+        entries = cache.get(key, modify)
+        if entries is not None:
+            return entries, False
+        entries = self.list_entries(folder)
+        cache.put(key, modify, entries)
+        return entries, True
+
+    def dir(self, folder='', prefix='', workers=1, cache=None):
         """ Lists all the files on the folder given as parameter.
         FtpHandler.dir() lists all the files on the server.
 
+        The tree is walked breadth-first, each level being listed
+        in parallel over up to ``workers`` connections.
+
         :para folder: the folder to be listed.
         :type folder: string
 
-        :param prefix: it does not belong to the interface,
-                       it is used to recursively list the subfolders.
+        :param prefix: prefix prepended to every returned file name.
+        :type prefix: string
+
+        :param workers: number of connections used to list the folders.
+        :type workers: int
+
+        :param cache: listing cache used to skip the folders that did
+                      not change since the previous listing.
+        :type cache: FtpListingCache
 
         :returns: a list with all the files in the server.
         """
-        files, folders = self.ls(folder)
-        result = files
-        inner = []
-        for fld in folders:
+        handlers = Queue()
+        handlers.put(self)
+        opened = []
+        # The clones are opened in the same working directory
+        cwd = self._ftp.pwd() if cache is not None else None
+
+        def list_folder(args):
+            fld, modify = args
+            handler = handlers.get()
             try:
-                inner += self.dir(folder + '/' + fld, prefix + fld + '/')
-            except:
-                pass
-        result += inner
-        if prefix:
-            result = map(lambda a: prefix + a, result)
-        return result
+                return handler._cached_list_entries(fld, cache, modify, cwd)
+            except Exception as e:
+                if fld == folder:
+                    raise
+                logger.warning("Could not list %s: %s", fld, e)
+                return None, False
+            finally:
+                handlers.put(handler)
+
+        # Every folder comes with its modification time when it is known
+        # from a fresh listing of its parent, so that no MLST is needed.
+        level = [(folder, None)]
+        listings = {}
+        pool = ThreadPool(max(workers, 1))
+        try:
+            while level:
+                while len(opened) < min(workers, len(level)) - 1:
+                    handler = self.clone()
+                    opened.append(handler)
+                    handlers.put(handler)
+                next_level = []
+                for (fld, dummy), (entries, fresh) in \
+                        zip(level, pool.map(list_folder, level)):
+                    listings[fld] = entries or []
+                    for name, facts in listings[fld]:
+                        if facts['type'] == 'dir':
+                            modify = facts.get('modify') if fresh else None
+                            next_level.append((fld + '/' + name, modify))
+                level = next_level
+        finally:
+            pool.close()
+            for handler in opened:
+                handler.close()
+        if cache is not None:
+            cache.save()
+
+        def collect(fld, fld_prefix):
+            result = [fld_prefix + name for name, facts in listings[fld]
+                      if facts['type'] == 'file']
+            for name, facts in listings[fld]:
+                if facts['type'] == 'dir':
+                    result += collect(fld + '/' + name,
+                                      fld_prefix + name + '/')
+            return result
+
+        return collect(folder, prefix)
 
     def mkdir(self, folder):
         """ Creates a folder in the server
@@ -315,6 +560,7 @@ class FtpHandler(object):
             logger.error("Integrity check failed for files %s"
                          % (not_finished_files,))
 
+    @timed('ftp.upload')
     def upload(self, filename, location=''):
         """ Uploads a file on the server to the desired location
 
@@ -330,5 +576,6 @@ class FtpHandler(object):
         fl = open(filename, 'rb')
         filename = filename.split('/')[-1]
         self._ftp.storbinary('STOR %s' % filename, fl)
+        count('ftp.upload.bytes', os.fstat(fl.fileno()).st_size)
         fl.close()
         self.cd(current_folder)
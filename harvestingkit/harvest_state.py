@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Persistent record of the packages harvested from a publisher."""
+
+import os
+import hashlib
+
+from datetime import datetime
+
+from .sqlite_utils import SQLiteStore
+
+
+STATUS_DOWNLOADED = 'downloaded'
+STATUS_EXTRACTED = 'extracted'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# SQLite refuses more than 999 host parameters in a single statement.
+_LOOKUP_CHUNK_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    name TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    digest TEXT,
+    status TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS packages_status ON packages (status);
+CREATE TABLE IF NOT EXISTS dois (
+    package TEXT NOT NULL,
+    doi TEXT NOT NULL,
+    PRIMARY KEY (package, doi)
+);
+CREATE INDEX IF NOT EXISTS dois_doi ON dois (doi);
+"""
+
+
+def file_digest(path, chunk_size=1024 * 64):
+    """Return the MD5 hex digest of a file, read in chunks."""
+    md5 = hashlib.md5()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), ''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class HarvestState(SQLiteStore):
+    """
+    SQLite-backed store of the packages seen on a publisher server.
+
+    For every package it keeps the size, modification time and digest
+    of the downloaded file, its processing status and the DOIs produced
+    from it. Detecting new packages is an indexed lookup, so the
+    downloaded files do not have to be kept on disk.
+
+    :param filename: path to the SQLite database. It is created, together
+                     with its folder, on first use.
+    :type filename: string
+    """
+
+    SCHEMA = _SCHEMA
+
+    def __contains__(self, name):
+        cursor = self.connection.execute(
+            "SELECT 1 FROM packages WHERE name = ?", (name,))
+        return cursor.fetchone() is not None
+
+    def is_empty(self):
+        cursor = self.connection.execute("SELECT 1 FROM packages LIMIT 1")
+        return cursor.fetchone() is None
+
+    def filter_new(self, names):
+        """Return the names (in the given order) not yet in the store.
+
+        The packages which failed, e.g. on a MD5 or extraction error, are
+        returned again, so that they are downloaded by the next run.
+        """
+        names = list(names)
+        known = set()
+        for i in range(0, len(names), _LOOKUP_CHUNK_SIZE):
+            chunk = names[i:i + _LOOKUP_CHUNK_SIZE]
+            query = ("SELECT name FROM packages WHERE status != ? "
+                     "AND name IN (%s)" % (", ".join("?" * len(chunk)),))
+            known.update(row[0] for row in
+                         self.connection.execute(query,
+                                                 [STATUS_FAILED] + chunk))
+        return [name for name in names if name not in known]
+
+    def add_package(self, name, path=None, digest=None,
+                    status=STATUS_DOWNLOADED):
+        """Record a package, taking size, mtime and digest from path.
+
+        :param name: name of the package on the server.
+        :type name: string
+        :param path: local path of the downloaded package, if any.
+        :type path: string
+        :param digest: MD5 digest of the package. Computed from path
+                       when not given.
+        :type digest: string
+        :param status: processing status of the package.
+        :type status: string
+        """
+        size = mtime = None
+        if path and os.path.exists(path):
+            stat = os.stat(path)
+            size, mtime = stat.st_size, stat.st_mtime
+            if digest is None:
+                digest = file_digest(path)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO packages "
+                "(name, size, mtime, digest, status, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (name, size, mtime, digest, status,
+                 datetime.now().isoformat()))
+
+    def seed(self, names, status=STATUS_DONE):
+        """Record already processed packages, e.g. from an old local copy."""
+        now = datetime.now().isoformat()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO packages (name, status, updated) "
+                "VALUES (?, ?, ?)",
+                ((name, status, now) for name in names))
+
+    def set_status(self, name, status):
+        with self.connection:
+            self.connection.execute(
+                "UPDATE packages SET status = ?, updated = ? WHERE name = ?",
+                (status, datetime.now().isoformat(), name))
+
+    def add_dois(self, name, dois):
+        """Record the DOIs of the articles produced from a package."""
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO dois (package, doi) VALUES (?, ?)",
+                ((name, doi) for doi in dois))
+
+    def get_package(self, name):
+        """Return the stored information of a package as a dict or None."""
+        cursor = self.connection.execute(
+            "SELECT name, size, mtime, digest, status, updated "
+            "FROM packages WHERE name = ?", (name,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        package = dict(zip(('name', 'size', 'mtime', 'digest',
+                            'status', 'updated'), row))
+        package['dois'] = self.get_dois(name)
+        return package
+
+    def get_packages(self, status=None):
+        """Return the names of all the packages, optionally by status."""
+        if status is None:
+            cursor = self.connection.execute(
+                "SELECT name FROM packages ORDER BY name")
+        else:
+            cursor = self.connection.execute(
+                "SELECT name FROM packages WHERE status = ? ORDER BY name",
+                (status,))
+        return [row[0] for row in cursor]
+
+    def get_dois(self, name):
+        cursor = self.connection.execute(
+            "SELECT doi FROM dois WHERE package = ? ORDER BY doi", (name,))
+        return [row[0] for row in cursor]
+
+    def find_package(self, doi):
+        """Return the name of the package which delivered doi, or None."""
+        cursor = self.connection.execute(
+            "SELECT package FROM dois WHERE doi = ?", (doi,))
+        row = cursor.fetchone()
+        return row[0] if row else None
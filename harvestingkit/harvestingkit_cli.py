@@ -1,4 +1,6 @@
 #!/usr/bin/env python
+import json
+
 from argparse import ArgumentParser
 
 from ConfigParser import ConfigParser
@@ -8,6 +10,7 @@ from harvestingkit.oup_package import OxfordPackage
 from harvestingkit.springer_package import SpringerPackage
 
 from harvestingkit.config import CFG_CONFIG_PATH
+from harvestingkit.instrumentation import stats
 
 
 class Bunch:
@@ -118,6 +121,10 @@ def call_package(settings):
 
 def main():
     argparser = ArgumentParser()
+    argparser.add_argument('--profile', action='store_true',
+                           help='time the stages of the run')
+    argparser.add_argument('--profile-output', metavar='FILE',
+                           help='save the stage timings to FILE as JSON')
 
     subparsers = argparser.add_subparsers(dest='selected_subparser')
 
@@ -154,7 +161,14 @@ def main():
 
     settings = Bunch(vars(argparser.parse_args()))
 
+    if settings.profile or settings.profile_output:
+        stats.enable()
     call_package(settings)
+    if stats.enabled:
+        print stats.format_summary()
+        if settings.profile_output:
+            with open(settings.profile_output, 'w') as output:
+                json.dump(stats.as_dict(), output, indent=2)
 
 
 if __name__ == '__main__':
@@ -23,52 +23,143 @@ Set of utilities for the SCOAP3 project to parse Hindawi OAI-PMH feeds.
 
 import sys
 import os
-from xml.dom.minidom import parse
+from xml.dom import pulldom
 
-from invenio.bibupload import find_records_from_extoaiid
 from harvestingkit.utils import (record_add_field,
                                  record_xml_output,
-                                 create_record)
+                                 create_record,
+                                 get_record_fields)
 from harvestingkit.minidom_utils import (xml_to_text,
                                          get_value_in_tag)
+from harvestingkit.config import CFG_HINDAWI_LOOKUP_BATCH_SIZE
 
 
-def get_xml(input=sys.stdin):
-    return parse(input)
+class RecordFile(object):
+    """
+    MARCXML collection written one record at a time.
 
+    The file is only created when the first record is written.
+    """
 
-def create_record_file(filename, records):
-    if not records:
-        return
-    print >> sys.stderr, "Creating %s with %s records" % (filename, len(records))
-    marcxml = open(filename, "w")
-    print >> marcxml, "<collection>"
-    for record in records:
-        print >> marcxml, record
-    print >> marcxml, "</collection>"
+    def __init__(self, filename):
+        self.filename = filename
+        self.count = 0
+        self._out = None
+
+    def write(self, record):
+        if self._out is None:
+            self._out = open(self.filename, "w")
+            print >> self._out, "<collection>"
+        print >> self._out, record
+        self.count += 1
+
+    def close(self):
+        if self._out is not None:
+            print >> self._out, "</collection>"
+            self._out.close()
+            self._out = None
+            print >> sys.stderr, "Created %s with %s records" % (
+                self.filename, self.count)
+
+
+def find_known_identifiers(oai_identifiers, source='Hindawi'):
+    """Return the OAI identifiers already harvested from source.
+
+    The identifiers are searched for with a single query, and the 035
+    fields of all the matching records are then read with another one
+    to check their provenance.
+    """
+    from invenio.search_engine import perform_request_search
+    wanted = set(oai_identifiers)
+    if not wanted:
+        return set()
+    query = " OR ".join('035__a:"%s"' % (identifier,)
+                        for identifier in wanted)
+    known = set()
+    recids = perform_request_search(p=query, of="id")
+    for dummy, subfields in get_record_fields(recids, '035'):
+        if source in subfields.get('9', []):
+            known.update(wanted.intersection(subfields.get('a', [])))
+    return known
+
+
+def get_oai_identifier(record):
+    header = record.getElementsByTagName("header")[0]
+    return get_value_in_tag(header, "identifier")
+
+
+def iter_records(input):
+    """Stream an OAI-PMH response.
+
+    Yields the responseDate and request elements and then every record
+    as separate DOM elements, never holding the whole response.
+    """
+    events = pulldom.parse(input)
+    for event, node in events:
+        if event == pulldom.START_ELEMENT and \
+                node.localName in ("responseDate", "request", "record"):
+            events.expandNode(node)
+            yield node
 
 
-def bibfilter(filename):
+def bibfilter(filename, lookup=find_known_identifiers,
+              batch_size=CFG_HINDAWI_LOOKUP_BATCH_SIZE):
+    """Split an OAI-PMH response in new and updated MARCXML records.
+
+    The records are read, looked up and written in batches, so the
+    memory used does not depend on the size of the response.
+
+    :param filename: path of the OAI-PMH response.
+    :param lookup: callable returning which of the given OAI identifiers
+                   are already in the repository, e.g. the intersection
+                   method of a set of identifiers.
+    :param batch_size: number of records looked up at once.
+    """
     print >> sys.stderr, "Parsing %s" % filename
-    xml = get_xml(open(filename))
-    request = xml.getElementsByTagName("request")[0].toxml()
-    response_date = get_value_in_tag(xml, "responseDate")
-    new_records, updated_records = [], []
-    records = xml.getElementsByTagName("record")
-    print >> sys.stderr, "Found %s records" % len(records)
+    request = ""
+    response_date = ""
+    new_records = RecordFile(filename + '.insert.xml')
+    updated_records = RecordFile(filename + '.correct.xml')
+    count = 0
+    try:
+        batch = []
+        for node in iter_records(open(filename)):
+            if node.localName == "responseDate":
+                response_date = xml_to_text(node)
+            elif node.localName == "request":
+                request = node.toxml()
+            else:
+                batch.append(node)
+                count += 1
+                if len(batch) >= batch_size:
+                    filter_records(batch, response_date, request, lookup,
+                                   new_records, updated_records)
+                    batch = []
+        if batch:
+            filter_records(batch, response_date, request, lookup,
+                           new_records, updated_records)
+    finally:
+        new_records.close()
+        updated_records.close()
+    print >> sys.stderr, "Found %s records" % count
+
+
+def filter_records(records, response_date, request, lookup,
+                   new_records, updated_records):
+    """Convert a batch of records and write them to the right file."""
+    known = lookup([get_oai_identifier(record) for record in records])
     for record in records:
-        marcxml, new = convert_record(record, response_date, request)
+        new = get_oai_identifier(record) not in known
+        marcxml, new = convert_record(record, response_date, request, new)
         if marcxml is None:
             continue
         if new:
-            new_records.append(marcxml)
+            new_records.write(marcxml)
         else:
-            updated_records.append(marcxml)
-    create_record_file(filename + '.insert.xml', new_records)
-    create_record_file(filename + '.correct.xml', updated_records)
+            updated_records.write(marcxml)
 
 
-def convert_record(record, response_date, request):
+def convert_record(record, response_date, request, new=None):
     header = record.getElementsByTagName("header")[0]
     oai_identifier = get_value_in_tag(header, "identifier")
     datestamp = get_value_in_tag(header, "datestamp")
@@ -81,9 +172,8 @@ def convert_record(record, response_date, request):
                                                 ('h', response_date),
                                                 ('m', 'marc21'),
                                                 ('t', 'false')])
-    new = True
-    if find_records_from_extoaiid(oai_identifier, 'Hindawi'):
-        new = False
+    if new is None:
+        new = oai_identifier not in find_known_identifiers([oai_identifier])
     if status == 'deleted':
         if new:
             ## deleting a record we didn't have? Who cares :-)
@@ -31,7 +31,16 @@ from ..bibrecord import (record_get_field_instances,
                          field_get_subfields,
                          BibRecordPackage)
 
-from ..utils import create_logger
+from ..utils import create_logger, get_record_fields
+from ..config import CFG_MATCH_BATCH_SIZE
+from ..instrumentation import timed
+
+
+@timed('invenio.search')
+def perform_search(pattern):
+    """Return the ids of the records matching pattern in Invenio."""
+    from invenio.search_engine import perform_request_search
+    return perform_request_search(p=pattern, of="id")
 
 
 class MARCXMLConversion(object):
@@ -150,19 +159,109 @@ class MARCXMLConversion(object):
             self.local_folder = mkdtemp()
         return self.local_folder
 
-    def match(self, query=None, **kwargs):
-        """Try to match the current record to the database."""
-        from invenio.search_engine import perform_request_search
+    @classmethod
+    def match_all(cls, conversions, query=None, batch_size=CFG_MATCH_BATCH_SIZE,
+                  search=perform_search, cache=None, run_sql=None,
+                  **kwargs):
+        """Match many records to the database with few searches.
+
+        The match queries of the records are OR-ed together by batches.
+        With the default query, the 035 values of the hits of a batch
+        are then read with a single query to find the records matched
+        by each of its records. With a query template, whose matched
+        field cannot be read back, a batch without any hit settles all
+        its records at once, the others are split in halves until every
+        record is settled.
+
+        >>> from harvestingkit.inspire_cds_package import CDS2Inspire
+        >>> conversions = list(CDS2Inspire.from_source("cds.xml"))
+        >>> matches = CDS2Inspire.match_all(conversions)
+
+        :param conversions: list of conversion objects
+        :type conversions: list
+        :param query: query template, as for match()
+        :type query: string
+        :param search: function returning the ids of the records matching
+                       a search pattern, e.g. backed by a local index.
+        :type search: callable
+        :param cache: dict of the already matched patterns, filled in
+                      by the call. By default a new one is used, so the
+                      matches are never older than the call.
+        :type cache: dict
+        :param run_sql: runs the query reading the 035 values of the hits,
+                        invenio.dbquery.run_sql by default.
+        :type run_sql: callable
+
+        :returns: dict from the record ID of each conversion to the
+                  list of matched record IDs
+        """
+        if cache is None:
+            cache = {}
+        patterns = [conversion.get_match_query(query, **kwargs)
+                    for conversion in conversions]
+        pending = sorted(set(p for p in patterns if p not in cache))
+        for i in range(0, len(pending), batch_size):
+            if query:
+                cls._match_batch(pending[i:i + batch_size], search, cache)
+            else:
+                cls._match_identifiers(pending[i:i + batch_size], search,
+                                       cache, run_sql)
+        return dict((conversion.get_recid(), cache[pattern])
+                    for conversion, pattern in zip(conversions, patterns))
+
+    @classmethod
+    def _match_identifiers(cls, patterns, search, cache, run_sql=None):
+        """Settle the matches of default patterns with a search and a query.
+
+        The hits of the OR-ed patterns are mapped back to the identifiers
+        of the patterns through their 035 values.
+        """
+        hits = search(" OR ".join("(%s)" % (p,) for p in patterns))
+        recids = {}
+        for recid, subfields in get_record_fields(hits, '035', run_sql):
+            for values in subfields.values():
+                for value in values:
+                    recids.setdefault(value, set()).add(recid)
+        for pattern in patterns:
+            identifier = pattern[len("035:"):]
+            cache[pattern] = sorted(recids.get(identifier, []))
+
+    @classmethod
+    def _match_batch(cls, patterns, search, cache, hits=None):
+        """Settle the matches of patterns by bisection.
+
+        hits, when given, are the results of the OR-ed patterns.
+        """
+        if hits is None:
+            hits = search(" OR ".join("(%s)" % (p,) for p in patterns))
+        if not hits or len(patterns) == 1:
+            for pattern in patterns:
+                cache[pattern] = list(hits)
+        elif len(hits) >= len(patterns):
+            # Most records match: splitting would not save searches
+            for pattern in patterns:
+                cache[pattern] = list(search(pattern))
+        else:
+            middle = len(patterns) // 2
+            first_hits = search(" OR ".join("(%s)" % (p,)
+                                            for p in patterns[:middle]))
+            cls._match_batch(patterns[:middle], search, cache, first_hits)
+            # Without hits in the first half, all of them are in the second
+            cls._match_batch(patterns[middle:], search, cache,
+                             None if first_hits else hits)
+
+    def get_match_query(self, query=None, **kwargs):
+        """Return the search pattern used to match the current record."""
         if not query:
             # We use default setup
-            recid = self.record["001"][0][3]
-            return perform_request_search(p="035:%s" % (recid,),
-                                          of="id")
-        else:
-            if "recid" not in kwargs:
-                kwargs["recid"] = self.record["001"][0][3]
-            return perform_request_search(p=query % kwargs,
-                                          of="id")
+            return "035:%s" % (self.record["001"][0][3],)
+        if "recid" not in kwargs:
+            kwargs["recid"] = self.record["001"][0][3]
+        return query % kwargs
+
+    def match(self, query=None, **kwargs):
+        """Try to match the current record to the database."""
+        return perform_search(self.get_match_query(query, **kwargs))
 
     def remove_controlfields(self):
         """Clear any existing control fields."""
@@ -50,11 +50,14 @@ from ..utils import (
     convert_date_to_iso,
     unzip,
     locate,
-    download_file,
+    get_downloader,
 )
+from ..config import CFG_PLOT_DOWNLOAD_WORKERS
+from ..instrumentation import timed, timed_methods
 from .base import MARCXMLConversion
 
 
+@timed_methods('cds2inspire')
 class CDS2Inspire(MARCXMLConversion):
 
     """Convert CDS to INSPIRE."""
@@ -67,6 +70,7 @@ class CDS2Inspire(MARCXMLConversion):
         super(CDS2Inspire, self).__init__(bibrec, strip_fields_list)
         self.collections = set([])
 
+    @timed('cds2inspire.get_record')
     def get_record(self):
         """Override the base get_record."""
         self.update_system_numbers()
@@ -382,65 +386,104 @@ class CDS2Inspire(MARCXMLConversion):
                                 field_position_global=field[4])
             record_add_field(self.record, "773", subfields=new_subs)
 
+    @staticmethod
+    def _is_figure_link(subs):
+        """Return True if the 856 subfields describe a figure."""
+        if 'z' in subs and 'u' in subs:
+            is_figure = [s for s in subs['z'] if "figure" in s.lower()]
+            is_subformat = [s for s in subs['u'] if "subformat" in s.lower()]
+            return bool(is_figure) and not is_subformat
+        return False
+
+    def _get_link_download(self, subs):
+        """Return the (url, local file) to download for a 856, or None.
+
+        Figures given as PDF are downloaded to be converted, and plot
+        archives to be unzipped.
+        """
+        if self._is_figure_link(subs):
+            url = subs['u'][0]
+            if url.endswith(".pdf"):
+                fd, local_url = mkstemp(suffix=os.path.basename(url))
+                os.close(fd)
+                return url, local_url
+        elif 'u' in subs and not [s for s in subs['u'] if ".pdf" in s]:
+            is_zipfile = [s for s in subs['u'] if ".zip" in s]
+            if is_zipfile:
+                local_url = os.path.join(self.get_local_folder(),
+                                         os.path.basename(is_zipfile[0]))
+                return is_zipfile[0], local_url
+        return None
+
+    def _fetch_link_downloads(self, downloads):
+        """Download concurrently and return the results, in order."""
+        to_fetch = [download for download in downloads if download]
+        for url, local_url in to_fetch:
+            self.logger.info("Downloading %s into %s" % (url, local_url))
+        results = iter(get_downloader().download_many(
+            to_fetch, workers=CFG_PLOT_DOWNLOAD_WORKERS))
+        return [next(results) if download else None
+                for download in downloads]
+
     def update_links_and_ffts(self):
-        """FFT (856) Dealing with graphs."""
+        """FFT (856) Dealing with graphs.
+
+        All the figures and plot archives are first downloaded
+        concurrently, then the fields are processed in their order.
+        """
+        fields = record_get_field_instances(self.record,
+                                            tag='856',
+                                            ind1='4')
+        downloads = [self._get_link_download(field_get_subfields(field))
+                     for field in fields]
+        results = self._fetch_link_downloads(downloads)
+
         figure_counter = 0
-        for field in record_get_field_instances(self.record,
-                                                tag='856',
-                                                ind1='4'):
+        for field, download, result in zip(fields, downloads, results):
             subs = field_get_subfields(field)
 
             newsubs = []
             remove = False
 
-            if 'z' in subs:
-                is_figure = [s for s in subs['z'] if "figure" in s.lower()]
-                if is_figure and 'u' in subs:
-                    is_subformat = [
-                        s for s in subs['u'] if "subformat" in s.lower()]
-                    if not is_subformat:
-                        url = subs['u'][0]
-                        if url.endswith(".pdf"):
-                            # We try to convert
-                            fd, local_url = mkstemp(suffix=os.path.basename(url))
-                            os.close(fd)
-                            self.logger.info(
-                                "Downloading %s into %s" % (url, local_url))
-                            plotfile = ""
-                            try:
-                                plotfile = download_file(url=url,
-                                                         download_to_file=local_url)
-                            except Exception as e:
-                                self.logger.exception(e)
-                                remove = True
-                            if plotfile:
-                                converted = convert_images([plotfile])
-                                if converted:
-                                    url = converted.pop()
-                                    msg = "Successfully converted %s to %s" \
-                                          % (local_url, url)
-                                    self.logger.info(msg)
-                                else:
-                                    msg = "Conversion failed on %s" \
-                                          % (local_url,)
-                                    self.logger.error(msg)
-                                    url = None
-                                    remove = True
-                        if url:
-                            newsubs.append(('a', url))
-                            newsubs.append(('t', 'Plot'))
-                            figure_counter += 1
-                            if 'y' in subs:
-                                newsubs.append(
-                                    ('d', "%05d %s" % (figure_counter, subs['y'][0])))
-                                newsubs.append(('n', subs['y'][0]))
-                            else:
-                                # Get basename without extension.
-                                name = os.path.basename(
-                                    os.path.splitext(subs['u'][0])[0])
-                                newsubs.append(
-                                    ('d', "%05d %s" % (figure_counter, name)))
-                                newsubs.append(('n', name))
+            if self._is_figure_link(subs):
+                url = subs['u'][0]
+                if download:
+                    # We try to convert
+                    local_url = download[1]
+                    plotfile = ""
+                    if isinstance(result, Exception):
+                        self.logger.exception(result)
+                        remove = True
+                    else:
+                        plotfile = result
+                    if plotfile:
+                        converted = convert_images([plotfile])
+                        if converted:
+                            url = converted.pop()
+                            msg = "Successfully converted %s to %s" \
+                                  % (local_url, url)
+                            self.logger.info(msg)
+                        else:
+                            msg = "Conversion failed on %s" \
+                                  % (local_url,)
+                            self.logger.error(msg)
+                            url = None
+                            remove = True
+                if url:
+                    newsubs.append(('a', url))
+                    newsubs.append(('t', 'Plot'))
+                    figure_counter += 1
+                    if 'y' in subs:
+                        newsubs.append(
+                            ('d', "%05d %s" % (figure_counter, subs['y'][0])))
+                        newsubs.append(('n', subs['y'][0]))
+                    else:
+                        # Get basename without extension.
+                        name = os.path.basename(
+                            os.path.splitext(subs['u'][0])[0])
+                        newsubs.append(
+                            ('d', "%05d %s" % (figure_counter, name)))
+                        newsubs.append(('n', name))
 
             if not newsubs and 'u' in subs:
                 is_fulltext = [s for s in subs['u'] if ".pdf" in s]
@@ -449,20 +492,13 @@ class CDS2Inspire(MARCXMLConversion):
 
             if not newsubs and 'u' in subs:
                 remove = True
-                is_zipfile = [s for s in subs['u'] if ".zip" in s]
-                if is_zipfile:
-                    url = is_zipfile[0]
-
-                    local_url = os.path.join(self.get_local_folder(), os.path.basename(url))
-                    self.logger.info("Downloading %s into %s" %
-                                     (url, local_url))
+                if download:
                     zipped_archive = ""
-                    try:
-                        zipped_archive = download_file(url=is_zipfile[0],
-                                                      download_to_file=local_url)
-                    except Exception as e:
-                        self.logger.exception(e)
+                    if isinstance(result, Exception):
+                        self.logger.exception(result)
                         remove = True
+                    else:
+                        zipped_archive = result
                     if zipped_archive:
                         unzipped_archive = unzip(zipped_archive)
                         list_of_pngs = locate("*.png", unzipped_archive)
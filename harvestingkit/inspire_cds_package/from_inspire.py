@@ -44,9 +44,11 @@ from ..utils import (
     return_letters_from_string
 )
 
+from ..instrumentation import timed, timed_methods
 from .base import MARCXMLConversion
 
 
+@timed_methods('inspire2cds')
 class Inspire2CDS(MARCXMLConversion):
 
     """Convert INSPIRE to CDS."""
@@ -175,6 +177,7 @@ class Inspire2CDS(MARCXMLConversion):
         for field in new_fields:
             record_add_field(self.record, tag="856", ind1="4", subfields=field)
 
+    @timed('inspire2cds.get_record')
     def get_record(self):
         """Override the base."""
         self.recid = self.get_recid()
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Timers and counters of the stages of the conversions and harvests.
+
+The instrumentation is off unless ``HARVESTINGKIT_PROFILE`` is set or
+``stats.enable()`` is called, and then only costs a flag check per
+instrumented call::
+
+    from harvestingkit.instrumentation import count, stage, timed
+
+    @timed('elsevier.get_record')
+    def get_record(self, path):
+        with stage('elsevier.parse'):
+            ...
+        count('elsevier.references', len(references))
+
+At the end of a run, ``stats.format_summary()`` returns a table of the
+stages and ``stats.as_dict()`` the same data as a dict.
+"""
+
+import time
+import types
+import threading
+
+from functools import wraps
+
+from .config import CFG_INSTRUMENTATION
+
+
+class Stage(object):
+    """Context manager adding the time spent in it to a stage."""
+
+    __slots__ = ('stats', 'name', 'start')
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stats.add_time(self.name, time.time() - self.start)
+
+
+class NullStage(object):
+    """Context manager doing nothing, used when the stats are off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Instrumentation(object):
+    """
+    Collects the time spent in each stage and named counters.
+
+    Every stage keeps its number of calls, its total time and its
+    longest call. Stages may be nested, the time of a stage includes
+    the time of the stages it calls. Collecting is thread safe.
+
+    :param enabled: whether to collect from the start.
+    :type enabled: bool
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.started = time.time()
+        self.timings = {}
+        self.counters = {}
+
+    def stage(self, name):
+        """Return a context manager timing the stage name."""
+        if self.enabled:
+            return Stage(self, name)
+        return NULL_STAGE
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                self.timings[name] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+    def count(self, name, value=1):
+        """Add value to the counter name."""
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def timed(self, name):
+        """Decorator timing every call of a function as the stage name."""
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                with Stage(self, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def as_dict(self):
+        """Return the collected data, ready to be dumped as JSON."""
+        with self._lock:
+            stages = dict((name, {'calls': calls,
+                                  'seconds': seconds,
+                                  'max_seconds': longest})
+                          for name, (calls, seconds, longest)
+                          in self.timings.items())
+            counters = dict(self.counters)
+        return {'elapsed': time.time() - self.started,
+                'stages': stages,
+                'counters': counters}
+
+    def format_summary(self):
+        """Return a table of the stages, the slowest first, and of the
+        counters."""
+        data = self.as_dict()
+        lines = ["%-45s %8s %10s %10s %10s" % ('stage', 'calls', 'total s',
+                                               'mean ms', 'max ms')]
+        stages = sorted(data['stages'].items(),
+                        key=lambda item: item[1]['seconds'], reverse=True)
+        for name, timing in stages:
+            lines.append("%-45s %8d %10.3f %10.2f %10.2f" % (
+                name, timing['calls'], timing['seconds'],
+                timing['seconds'] * 1000 / timing['calls'],
+                timing['max_seconds'] * 1000))
+        for name, value in sorted(data['counters'].items()):
+            lines.append("%-45s %8s" % (name, value))
+        lines.append("%-45s %8s %10.3f" % ('elapsed', '', data['elapsed']))
+        return "\n".join(lines)
+
+
+stats = Instrumentation(CFG_INSTRUMENTATION)
+
+
+def stage(name):
+    return stats.stage(name)
+
+
+def count(name, value=1):
+    stats.count(name, value)
+
+
+def timed(name):
+    return stats.timed(name)
+
+
+def timed_methods(prefix, starting_with=('update_',)):
+    """
+    Class decorator timing the methods whose name starts with one of
+    starting_with, inherited ones included, as the stages
+    ``prefix.method_name``.
+    """
+    def decorator(cls):
+        done = set()
+        for klass in cls.__mro__:
+            for name, value in vars(klass).items():
+                if name in done or not name.startswith(starting_with) or \
+                        not isinstance(value, types.FunctionType):
+                    continue
+                done.add(name)
+                setattr(cls, name, timed('%s.%s' % (prefix, name))(value))
+        return cls
+    return decorator
+
+
+def log_summary(logger):
+    """Log the summary of the stages when the instrumentation is on."""
+    if stats.enabled:
+        logger.info("Stages of the run:\n%s" % (stats.format_summary(),))
@@ -26,11 +26,16 @@ from datetime import date, datetime
 from harvestingkit.utils import (fix_journal_name,
                                  collapse_initials)
 from harvestingkit.bibrecord import record_add_field
-from harvestingkit.minidom_utils import (get_value_in_tag,
+from harvestingkit.minidom_utils import (get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         get_value_in_tag,
                                          xml_to_text,
                                          get_attribute_in_tag,
                                          get_inner_xml)
 
+# Elements of a contrib read for its author
+AUTHOR_TAGS = ('contrib', 'surname', 'given-names', 'xref')
+
 
 class JatsPackage(object):
 
@@ -114,27 +119,28 @@ class JatsPackage(object):
     def _get_authors(self):
         authors = []
         for contrib in self.document.getElementsByTagName('contrib'):
+            elements = get_elements_by_tag_names(contrib, AUTHOR_TAGS)
             # Springer puts colaborations in additional "contrib" tag so to
             # avoid having fake author with all affiliations we skip "contrib"
             # tag with "contrib" subtags.
-            if contrib.getElementsByTagName('contrib'):
+            if elements['contrib']:
                 continue
             if contrib.getAttribute('contrib-type') == 'author':
-                surname = get_value_in_tag(contrib, 'surname')
-                given_names = get_value_in_tag(contrib, 'given-names')
+                surname = get_value_in_elements(elements, 'surname')
+                given_names = get_value_in_elements(elements, 'given-names')
                 given_names = collapse_initials(given_names)
                 name = '%s, %s' % (surname, given_names)
                 affiliations = []
                 corresp = []
-                for tag in contrib.getElementsByTagName('xref'):
-                    if tag.getAttribute('ref-type') == 'aff':
+                for tag in elements['xref']:
+                    ref_type = tag.getAttribute('ref-type')
+                    if ref_type == 'aff':
                         for rid in tag.getAttribute('rid').split():
                             if rid.lower().startswith('a'):
                                 affiliations.append(rid)
                             elif rid.lower().startswith('n'):
                                 corresp.append(rid)
-                    elif tag.getAttribute('ref-type') == 'corresp' or\
-                            tag.getAttribute('ref-type') == 'author-notes':
+                    elif ref_type == 'corresp' or ref_type == 'author-notes':
                         for rid in tag.getAttribute('rid').split():
                             corresp.append(rid)
                 authors.append((name, affiliations, corresp))
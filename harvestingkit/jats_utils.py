@@ -27,11 +27,15 @@ from os.path import (join,
 try:
     from invenio.errorlib import register_exception
 except ImportError:
-    register_exception = lambda a=1, b=2: True
-from harvestingkit.minidom_utils import (get_value_in_tag,
+    register_exception = lambda *args, **kwargs: True
+from harvestingkit.minidom_utils import (get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         get_value_in_tag,
+                                         parse_front,
                                          xml_to_text)
 from harvestingkit.utils import (format_arxiv_id,
                                  add_nations_field)
+from harvestingkit.instrumentation import timed
 from harvestingkit.bibrecord import (
     record_add_field,
     create_record,
@@ -39,6 +43,14 @@ from harvestingkit.bibrecord import (
 )
 from xml.dom.minidom import parse
 
+# Elements of a contrib read for its author
+AUTHOR_TAGS = ("contrib", "surname", "given-names", "string-name",
+               "contrib-id", "xref")
+# Elements of a ref read for a reference
+REFERENCE_TAGS = ("mixed-citation", "citation", "label", "name", "pub-id",
+                  "issue", "fpage", "lpage", "source", "volume", "year",
+                  "ext-link", "elocation-id")
+
 
 class JATSParser(object):
     def __init__(self, tag_to_remove=None, extract_nations=False):
@@ -46,9 +58,15 @@ class JATSParser(object):
         self.tag_to_remove = tag_to_remove
         self.extract_nations = extract_nations
 
+    @timed('jats.get_article')
     def get_article(self, path):
         return parse(open(path))
 
+    @timed('jats.get_article_front')
+    def get_article_front(self, path):
+        """Return the article parsed up to the end of its front matter."""
+        return parse_front(path, ('front',))
+
     def get_title(self, xml):
         try:
             return get_value_in_tag(xml, "article-title", tag_to_remove=self.tag_to_remove)
@@ -119,8 +137,11 @@ class JATSParser(object):
         return ret
 
     def _get_orcid(self, xml_author):
+        return self._get_orcid_in(xml_author.getElementsByTagName('contrib-id'))
+
+    def _get_orcid_in(self, contrib_ids):
         try:
-            contrib_id = xml_author.getElementsByTagName('contrib-id')[0]
+            contrib_id = contrib_ids[0]
             if contrib_id.getAttribute('contrib-id-type') == 'orcid':
                 orcid_raw = xml_to_text(contrib_id)
                 pattern = '\d\d\d\d-\d\d\d\d-\d\d\d\d-\d\d\d[\d|X]'
@@ -129,24 +150,29 @@ class JATSParser(object):
             return None
 
     def get_authors(self, xml):
+        # The document and each author are walked once, whatever the
+        # number of authors of the collaboration.
+        document = get_elements_by_tag_names(xml, ("contrib", "aff",
+                                                   "corresp"))
         authors = []
-        for author in xml.getElementsByTagName("contrib"):
+        for author in document["contrib"]:
+            elements = get_elements_by_tag_names(author, AUTHOR_TAGS)
             # Springer puts colaborations in additional "contrib" tag so to
             # avoid having fake author with all affiliations we skip "contrib"
             # tag with "contrib" subtags.
-            if author.getElementsByTagName("contrib"):
+            if elements["contrib"]:
                 continue
             tmp = {}
-            surname = get_value_in_tag(author, "surname")
+            surname = get_value_in_elements(elements, "surname")
             if surname:
                 tmp["surname"] = surname
-            given_name = get_value_in_tag(author, "given-names")
+            given_name = get_value_in_elements(elements, "given-names")
             if given_name:
                 tmp["given_name"] = given_name.replace('\n', ' ')
             if not surname and not given_name:
-                tmp["name"] = get_value_in_tag(author, "string-name")
+                tmp["name"] = get_value_in_elements(elements, "string-name")
             # It's not there yet
-            orcid = self._get_orcid(author)
+            orcid = self._get_orcid_in(elements["contrib-id"])
             if orcid:
                 tmp["orcid"] = 'ORCID:{0}'.format(orcid)
 
@@ -158,24 +184,24 @@ class JATSParser(object):
             tmp["affiliations_ids"] = []
             tmp["contact_ids"] = []
 
-            xrefs = author.getElementsByTagName("xref")
-            for x in xrefs:
-                if x.getAttribute('ref-type').encode('utf-8') == 'aff':
+            for x in elements["xref"]:
+                ref_type = x.getAttribute('ref-type').encode('utf-8')
+                if ref_type == 'aff':
                     tmp["affiliations_ids"].extend([a.encode('utf-8') for a in x.getAttribute('rid').split()])
-                if x.getAttribute('ref-type').encode('utf-8') == 'corresp':
+                elif ref_type == 'corresp':
                     tmp["contact_ids"].extend([a.encode('utf-8') for a in x.getAttribute('rid').split()])
 
             authors.append(tmp)
 
         affiliations = {}
-        for affiliation in xml.getElementsByTagName("aff"):
+        for affiliation in document["aff"]:
             aff_id = affiliation.getAttribute("id").encode('utf-8')
             # removes numbering in from affiliations
             text = re.sub(r'^(\d+,\ ?)', "", xml_to_text(affiliation, delimiter=", "))
             affiliations[aff_id] = text
 
         emails = {}
-        for contact in xml.getElementsByTagName("corresp"):
+        for contact in document["corresp"]:
             contact_id = contact.getAttribute("id").encode('utf-8')
             if contact.getElementsByTagName('email'):
                 text = xml_to_text(contact.getElementsByTagName('email')[0])
@@ -196,10 +222,9 @@ class JATSParser(object):
         if implicit_affilations and len(affiliations) > 1:
             print >> sys.stderr, "Implicit affiliations are used, but there are more than one affiliation: %s" % affiliations
         if implicit_affilations and len(affiliations) >= 1:
+            implicit = affiliations.values()
             for author in authors:
-                author["affiliation"] = []
-                for aff in affiliations.values():
-                    author["affiliation"].append(aff)
+                author["affiliation"] = list(implicit)
         return authors
 
     def get_abstract(self, xml):
@@ -244,14 +269,16 @@ class JATSParser(object):
             print >> sys.stderr, "Can't find keywords"
 
     def get_ref_link(self, xml, name):
-        links = xml.getElementsByTagName('ext-link')
+        return self._get_ref_link_in(get_elements_by_tag_names(
+            xml, ('ext-link', 'elocation-id')), name)
+
+    def _get_ref_link_in(self, elements, name):
         ret = None
-        for link in links:
+        for link in elements['ext-link']:
             if name in link.getAttribute("xlink:href").encode('utf-8'):
                 ret = xml_to_text(link).strip()
         if not ret:
-            links = xml.getElementsByTagName('elocation-id')
-            for link in links:
+            for link in elements['elocation-id']:
                 if name in link.getAttribute("content-type").encode('utf-8'):
                     ret = xml_to_text(link).strip()
         return ret
@@ -292,55 +319,63 @@ class JATSParser(object):
                 logger.info("Can't find publication date. Using 'today'.")
             return time.strftime('%Y-%m-%d')
 
+    def _get_reference_fields(self, elements):
+        """Return the fields common to the references of JATS and NLM.
+
+        elements are the descendants of the ref, found in a single walk
+        by get_elements_by_tag_names with REFERENCE_TAGS.
+        """
+        label = get_value_in_elements(elements, "label").strip('.')
+        authors = []
+        for author in elements["name"]:
+            given_name = get_value_in_tag(author, "given-names")
+            surname = get_value_in_tag(author, "surname")
+            if given_name:
+                name = "%s, %s" % (surname, given_name)
+            else:
+                name = surname
+            if name.strip().split() == []:
+                name = get_value_in_tag(author, "string-name")
+            authors.append(name)
+        doi = ""
+        for tag in elements["pub-id"]:
+            if tag.getAttribute("pub-id-type") == "doi":
+                doi = xml_to_text(tag)
+        issue = get_value_in_elements(elements, "issue")
+        page = get_value_in_elements(elements, "fpage")
+        page_last = get_value_in_elements(elements, "lpage")
+        title = get_value_in_elements(elements, "source")
+        volume = get_value_in_elements(elements, "volume")
+        year = get_value_in_elements(elements, "year")
+        ext_link = format_arxiv_id(self._get_ref_link_in(elements, "arxiv"))
+        return (label, authors, doi, issue, page, page_last, title, volume,
+                year, ext_link)
+
     def get_references(self, xml):
         references = []
         for reference in xml.getElementsByTagName("ref"):
+            elements = get_elements_by_tag_names(reference, REFERENCE_TAGS)
             plain_text = None
             try:
-                ref_type = reference.getElementsByTagName('mixed-citation')[0]
+                ref_type = elements['mixed-citation'][0]
                 ref_type = ref_type.getAttribute('publication-type').encode('utf-8')
             except:
-                ref_type = reference.getElementsByTagName('citation')[0]
+                ref_type = elements['citation'][0]
                 ref_type = ref_type.getAttribute('publication-type').encode('utf-8')
-            label = get_value_in_tag(reference, "label").strip('.')
-            authors = []
-            for author in reference.getElementsByTagName("name"):
-                given_name = get_value_in_tag(author, "given-names")
-                surname = get_value_in_tag(author, "surname")
-                if given_name:
-                    name = "%s, %s" % (surname, given_name)
-                else:
-                    name = surname
-                if name.strip().split() == []:
-                    name = get_value_in_tag(author, "string-name")
-                authors.append(name)
-            doi_tag = reference.getElementsByTagName("pub-id")
-            doi = ""
-            for tag in doi_tag:
-                if tag.getAttribute("pub-id-type") == "doi":
-                    doi = xml_to_text(tag)
-            issue = get_value_in_tag(reference, "issue")
-            page = get_value_in_tag(reference, "fpage")
-            page_last = get_value_in_tag(reference, "lpage")
-            title = get_value_in_tag(reference, "source")
-            volume = get_value_in_tag(reference, "volume")
-            year = get_value_in_tag(reference, "year")
-            ext_link = format_arxiv_id(self.get_ref_link(reference, "arxiv"))
+            fields = self._get_reference_fields(elements)
             if ref_type != 'journal':
                 try:
-                    plain_text = get_value_in_tag(reference,
-                                                  "mixed-citation",
-                                                  tag_to_remove=self.tag_to_remove)
+                    plain_text = get_value_in_elements(elements,
+                                                       "mixed-citation",
+                                                       tag_to_remove=self.tag_to_remove)
                 except:
-                    plain_text = get_value_in_tag(reference,
-                                                  "citation",
-                                                  tag_to_remove=self.tag_to_remove)
-            references.append((label, authors, doi,
-                               issue, page, page_last,
-                               title, volume, year,
-                               ext_link, plain_text))
+                    plain_text = get_value_in_elements(elements,
+                                                       "citation",
+                                                       tag_to_remove=self.tag_to_remove)
+            references.append(fields + (plain_text,))
         self.references = references
 
+    @timed('jats.get_record')
     def get_record(self, f_path, publisher=None, collection=None, logger=None):
         xml = self.get_article(f_path)
         rec = create_record()
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Configuration of the loggers of Harvesting Kit.
+
+The loggers are configured once per name, however many times
+``create_logger`` is called. In queued mode the records are only put on
+a queue by the logging calls; a background thread formats them and
+writes them to the console and log files.
+"""
+
+import os
+import atexit
+import logging
+import threading
+
+from Queue import Queue
+
+from .config import CFG_LOGGING_QUEUE
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    # Python 2 lacks both, these follow the Python 3 implementation
+    class QueueHandler(logging.Handler):
+        """Handler putting the records on a queue."""
+
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def prepare(self, record):
+            """Merge the arguments and traceback in the message, as they
+            may not be picklable nor valid later on."""
+            message = self.format(record)
+            record.message = message
+            record.msg = message
+            record.args = None
+            record.exc_info = None
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        """Thread passing the records of a queue to handlers."""
+
+        _sentinel = None
+
+        def __init__(self, queue, *handlers):
+            self.queue = queue
+            self.handlers = handlers
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor)
+            self._thread.daemon = True
+            self._thread.start()
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is self._sentinel:
+                    break
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+        def stop(self):
+            self.queue.put_nowait(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+FORMAT = '%(asctime)s - %(name)s - %(levelname)-8s - %(message)s'
+
+_lock = threading.Lock()
+# Logger name -> destinations it writes to: '' for the console, or
+# the absolute path of a log file
+_destinations = {}
+# Logger name -> QueueListener of the queued loggers
+_listeners = {}
+
+
+def create_logger(name, filename=None, logging_level=logging.DEBUG,
+                  queued=None):
+    """
+    Create a logger object writing to the console and to filename.
+
+    Calling it again for the same name returns the same logger without
+    adding handlers, only files not written to yet are added.
+
+    :param queued: write the records from a background thread, by
+                   default CFG_LOGGING_QUEUE.
+    :type queued: bool
+    """
+    if queued is None:
+        queued = CFG_LOGGING_QUEUE
+    logger = logging.getLogger(name)
+    with _lock:
+        destinations = _destinations.setdefault(name, set())
+        handlers = []
+        if filename and os.path.abspath(filename) not in destinations:
+            # Raises IOError when the file can not be written
+            handlers.append((os.path.abspath(filename),
+                             logging.FileHandler(filename=filename)))
+        if '' not in destinations:
+            handlers.append(('', logging.StreamHandler()))
+        formatter = logging.Formatter(FORMAT)
+        for destination, handler in handlers:
+            handler.setFormatter(formatter)
+            destinations.add(destination)
+        handlers = [handler for dummy, handler in handlers]
+        if name in _listeners:
+            listener = _listeners[name]
+            listener.handlers = tuple(listener.handlers) + tuple(handlers)
+        elif queued:
+            queue = Queue()
+            listener = QueueListener(queue, *handlers)
+            listener.start()
+            _listeners[name] = listener
+            logger.addHandler(QueueHandler(queue))
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
+    logger.setLevel(logging_level)
+    return logger
+
+
+@atexit.register
+def stop_queued_logging():
+    """Write the queued records and stop the background threads."""
+    with _lock:
+        for name, listener in _listeners.items():
+            listener.stop()
+            # Later records are written directly
+            logger = logging.getLogger(name)
+            for handler in list(logger.handlers):
+                if isinstance(handler, QueueHandler):
+                    logger.removeHandler(handler)
+            for handler in listener.handlers:
+                logger.addHandler(handler)
+        _listeners.clear()
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Metrics of the harvest runs for the monitoring.
+
+At the end of each run, the counters and stages collected by the
+instrumentation are written to ``CFG_METRICS_PATH``, one file per job,
+either for the Prometheus node exporter textfile collector
+(``harvestingkit_<job>.prom``) or as JSON (``harvestingkit_<job>.json``).
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+
+from collections import OrderedDict
+from functools import wraps
+
+from .config import CFG_METRICS_FORMAT, CFG_METRICS_PATH
+from .instrumentation import stats
+
+# Counters of the instrumentation exported, with their help text
+COUNTERS = [
+    ('packages.seen', 'packages_seen',
+     'New packages found on the server.'),
+    ('packages.downloaded', 'packages_downloaded',
+     'Packages downloaded from the server.'),
+    ('ftp.download.bytes', 'bytes_transferred',
+     'Bytes downloaded from the server.'),
+    ('articles.converted', 'articles_converted',
+     'Articles converted to MARCXML.'),
+    ('articles.errors', 'conversion_errors',
+     'Articles which could not be converted.'),
+]
+
+HELP = dict((name, text) for dummy, name, text in COUNTERS)
+HELP.update({
+    'transfer_bytes_per_second': 'Download rate from the server.',
+    'records_per_second': 'Articles converted per second.',
+    'run_seconds': 'Time since the start of the run.',
+    'last_run_timestamp_seconds': 'End of the last run.',
+    'stage_calls': 'Calls of the stage.',
+    'stage_seconds': 'Time spent in the stage.',
+    'stage_max_seconds': 'Longest call of the stage.',
+})
+
+
+def collect(job, data=None):
+    """
+    Return the metrics of job from the instrumentation data.
+
+    The conversion rate is computed over the ``<job>.bibupload`` stage
+    and the transfer rate over the ``ftp.download`` stage.
+    """
+    if data is None:
+        data = stats.as_dict()
+    counters = data['counters']
+    stages = data['stages']
+    metrics = OrderedDict()
+    for counter, name, dummy in COUNTERS:
+        metrics[name] = counters.get(counter, 0)
+    transfer = stages.get('ftp.download', {}).get('seconds')
+    metrics['transfer_bytes_per_second'] = (
+        metrics['bytes_transferred'] / transfer if transfer else 0)
+    conversion = stages.get('%s.bibupload' % (job,), {}).get('seconds')
+    metrics['records_per_second'] = (
+        metrics['articles_converted'] / conversion if conversion else 0)
+    metrics['run_seconds'] = data['elapsed']
+    metrics['last_run_timestamp_seconds'] = time.time()
+    return {'job': job, 'metrics': metrics, 'stages': stages}
+
+
+def format_prometheus(report):
+    """Return the report in the Prometheus text exposition format."""
+    labels = 'job="%s"' % (report['job'],)
+    lines = []
+
+    def add(name, samples):
+        lines.append('# HELP harvestingkit_%s %s' % (name, HELP[name]))
+        lines.append('# TYPE harvestingkit_%s gauge' % (name,))
+        for sample_labels, value in samples:
+            lines.append('harvestingkit_%s{%s} %r' % (name, sample_labels,
+                                                      float(value)))
+
+    for name, value in report['metrics'].items():
+        add(name, [(labels, value)])
+    stages = sorted(report['stages'].items())
+    for name, key in (('stage_calls', 'calls'),
+                      ('stage_seconds', 'seconds'),
+                      ('stage_max_seconds', 'max_seconds')):
+        if stages:
+            add(name, [('%s,stage="%s"' % (labels, stage), timing[key])
+                       for stage, timing in stages])
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(job, path=None, fmt=None, data=None):
+    """
+    Write the metrics of job in the folder path.
+
+    The file is replaced atomically, so the collector never reads half
+    of it. Failures are reported but never interrupt the run.
+
+    :returns: the path of the file written, or None.
+    """
+    path = CFG_METRICS_PATH if path is None else path
+    fmt = fmt or CFG_METRICS_FORMAT
+    if not path:
+        return None
+    report = collect(job, data)
+    extension = 'json' if fmt == 'json' else 'prom'
+    filename = os.path.join(path, 'harvestingkit_%s.%s' % (job, extension))
+    try:
+        with open(filename + '.tmp', 'w') as out:
+            if fmt == 'json':
+                json.dump(report, out, indent=2)
+            else:
+                out.write(format_prometheus(report))
+        os.rename(filename + '.tmp', filename)
+    except (IOError, OSError) as err:
+        print("Could not write the metrics to %s: %s" % (filename, err),
+              file=sys.stderr)
+        return None
+    return filename
+
+
+def report_metrics(job, start=False):
+    """Decorator writing the metrics of job when the function returns.
+
+    :param start: whether the function starts a harvest, e.g. ``run``.
+                  The counters and stages are then reset when it is
+                  called, so that the metrics written after it and after
+                  the later steps of the same harvest, e.g.
+                  ``bibupload_it``, cover the whole harvest and only it.
+    :type start: bool
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if start:
+                stats.reset()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                write_metrics(job)
+        return wrapper
+    return decorator
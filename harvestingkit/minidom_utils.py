@@ -21,6 +21,14 @@
 Set of utilities for mini DOM xml parsing.
 """
 
+from xml.dom import Node, pulldom
+from xml.sax import make_parser
+from xml.sax.handler import feature_external_ges
+
+TEXT_NODE = Node.TEXT_NODE
+# Whitespace stripped from the text nodes, as str.strip does
+WHITESPACE = u' \t\n\r\x0b\x0c'
+
 
 class NoDOIError(Exception):
     def __init__(self, value):
@@ -37,21 +45,34 @@ def get_inner_xml(xml):
 
 
 def xml_to_text(xml, delimiter=' ', tag_to_remove=None):
-    if tag_to_remove:
-        if tag_to_remove in xml.nodeName.encode('utf-8'):
-            return ''
-
-    if xml.nodeType == xml.TEXT_NODE:
-        return xml.wholeText.encode('utf-8').strip()
-    elif 'mml:' in xml.nodeName:
-        return xml.toxml().replace('mml:', '').replace('xmlns:mml', 'xmlns').encode('utf-8')
-    elif xml.hasChildNodes():
-        return delimiter.join(filter(bool,
-                                     map(lambda a: xml_to_text(a,
-                                                               delimiter,
-                                                               tag_to_remove),
-                                         xml.childNodes)))
-    return ''
+    """
+    Return the text of xml, as UTF-8.
+
+    The stripped non empty text nodes are joined with delimiter, MathML
+    elements being kept as XML without their namespace prefix, and the
+    elements whose name contains tag_to_remove are skipped.
+
+    The tree is walked iteratively and the text encoded once, as this is
+    called for most of the fields of every article.
+    """
+    if isinstance(delimiter, str):
+        delimiter = delimiter.decode('utf-8')
+    texts = []
+    stack = [xml]
+    while stack:
+        node = stack.pop()
+        if tag_to_remove:
+            if tag_to_remove in node.nodeName.encode('utf-8'):
+                continue
+        if node.nodeType == TEXT_NODE:
+            text = node.wholeText.strip(WHITESPACE)
+            if text:
+                texts.append(text)
+        elif u'mml:' in node.nodeName:
+            texts.append(node.toxml().replace('mml:', '').replace('xmlns:mml', 'xmlns'))
+        elif node.childNodes:
+            stack.extend(reversed(node.childNodes))
+    return delimiter.join(texts).encode('utf-8')
 
 
 def get_value_in_tag(xml, tag, tag_to_remove=None):
@@ -62,6 +83,72 @@ def get_value_in_tag(xml, tag, tag_to_remove=None):
         return ""
 
 
+def get_elements_by_tag_names(xml, tag_names):
+    """
+    Return the descendants of xml named as one of tag_names.
+
+    Equivalent to calling getElementsByTagName for each name, but the
+    subtree is walked once.
+
+    :returns: a dictionary of the lists of elements, in document order,
+              by tag name.
+    """
+    elements = dict((tag, []) for tag in tag_names)
+    stack = list(reversed(xml.childNodes))
+    while stack:
+        node = stack.pop()
+        if node.nodeType == node.ELEMENT_NODE:
+            if node.nodeName in elements:
+                elements[node.nodeName].append(node)
+            stack.extend(reversed(node.childNodes))
+    return elements
+
+
+def get_value_in_elements(elements, tag, tag_to_remove=None):
+    """Like get_value_in_tag, on the result of get_elements_by_tag_names."""
+    if elements[tag]:
+        return xml_to_text(elements[tag][0], tag_to_remove=tag_to_remove)
+    else:
+        return ""
+
+
+def parse_front(source, tag_names=('front',)):
+    """
+    Parse an article only up to the end of its front matter.
+
+    The document returned holds everything up to the end of the first
+    element named as one of tag_names, e.g. the journal and article
+    metadata of a JATS article but not its body and references. The rest
+    of the file is never read, nor parsed.
+
+    :param source: path or file object of the article.
+    :param tag_names: names of the elements ending the parsing.
+    """
+    if isinstance(source, basestring):
+        with open(source) as stream:
+            return parse_front(stream, tag_names)
+    # As minidom.parse, the external DTD is not loaded
+    parser = make_parser()
+    parser.setFeature(feature_external_ges, False)
+    events = pulldom.parse(source, parser)
+    dummy, document = events.getEvent()
+    parents = [document]
+    # As DOMEventStream.expandNode, but stopping after the front matter
+    for token, node in iter(events.getEvent, None):
+        if token != pulldom.END_ELEMENT:
+            parents[-1].appendChild(node)
+        if token == pulldom.START_ELEMENT:
+            parents.append(node)
+        elif token == pulldom.END_ELEMENT:
+            del parents[-1]
+            if node.nodeName in tag_names:
+                break
+    events.clear()
+    # The parser splits the text in several nodes, minidom.parse does not
+    document.normalize()
+    return document
+
+
 def get_all_text(node):
     """Recursively extract all text from node."""
     if node.nodeType == node.TEXT_NODE:
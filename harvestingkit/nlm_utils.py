@@ -17,11 +17,15 @@
 ## along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
 ## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
 
-from harvestingkit.jats_utils import JATSParser
-from harvestingkit.minidom_utils import (get_value_in_tag,
+from harvestingkit.jats_utils import (JATSParser,
+                                      REFERENCE_TAGS)
+from harvestingkit.minidom_utils import (get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         get_value_in_tag,
                                          xml_to_text)
 from harvestingkit.utils import (format_arxiv_id,
                                  add_nations_field)
+from harvestingkit.instrumentation import timed
 
 from harvestingkit.bibrecord import (
     record_add_field,
@@ -31,7 +35,7 @@ from harvestingkit.bibrecord import (
 try:
     from invenio.errorlib import register_exception
 except ImportError:
-    register_exception = lambda a=1, b=2: True
+    register_exception = lambda *args, **kwargs: True
 from harvestingkit.scoap3utils import MissingFFTError
 from os import pardir
 from os.path import (join,
@@ -48,39 +52,17 @@ class NLMParser(JATSParser):
     def get_references(self, xml):
         references = []
         for reference in xml.getElementsByTagName("ref"):
+            elements = get_elements_by_tag_names(reference, REFERENCE_TAGS)
             plain_text = None
-            refs = reference.getElementsByTagName('citation')
+            refs = elements['citation']
             if refs:
                 ref_type = refs[0].getAttribute('publication-type').encode('utf-8')
             else:
                 ref_type = None
-            label = get_value_in_tag(reference, "label").strip('.')
-            authors = []
-            for author in reference.getElementsByTagName("name"):
-                given_name = get_value_in_tag(author, "given-names")
-                surname = get_value_in_tag(author, "surname")
-                if given_name:
-                    name = "%s, %s" % (surname, given_name)
-                else:
-                    name = surname
-                if name.strip().split() == []:
-                    name = get_value_in_tag(author, "string-name")
-                authors.append(name)
-            doi_tag = reference.getElementsByTagName("pub-id")
-            doi = ""
-            for tag in doi_tag:
-                if tag.getAttribute("pub-id-type") == "doi":
-                    doi = xml_to_text(tag)
-            issue = get_value_in_tag(reference, "issue")
-            page = get_value_in_tag(reference, "fpage")
-            page_last = get_value_in_tag(reference, "lpage")
-            title = get_value_in_tag(reference, "source")
-            volume = get_value_in_tag(reference, "volume")
-            year = get_value_in_tag(reference, "year")
-            ext_link = format_arxiv_id(super(NLMParser, self).get_ref_link(reference, "arxiv"))
+            fields = self._get_reference_fields(elements)
             if ref_type != 'journal':
-                plain_text = get_value_in_tag(reference, "mixed-citation")
-            references.append((label, authors, doi, issue, page, page_last, title, volume, year, ext_link, plain_text))
+                plain_text = get_value_in_elements(elements, "mixed-citation")
+            references.append(fields + (plain_text,))
         self.references = references
 
     def get_arxiv_id(self, xml):
@@ -91,6 +73,7 @@ class NLMParser(JATSParser):
                 ext_link = format_arxiv_id(get_value_in_tag(meta, "meta-value").encode('utf-8'))
         return ext_link
 
+    @timed('nlm.get_record')
     def get_record(self, f_path, publisher=None, collection=None, logger=None):
         xml = super(NLMParser, self).get_article(f_path)
         rec = create_record()
@@ -18,6 +18,7 @@
 ## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
 from __future__ import print_function
 
+import re
 import sys
 import time
 
@@ -57,11 +58,18 @@ from .config import (CFG_CONFIG_PATH,
                      CFG_FTP_CONNECTION_ATTEMPTS,
                      CFG_FTP_TIMEOUT_SLEEP_DURATION)
 from .utils import create_logger
+from .instrumentation import count, log_summary, timed
+from .metrics import report_metrics
+from .harvest_state import (HarvestState,
+                            STATUS_DONE,
+                            STATUS_EXTRACTED,
+                            STATUS_FAILED)
 
 CFG_OXFORD_JATS_PATH = join(CFG_DTDS_PATH, 'journal-publishing-dtd-2.3.zip')
 
 CFG_TAR_FILES = join(CFG_OXFORD_DOWNLOADDIR, "tar_files")
 CFG_UNPACKED_FILES = join(CFG_OXFORD_DOWNLOADDIR, "unpacked_files")
+CFG_HARVEST_STATE_DB = join(CFG_OXFORD_DOWNLOADDIR, "harvest_state.db")
 
 
 class OxfordPackage(object):
@@ -107,8 +115,15 @@ class OxfordPackage(object):
         else:
             self.files_list = self.ftp.ls()[0]
         if new_only:
-            self.files_list = (set(self.files_list)
-                               - set(listdir(CFG_TAR_FILES)))
+            if self.state.is_empty():
+                # First run with the state store: import what was
+                # processed before from the local copies, which are
+                # stored with a time-stamp prefix.
+                self.state.seed(re.sub(r'^\d{14}-', '', filename)
+                                for filename in listdir(CFG_TAR_FILES))
+            self.files_list = self.state.filter_new(self.files_list)
+        count('packages.seen', len([filename for filename in self.files_list
+                                    if filename != 'go.xml']))
         return self.files_list
 
     def _download_tars(self, check_integrity=True):
@@ -124,6 +139,8 @@ class OxfordPackage(object):
             total_count = len(self.files_list)
 
             prefix = time.strftime("%Y%m%d%H%M%S-")
+            # local path -> name of the package on the server
+            self.downloaded_packages = {}
             for i, filename in enumerate(self.files_list, start=1):
                 if filename == 'go.xml':
                     ## We don't download go.xml
@@ -134,12 +151,15 @@ class OxfordPackage(object):
                 self.retrieved_packages_unpacked.append(unpack_path)
                 try:
                     self.ftp.download(filename, CFG_TAR_FILES)
+                    count('packages.downloaded')
                     current_location = join(CFG_TAR_FILES, filename)
                     desired_location = join(CFG_TAR_FILES, prefix + filename)
                     copy(current_location, desired_location)
                     self.packages_delivery.append((filename[0:-4],
                                                    datetime.now()))
                     remove(current_location)
+                    self.state.add_package(filename, desired_location)
+                    self.downloaded_packages[desired_location] = filename
                 except:
                     self.logger.error("Error downloading tar file: %s"
                                       % (filename,))
@@ -169,6 +189,9 @@ class OxfordPackage(object):
 
         self.packages_delivery = []
         self.doi_package_name_mapping = []
+        self.state = HarvestState(CFG_HARVEST_STATE_DB)
+        # extraction directory -> name of the package on the server
+        self.unpacked_packages = {}
 
         if not path and package_name:
             self.logger.info("Got package: %s" % (package_name,))
@@ -179,6 +202,8 @@ class OxfordPackage(object):
         self._crawl_oxford_and_find_main_xml()
         self.extract_nations = extract_nations
 
+    @report_metrics('oxford', start=True)
+    @timed('oxford.harvest')
     def run(self):
         try:
             self.connect()
@@ -206,6 +231,8 @@ class OxfordPackage(object):
                                       package_name.split('.')[0])
             self.logger.debug("Extracting package: %s"
                               % (path.split("/")[-1],))
+            package = getattr(self, "downloaded_packages", {}).get(
+                path, package_name)
             try:
                 if "_archival_pdf" in self.path_unpacked:
                     self.path_unpacked = (self.path_unpacked
@@ -214,8 +241,11 @@ class OxfordPackage(object):
                                                   "archival_pdfs"))
                 else:
                     ZipFile(path).extractall(self.path_unpacked)
+                    self.unpacked_packages[self.path_unpacked] = package
                 #TarFile.open(path).extractall(self.path_unpacked)
+                self.state.set_status(package, STATUS_EXTRACTED)
             except Exception:
+                self.state.set_status(package, STATUS_FAILED)
                 register_exception(alert_admin=True,
                                    prefix="OUP error extracting package.")
                 self.logger.error("Error extraction package file: %s"
@@ -251,6 +281,8 @@ class OxfordPackage(object):
         else:
             self.logger.info("Nothing to do.")
 
+    @report_metrics('oxford')
+    @timed('oxford.bibupload')
     def bibupload_it(self):
         if self.found_articles:
             nlm_parser = NLMParser(self.extract_nations)
@@ -266,15 +298,18 @@ class OxfordPackage(object):
                                                 collection='SCOAP3',
                                                 logger=self.logger),
                           file=out)
+                    count('articles.converted')
 
-                    xml_doc = nlm_parser.get_article(path)
+                    xml_doc = nlm_parser.get_article_front(path)
                     doi = nlm_parser.get_doi(xml_doc)
                     package_name = [x for x in path.split('/')
                                     if 'ptep_iss' in x]
                     if package_name:
                         self.doi_package_name_mapping.append((package_name[0],
                                                               doi))
+                    self._record_doi(path, doi)
                 except Exception as err:
+                    count('articles.errors')
                     print(err, file=sys.stderr)
                     raise
                 print(path, i + 1, "out of", len(self.found_articles))
@@ -282,6 +317,16 @@ class OxfordPackage(object):
             out.close()
             task_low_level_submission("bibupload", "admin",
                                       "-N" "OUP", "-i", "-r", name)
+            for package in self.unpacked_packages.itervalues():
+                self.state.set_status(package, STATUS_DONE)
+        log_summary(self.logger)
+
+    def _record_doi(self, path, doi):
+        """Store doi as produced by the package path was extracted from."""
+        for unpacked, package in self.unpacked_packages.iteritems():
+            if path.startswith(unpacked):
+                self.state.add_dois(package, [doi])
+                return
 
     def empty_ftp(self):
         if self.found_articles:
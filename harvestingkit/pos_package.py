@@ -24,6 +24,7 @@ from datetime import datetime
 from harvestingkit.minidom_utils import (get_value_in_tag,
                                          xml_to_text)
 from harvestingkit.utils import collapse_initials, safe_title
+from harvestingkit.instrumentation import timed
 from harvestingkit.bibrecord import (
     record_add_field,
     create_record,
@@ -114,6 +115,7 @@ class PosPackage(object):
             print >> sys.stderr, "Can't find identifier"
             return ''
 
+    @timed('pos.get_record')
     def get_record(self, record):
         """ Reads a dom xml element in oaidc format and
             returns the bibrecord object """
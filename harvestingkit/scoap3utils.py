@@ -26,14 +26,19 @@ import sys
 import logging
 import time
 
+from fnmatch import fnmatch
+from multiprocessing import Pool
 from tarfile import TarFile
 from zipfile import ZipFile
+from xml.dom.minidom import parse
 try:
     from invenio.errorlib import register_exception
 except ImportError:
-    register_exception = lambda a=1, b=2: True
+    register_exception = lambda *args, **kwargs: True
 
-from os.path import join
+from os.path import (join,
+                     basename,
+                     dirname)
 
 try:
     from invenio.config import CFG_LOGDIR
@@ -42,6 +47,9 @@ except ImportError:
     CFG_LOGDIR = join(get_python_lib(),
                       "harvestingkit",
                       "log")
+
+from .logging_utils import create_logger as _create_logger
+
 CFG_CROSSREF_DOIS_PER_REQUEST = 10
 CFG_CROSSREF_API_URL = "http://doi.crossref.org/search/doi?"
 
@@ -58,21 +66,7 @@ def lock_issue():
 def create_logger(publisher,
                   filename=join(CFG_LOGDIR, 'scoap3_harvesting.log'),
                   logging_level=logging.DEBUG):
-    logger = logging.getLogger(publisher)
-    formatter = logging.Formatter(('%(asctime)s - %(name)s - '
-                                   '%(levelname)-8s - %(message)s'))
-
-    fh = logging.FileHandler(filename=filename)
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
-
-    ch = logging.StreamHandler()
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
-
-    logger.setLevel(logging_level)
-
-    return logger
+    return _create_logger(publisher, filename, logging_level)
 
 
 def progress_bar(n):
@@ -158,9 +152,101 @@ def check_pkgs_integrity(filelist, logger, ftp_connector,
                      % (not_finished_files,))
 
 
-def extract_package(package_name, path, logger):
-    try:
+class PackageReader(object):
+    """
+    Reads the members of a TAR or ZIP package without extracting it.
+
+    Members are selected with shell-style patterns matched against their
+    file name (e.g. ``main.xml`` or ``*_nlm.xml``) and are always visited
+    in archive order, so compressed tarballs are read in a single pass.
+
+    :param package_name: path to the package.
+    :type package_name: string
+    """
+    def __init__(self, package_name):
+        self.package_name = package_name
         if ".tar" in package_name:
+            self._tar = TarFile.open(package_name)
+            self._zip = None
+        elif ".zip" in package_name:
+            self._tar = None
+            self._zip = ZipFile(package_name)
+        else:
+            raise FileTypeError("It's not a TAR or ZIP archive.")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        (self._tar or self._zip).close()
+
+    def _members(self, patterns):
+        """Yield (name, member) for the matching files, in archive order."""
+        if self._tar:
+            members = ((member.name, member) for member in self._tar
+                       if member.isfile())
+        else:
+            members = ((info.filename, info)
+                       for info in self._zip.infolist()
+                       if not info.filename.endswith('/'))
+        for name, member in members:
+            if not patterns or any(fnmatch(basename(name), pattern)
+                                   for pattern in patterns):
+                yield name, member
+
+    def names(self, *patterns):
+        """Return the names of the files matching any of patterns."""
+        return [name for name, dummy in self._members(patterns)]
+
+    def _open_member(self, member):
+        if self._tar:
+            return self._tar.extractfile(member)
+        return self._zip.open(member)
+
+    def open(self, name):
+        """Return a file-like object reading the member called name."""
+        if self._tar:
+            return self._tar.extractfile(name)
+        return self._zip.open(name)
+
+    def iter_documents(self, *patterns):
+        """Parse the matching XML members straight from the archive.
+
+        :returns: a generator of (name, minidom document) tuples.
+        """
+        for name, member in self._members(patterns):
+            yield name, parse(self._open_member(member))
+
+    def extract(self, path, *patterns):
+        """Extract to path only the members matching patterns.
+
+        :returns: the list of the extracted files.
+        """
+        extracted = []
+        for name, member in self._members(patterns):
+            if self._tar:
+                self._tar.extract(member, path)
+                extracted.append(join(path, name))
+            else:
+                extracted.append(self._zip.extract(member, path))
+        return extracted
+
+
+def extract_package(package_name, path, logger, patterns=None):
+    """Extract a TAR or ZIP package to path.
+
+    :param patterns: if given, only the files whose name matches one of
+                     these shell-style patterns are extracted.
+    :type patterns: list
+    """
+    try:
+        if patterns:
+            with PackageReader(package_name) as reader:
+                reader.extract(path, *patterns)
+        elif ".tar" in package_name:
             TarFile.open(package_name).extractall(path)
         elif ".zip" in package_name:
             ZipFile(package_name).extractall(path)
@@ -171,3 +257,82 @@ def extract_package(package_name, path, logger):
                            prefix="Elsevier error extracting package.")
         logger.error("Error extraction package file: %s %s"
                      % (path, err))
+
+
+def find_article_dirs(filenames, article_markers):
+    """Return the directories of filenames which contain an article.
+
+    :param article_markers: list of alternatives, each one being a tuple
+                            of patterns that must all match a file of a
+                            directory for it to be an article, e.g.
+                            ``[('main.xml', 'main.pdf')]``.
+    :type article_markers: list
+    """
+    dirs = {}
+    for filename in filenames:
+        dirs.setdefault(dirname(filename), []).append(basename(filename))
+    found = []
+    for directory in sorted(dirs):
+        names = dirs[directory]
+        for required in article_markers:
+            if all(any(fnmatch(name, pattern) for name in names)
+                   for pattern in required):
+                found.append(directory)
+                break
+    return found
+
+
+def _extract_package_worker(args):
+    """Extract one package, run in a worker process of extract_packages."""
+    package_name, path, patterns, article_markers = args
+    try:
+        with PackageReader(package_name) as reader:
+            extracted = reader.extract(path, *(patterns or []))
+    except Exception as err:
+        return package_name, path, [], "%s: %s" % (type(err).__name__, err)
+    return (package_name, path,
+            find_article_dirs(extracted, article_markers), None)
+
+
+def extract_packages(packages, logger, patterns=None, article_markers=(),
+                     processes=None):
+    """Extract packages in parallel worker processes.
+
+    Packages are published as soon as they are extracted, so that the
+    articles of the first ones can be processed while the others are
+    still being unpacked.
+
+    :param packages: list of (package_name, path) tuples, path being the
+                     directory where package_name is extracted.
+    :type packages: list
+    :param patterns: shell-style patterns of the members to extract,
+                     all of them are extracted if not given.
+    :type patterns: list
+    :param article_markers: see find_article_dirs.
+    :type article_markers: list
+    :param processes: number of worker processes, defaults to the number
+                      of CPUs.
+    :type processes: int
+
+    :returns: a generator of (package_name, path, article_dirs) tuples,
+              in order of completion. Packages that fail to extract are
+              logged and skipped.
+    """
+    tasks = [(package_name, path, patterns, article_markers)
+             for package_name, path in packages]
+    if not tasks:
+        return
+    pool = Pool(min(processes or len(tasks), len(tasks)))
+    try:
+        for package_name, path, article_dirs, error in \
+                pool.imap_unordered(_extract_package_worker, tasks):
+            if error:
+                register_exception(alert_admin=True,
+                                   prefix="Error extracting package.")
+                logger.error("Error extraction package file: %s %s"
+                             % (package_name, error))
+                continue
+            yield package_name, path, article_dirs
+    finally:
+        pool.terminate()
+        pool.join()
@@ -20,35 +20,103 @@ from __future__ import print_function
 
 import getopt
 import sys
-import urllib2
+import time
 import urlparse
 import re
+import threading
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 from os import (close,
                 remove)
 from bs4 import BeautifulSoup
+from harvestingkit.config import (CFG_SPRINGER_CRAWLER_CONCURRENCY,
+                                  CFG_SPRINGER_CRAWLER_RATE)
 from harvestingkit.minidom_utils import xml_to_text
 from harvestingkit.utils import (collapse_initials,
                                  record_xml_output,
                                  record_add_field,
-                                 create_record)
+                                 create_record,
+                                 get_downloader)
 from xml.dom.minidom import parseString
 from xml.dom import getDOMImplementation
 from tempfile import mkstemp
 
 
+class HostThrottle(object):
+    """
+    Limits the number of concurrent requests and the request rate
+    to every host.
+
+    @param concurrency: maximum number of requests in flight per host.
+    @param rate: maximum number of requests started per second and per
+                 host, unlimited when None.
+    """
+    def __init__(self, concurrency=CFG_SPRINGER_CRAWLER_CONCURRENCY,
+                 rate=CFG_SPRINGER_CRAWLER_RATE):
+        self.concurrency = concurrency
+        self.interval = 1.0 / rate if rate else 0.0
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._next_start = {}
+
+    def _wait_turn(self, host):
+        with self._lock:
+            now = time.time()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    @contextmanager
+    def request(self, url):
+        """Wait until a request to the host of url may start."""
+        host = urlparse.urlparse(url).netloc
+        with self._lock:
+            if host not in self._slots:
+                self._slots[host] = threading.BoundedSemaphore(
+                    self.concurrency)
+            slot = self._slots[host]
+        with slot:
+            self._wait_turn(host)
+            yield
+
+
 class SpringerCrawler(object):
     """
     This class is specialized in crawling from Springer web pages
     for Journals, Books, Protocols and Reference works and creating
     a Marc xml file containing the records of the collection
     with the link to the fulltext pdf and every possible metadata.
+
+    The pages are fetched and parsed concurrently, within the limits
+    of the throttle, and the records are kept in the listing order.
+
+    @param downloader: the Downloader used to fetch the pages, the
+                       shared one by default.
+    @param concurrency: maximum number of pages fetched at once from
+                        a host.
+    @param rate: maximum number of pages requested per second from
+                 a host, unlimited when None.
     """
-    def __init__(self):
+    def __init__(self, downloader=None,
+                 concurrency=CFG_SPRINGER_CRAWLER_CONCURRENCY,
+                 rate=CFG_SPRINGER_CRAWLER_RATE):
         self.base_url = 'http://link.springer.com/'
+        self.downloader = downloader or get_downloader()
+        self.concurrency = concurrency
+        self.throttle = HostThrottle(concurrency, rate)
+
+    def _fetch(self, url):
+        with self.throttle.request(url):
+            return self.downloader.fetch(url)
+
+    def _fetch_page(self, url):
+        return BeautifulSoup(self._fetch(url))
 
-    def _find(self, tag, attrs):
+    @staticmethod
+    def _find(content, tag, attrs):
         try:
-            return self.content.find(tag, attrs=attrs).text
+            return content.find(tag, attrs=attrs).text
         except AttributeError:
             return ''
 
@@ -59,78 +127,80 @@ class SpringerCrawler(object):
 
         @param url: the url of the Journal, Book, Protocol or Reference work
         """
-        page = urllib2.urlopen(url)
-        pages = [BeautifulSoup(page)]
-        #content spread over several pages?
-        numpag = pages[0].body.findAll('span', attrs={'class': 'number-of-pages'})
-        if len(numpag) > 0:
-            if re.search('^\d+$', numpag[0].string):
-                for i in range(int(numpag[0].string)-1):
-                    page = urllib2.urlopen('%s/page/%i' % (url, i+2))
-                    pages.append(BeautifulSoup(page))
-            else:
-                print("number of pages %s not an integer" % (numpag[0].string))
-        impl = getDOMImplementation()
-        doc = impl.createDocument(None, "collection", None)
-        links = []
-        for page in pages:
-            links += page.body.findAll('p', attrs={'class': 'title'})
-            links += page.body.findAll('h3', attrs={'class': 'title'})
-        for link in links:
-            record = self._get_record(link)
-            doc.firstChild.appendChild(record)
+        pool = ThreadPool(self.concurrency)
+        try:
+            pages = [self._fetch_page(url)]
+            #content spread over several pages?
+            numpag = pages[0].body.findAll('span', attrs={'class': 'number-of-pages'})
+            if len(numpag) > 0:
+                if re.search('^\d+$', numpag[0].string):
+                    page_urls = ['%s/page/%i' % (url, i+2)
+                                 for i in range(int(numpag[0].string)-1)]
+                    pages += pool.map(self._fetch_page, page_urls)
+                else:
+                    print("number of pages %s not an integer" % (numpag[0].string))
+            impl = getDOMImplementation()
+            doc = impl.createDocument(None, "collection", None)
+            links = []
+            for page in pages:
+                links += page.body.findAll('p', attrs={'class': 'title'})
+                links += page.body.findAll('h3', attrs={'class': 'title'})
+            # imap parses the pages as they arrive but keeps the order
+            for record in pool.imap(self._get_record, links):
+                doc.firstChild.appendChild(record)
+        finally:
+            pool.close()
         return doc.toprettyxml()
 
     def _get_record(self, link):
         link = link.find('a')['href']
         url = urlparse.urljoin(self.base_url, link)
-        page = urllib2.urlopen(url)
-        page = BeautifulSoup(page)
-        self.content = page.body.find('div', attrs={'id': 'content'})
+        page = self._fetch_page(url)
+        content = page.body.find('div', attrs={'id': 'content'})
 
-        publication_title = self.content.find('div', {'id': 'publication-title'})
+        publication_title = content.find('div', {'id': 'publication-title'})
         if publication_title:
             publication_title = publication_title.find('a').text
         else:
             publication_title = ''
-        series_title = self._find('a', {'id': 'series-title'})
+        series_title = self._find(content, 'a', {'id': 'series-title'})
         if series_title == 'NATO Science Series':
             series_title = 'NATO Sci.Ser.'
-        title = self._find('h1', {'id': 'title'})
+        title = self._find(content, 'h1', {'id': 'title'})
         if not title:
-            title = self._find('h1', {'class' : 'ChapterTitle'})
-        volume = self._find('span', {'id': 'book-volume'})
+            title = self._find(content, 'h1', {'class' : 'ChapterTitle'})
+        volume = self._find(content, 'span', {'id': 'book-volume'})
         if volume:
             volume = re.sub(r'\D', '', volume)
         else:
-            volume = self._find('span', {'id': 'volume-range'})
+            volume = self._find(content, 'span', {'id': 'volume-range'})
             volume = re.sub(r'\D', '', volume)
-        issue = self._find('a', {'id': 'issue-range'})
+        issue = self._find(content, 'a', {'id': 'issue-range'})
         if issue:
             issue = issue.split()[1]
-        year = self._find('span', {'id': 'copyright-year'})
+        year = self._find(content, 'span', {'id': 'copyright-year'})
         if not year:
-            year = self._find('dd', {'id': 'abstract-about-book-chapter-copyright-year'})
+            year = self._find(content, 'dd', {'id': 'abstract-about-book-chapter-copyright-year'})
         year = re.sub(r'\D', '', year)
         if not year:
-            year = self._find('dd', {'id': 'abstract-about-cover-date'})
+            year = self._find(content, 'dd', {'id': 'abstract-about-cover-date'})
             year = re.sub(r'\D', '', year)[:4]
-        abstract = self._find('div', {'class': 'abstract-content formatted'})
-        page_range = self._find('span', {'id': 'page-range'})
+        abstract = self._find(content, 'div', {'class': 'abstract-content formatted'})
+        page_range = self._find(content, 'span', {'id': 'page-range'})
         if not page_range:
-            page_range = self._find('dd', {'id' : 'abstract-about-book-chapter-page-ranges'})
+            page_range = self._find(content, 'dd', {'id' : 'abstract-about-book-chapter-page-ranges'})
         if page_range:
             page_range = page_range.replace('pp', '').strip()
-        #publisher = self._find('dd', {'id': 'abstract-about-publisher'})
-        copyright_holder = self._find('dd', {'id': 'abstract-about-book-copyright-holder'})
-        #issn = self._find('dd', {'id': 'abstract-about-book-series-print-issn'})
-        doi = self._find('dd', {'class': 'doi'})
-        #subtitle = self._find('dd', {'id': 'abstract-about-book-series-subtitle'})
-        #online_isbn = self._find('dd', {'id': 'abstract-about-book-online-isbn'})
-        #print_isbn = self._find('dd', {'id': 'abstract-about-book-print-isbn'})
+        #publisher = self._find(content, 'dd', {'id': 'abstract-about-publisher'})
+        copyright_holder = self._find(content, 'dd', {'id': 'abstract-about-book-copyright-holder'})
+        #issn = self._find(content, 'dd', {'id': 'abstract-about-book-series-print-issn'})
+        doi = self._find(content, 'dd', {'class': 'doi'})
+        #subtitle = self._find(content, 'dd', {'id': 'abstract-about-book-series-subtitle'})
+        #online_isbn = self._find(content, 'dd', {'id': 'abstract-about-book-online-isbn'})
+        #print_isbn = self._find(content, 'dd', {'id': 'abstract-about-book-print-isbn'})
         editors = []
         editors_affiliations = []
-        for editor in self.content.findAll('li', attrs={'itemprop': 'editor'}):
+        for editor in content.findAll('li', attrs={'itemprop': 'editor'}):
             editors.append(editor.find('a').text)
             try:
                 editors_affiliations.append(editor.find('sup')['title'])
@@ -140,7 +210,7 @@ class SpringerCrawler(object):
                 editors_affiliations.append('')
         authors = []
         authors_affiliations = []
-        summary = self.content.find('div', attrs={'class': 'summary'})
+        summary = content.find('div', attrs={'class': 'summary'})
         for author in summary.findAll('li', attrs={'itemprop': 'author'}):
             author_name = author.find('a').text
             author_names = []
@@ -157,7 +227,7 @@ class SpringerCrawler(object):
                 authors_affiliations.append('')
         try:
             attrs = {'id': 'abstract-actions-download-chapter-pdf-link'}
-            fulltext = self.content.find('a', attrs=attrs)
+            fulltext = content.find('a', attrs=attrs)
             fulltext = urlparse.urljoin(self.base_url, fulltext['href'])
         except TypeError:
             fulltext = ''
@@ -215,7 +285,7 @@ class SpringerCrawler(object):
 
         references = []
         ref_fields = []
-        references_container = self.content.find('div', attrs={'id': 'abstract-references'})
+        references_container = content.find('div', attrs={'id': 'abstract-references'})
         if references_container:
             references = references_container.findAll('li')
             for reference in references:
@@ -252,10 +322,14 @@ class SpringerCrawler(object):
 
 if __name__ == '__main__':
     usage = """
-        python springer_crawler.py url_to_crawl [outputfile]
+        python springer_crawler.py [-c concurrency] [-r rate] url_to_crawl [outputfile]
+
+        -c, --concurrency   pages fetched at once from the Springer host
+        -r, --rate          pages requested per second from the Springer host
     """
     try:
-        opts, args = getopt.getopt(sys.argv[1:], "")
+        opts, args = getopt.getopt(sys.argv[1:], "c:r:",
+                                   ["concurrency=", "rate="])
         if len(args) > 2:
             raise getopt.GetoptError("Too many arguments given!!!")
         elif not args:
@@ -264,7 +338,13 @@ if __name__ == '__main__':
         print(str(err))  # will print something like "option -a not recognized"
         print(usage)
         sys.exit(2)
-    sc = SpringerCrawler()
+    options = {}
+    for opt, val in opts:
+        if opt in ("-c", "--concurrency"):
+            options['concurrency'] = int(val)
+        elif opt in ("-r", "--rate"):
+            options['rate'] = float(val)
+    sc = SpringerCrawler(**options)
     url = args[0]
     if len(args) > 1:
         outfile = args[1]
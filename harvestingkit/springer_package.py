@@ -28,7 +28,8 @@ from invenio.config import (CFG_PREFIX,
                             CFG_LOGDIR)
 from os.path import (join,
                      walk,
-                     exists)
+                     exists,
+                     basename)
 try:
     from invenio.config import CFG_SPRINGER_DOWNLOADDIR
 except ImportError:
@@ -37,10 +38,11 @@ except ImportError:
 
 from invenio.errorlib import register_exception
 from invenio.shellutils import run_shell_command
-from harvestingkit.ftp_utils import FtpHandler
+from harvestingkit.ftp_utils import FtpHandler, FtpListingCache
 from os import listdir, fdopen
 from .scoap3utils import (LoginException,
-                          NoNewFiles)
+                          NoNewFiles,
+                          extract_packages)
 from .jats_utils import JATSParser
 from .app_utils import APPParser
 from tempfile import mkdtemp, mkstemp
@@ -50,16 +52,29 @@ from configparser import load_config
 
 from .config import (CFG_CONFIG_PATH,
                      CFG_DTDS_PATH,
+                     CFG_EXTRACTION_PROCESSES,
+                     CFG_SPRINGER_PACKAGE_MEMBERS,
                      CFG_FTP_CONNECTION_ATTEMPTS,
                      CFG_FTP_TIMEOUT_SLEEP_DURATION)
 
 from .utils import create_logger
+from .instrumentation import count, log_summary, timed
+from .metrics import report_metrics
+from .harvest_state import (HarvestState,
+                            STATUS_DONE,
+                            STATUS_EXTRACTED,
+                            STATUS_FAILED)
 
 
 CFG_SPRINGER_AV24_PATH = join(CFG_DTDS_PATH, 'A++V2.4.zip')
 CFG_SPRINGER_JATS_PATH = join(CFG_DTDS_PATH, 'jats-archiving-dtd-1.0.zip')
 
 CFG_TAR_FILES = join(CFG_SPRINGER_DOWNLOADDIR, "tar_files")
+# An article directory contains either a JATS or an A++ XML file.
+CFG_SPRINGER_ARTICLE_MARKERS = [('*nlm.xml*',), ('*.xml.scoap*',)]
+CFG_HARVEST_STATE_DB = join(CFG_SPRINGER_DOWNLOADDIR, "harvest_state.db")
+CFG_FTP_LISTING_CACHE = join(CFG_SPRINGER_DOWNLOADDIR,
+                             "ftp_listing_cache.json")
 
 
 class SpringerPackage(object):
@@ -106,16 +121,19 @@ class SpringerPackage(object):
 
         self.ftp.cd('data/in')
 
+        listing_cache = FtpListingCache(CFG_FTP_LISTING_CACHE)
+        epjc_files = self.ftp.ls("EPJC", cache=listing_cache)[0]
+        jhep_files = self.ftp.ls("JHEP", cache=listing_cache)[0]
+        listing_cache.save()
+
         if phrase:
             self.epjc_list.extend(filter(lambda x: phrase in x and ".zip" in x,
-                                         self.ftp.ls("EPJC")[0]))
+                                         epjc_files))
             self.jhep_list.extend(filter(lambda x: phrase in x and ".zip" in x,
-                                         self.ftp.ls("JHEP")[0]))
+                                         jhep_files))
         else:
-            self.epjc_list.extend(filter(lambda x: ".zip" in x,
-                                         self.ftp.ls("EPJC")[0]))
-            self.jhep_list.extend(filter(lambda x: ".zip" in x,
-                                         self.ftp.ls("JHEP")[0]))
+            self.epjc_list.extend(filter(lambda x: ".zip" in x, epjc_files))
+            self.jhep_list.extend(filter(lambda x: ".zip" in x, jhep_files))
 
         self.files_list.extend(map(lambda x: "EPJC/" + x,
                                    self.epjc_list))
@@ -123,16 +141,22 @@ class SpringerPackage(object):
                                    self.jhep_list))
 
         if new_only:
-            tmp_our_dir = []
-            for di in ["EPJC/", "JHEP/"]:
-                try:
-                    tmp_our_dir.extend(map(lambda x: di + x,
-                                           listdir(join(CFG_TAR_FILES, di))))
-                except OSError:  # folders does not exists nothing to do
-                    pass
-
-            self.files_list = set(self.files_list) - set(tmp_our_dir)
-
+            if self.state.is_empty():
+                # First run with the state store: import what was
+                # processed before from the local copies.
+                tmp_our_dir = []
+                for di in ["EPJC/", "JHEP/"]:
+                    try:
+                        tmp_our_dir.extend(map(lambda x: di + x,
+                                               listdir(join(CFG_TAR_FILES,
+                                                            di))))
+                    except OSError:  # folders does not exists nothing to do
+                        pass
+                self.state.seed(tmp_our_dir)
+
+            self.files_list = self.state.filter_new(self.files_list)
+
+        count('packages.seen', len(self.files_list))
         return self.files_list
 
     def _download_tars(self, check_integrity=True):
@@ -154,8 +178,10 @@ class SpringerPackage(object):
 
                 try:
                     self.ftp.download(filename, CFG_TAR_FILES)
+                    count('packages.downloaded')
                     self.packages_delivery.append((filename[0:-4],
                                                    datetime.now()))
+                    self.state.add_package(filename, unpack_path)
                 except:
                     self.logger.error("Error downloading tar file: %s"
                                       % (filename,))
@@ -181,17 +207,26 @@ class SpringerPackage(object):
 
         self.packages_delivery = []
         self.doi_package_name_mapping = []
+        self.state = HarvestState(CFG_HARVEST_STATE_DB)
+        # extraction directory -> name of the package on the server
+        self.unpacked_packages = {}
+        # extraction directory -> its article directories, once extracted
+        self.extracted_articles = {}
+        self.found_articles = []
 
         if not path and package_name:
             self.logger.info("Got package: %s" % (package_name,))
-            self.path = self._extract_packages()
+            self._crawl_springer_and_find_main_xml(self._extract_packages())
         elif not path and not package_name:
             print "Starting harvest"
             self.run()
-        self._crawl_springer_and_find_main_xml()
+        else:
+            self._crawl_springer_and_find_main_xml()
 
         self.extract_nations = extract_nations
 
+    @report_metrics('springer', start=True)
+    @timed('springer.harvest')
     def run(self):
         try:
             self.connect()
@@ -203,39 +238,60 @@ class SpringerPackage(object):
             return
         except NoNewFiles:
             return
-        self._extract_packages()
+        self._crawl_springer_and_find_main_xml(self._extract_packages())
 
     def _extract_packages(self):
         """
-        Extract a package in a new directory.
+        Extract the packages in new directories, in parallel.
+
+        Yields the extraction directory and the article directories of
+        each package as soon as it is extracted, in order of completion.
         """
         self.path_unpacked = []
+        self.extracted_articles = {}
         if not hasattr(self, "retrieved_packages_unpacked"):
             self.retrieved_packages_unpacked = [self.package_name]
+        packages = []
         for path in self.retrieved_packages_unpacked:
-            self.logger.debug("Extracting package: %s" % (path,))
-
             p_name = 'EPJC' if 'EPJC' in path else 'JHEP'
             p_message = 'scoap3_package_%s_%s_' % (p_name, datetime.now())
 
             self.path_unpacked.append(mkdtemp(prefix=p_message,
                                               dir=CFG_TMPSHAREDDIR))
-
-            try:
-                ZipFile(path).extractall(self.path_unpacked[-1])
-            except Exception:
-                register_exception(alert_admin=True,
-                                   prefix="Springer error extracting package.")
-                self.logger.error("Error extraction package file: %s"
-                                  % (path,))
-
-        return self.path_unpacked
-
-    def _crawl_springer_and_find_main_xml(self):
+            packages.append((path, self.path_unpacked[-1]))
+
+            if path.startswith(CFG_TAR_FILES):
+                package = path[len(CFG_TAR_FILES):].lstrip('/')
+            else:
+                package = basename(path)
+            self.unpacked_packages[self.path_unpacked[-1]] = package
+
+        self.logger.debug("Extracting %i packages." % (len(packages),))
+        for path, unpacked, article_dirs in extract_packages(
+                packages, self.logger,
+                patterns=CFG_SPRINGER_PACKAGE_MEMBERS,
+                article_markers=CFG_SPRINGER_ARTICLE_MARKERS,
+                processes=CFG_EXTRACTION_PROCESSES):
+            self.logger.debug("Extracted package: %s" % (path,))
+            self.extracted_articles[unpacked] = article_dirs
+            self.state.set_status(self.unpacked_packages[unpacked],
+                                  STATUS_EXTRACTED)
+            yield unpacked, article_dirs
+        for unpacked in self.path_unpacked:
+            if unpacked not in self.extracted_articles:
+                self.state.set_status(self.unpacked_packages[unpacked],
+                                      STATUS_FAILED)
+
+    def _crawl_springer_and_find_main_xml(self, extracted=None):
         """
         A package contains several subdirectory corresponding to each article.
         An article is actually identified by the existence of a main.pdf and
         a main.xml in a given directory.
+
+        extracted, when given, yields the extraction directory and the
+        article directories of each package as it is extracted, see
+        _extract_packages. The articles are listed in the order of the
+        packages anyway, whichever was extracted first.
         """
         self.found_articles = []
 
@@ -252,14 +308,17 @@ class SpringerPackage(object):
                     register_exception()
                     print "ERROR: can't normalize %s: %s" % (dirname, err)
 
-        if hasattr(self, 'path_unpacked'):
-            for path in self.path_unpacked:
-                walk(path, visit, None)
+        if extracted is not None:
+            # Already found while extracting the packages.
+            found = dict(extracted)
+            for unpacked in self.path_unpacked:
+                self.found_articles.extend(found.get(unpacked, []))
         elif self.path:
             walk(self.path, visit, None)
         else:
             self.logger.info("Nothing to do.")
 
+    @timed('springer.normalize_article')
     def _normalize_article_dir_with_dtd(self, path):
         """
         TODO: main.xml from Springer assume the existence of a local DTD.
@@ -302,6 +361,8 @@ class SpringerPackage(object):
             raise ValueError(error_msg % (join(path, 'main.xml'), cmd_err))
         self.articles_normalized.append(path_normalized)
 
+    @report_metrics('springer')
+    @timed('springer.bibupload')
     def bibupload_it(self):
         if self.found_articles:
             self.logger.debug("Preparing bibupload.")
@@ -339,18 +400,22 @@ class SpringerPackage(object):
                                                 collection='SCOAP3',
                                                 logger=self.logger)
 
-                        xml_doc = parser.get_article(join(path, filename))
+                        xml_doc = parser.get_article_front(join(path,
+                                                                filename))
                         doi = parser.get_doi(xml_doc)
                         package_name = [x for x in path.split('/')
                                         if 'scoap3_package' in x]
                         if package_name:
                             doi_name_map = (package_name[0], doi)
                             self.doi_package_name_mapping.append(doi_name_map)
+                        self._record_doi(path, doi)
 
                         print >> out, rec
+                        count('articles.converted')
                         break
                     print path, i + 1, "out of", len(self.found_articles)
                 except Exception as err:
+                    count('articles.errors')
                     register_exception(alert_admin=True)
                     self.logger.error("Error creating record from: %s \n%s"
                                       % (join(path, filename), err))
@@ -358,3 +423,14 @@ class SpringerPackage(object):
             out.close()
             task_low_level_submission("bibupload", "admin", "-N",
                                       "Springer", "-i", "-r", name)
+            for unpacked, package in self.unpacked_packages.iteritems():
+                if unpacked in self.extracted_articles:
+                    self.state.set_status(package, STATUS_DONE)
+        log_summary(self.logger)
+
+    def _record_doi(self, path, doi):
+        """Store doi as produced by the package path was extracted from."""
+        for unpacked, package in self.unpacked_packages.iteritems():
+            if path.startswith(unpacked):
+                self.state.add_dois(package, [doi])
+                return
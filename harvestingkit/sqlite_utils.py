@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Base of the stores of Harvesting Kit kept in a SQLite database."""
+
+import os
+import sqlite3
+
+
+class SQLiteStore(object):
+    """
+    Store in a SQLite database, opened on first use.
+
+    Subclasses give the statements creating their tables as SCHEMA.
+
+    :param filename: path to the SQLite database. It is created, together
+                     with its folder, on first use.
+    :type filename: string
+    :param check_same_thread: refuse to use the connection from another
+                              thread than the one which opened it.
+    :type check_same_thread: bool
+    """
+
+    SCHEMA = ""
+    # Type of the TEXT values read from the database
+    TEXT_FACTORY = unicode
+
+    def __init__(self, filename=':memory:', check_same_thread=True):
+        self.filename = filename
+        self.check_same_thread = check_same_thread
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            folder = os.path.dirname(self.filename)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            self._connection = sqlite3.connect(
+                self.filename, check_same_thread=self.check_same_thread)
+            self._connection.text_factory = self.TEXT_FACTORY
+            self._connection.executescript(self.SCHEMA)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -20,6 +20,10 @@
 
 """Common data for tests."""
 
+import os
+import shutil
+import tempfile
+
 journal_mappings = {'A&A': 'Astron.Astrophys.',
                     'A&amp;A': 'Astron.Astrophys.',
                     'ApJ': 'Astrophys.J.',
@@ -37,3 +41,20 @@ aps_output = 'data/sample_aps_output.xml'
 edp_output = 'data/sample_edp_output.xml'
 ws_output = 'data/sample_ws_output.xml'
 ws_erratum_output = 'data/sample_ws_erratum_output.xml'
+
+
+class SQLiteStoreTestMixin(object):
+
+    """Create the tested SQLite store in a new folder, removed after."""
+
+    store_class = None
+    store_name = 'store.db'
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db = os.path.join(self.tmpdir, 'store', self.store_name)
+        self.store = self.store_class(self.db)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import unittest
+
+from harvestingkit.benchmarks import (TARGETS,
+                                      run_benchmarks,
+                                      format_results,
+                                      format_comparison)
+
+
+class BenchmarksTests(unittest.TestCase):
+
+    def test_run_benchmarks(self):
+        """Test the targets run and report their throughput."""
+        report = run_benchmarks(['pos', 'inspire2cds'], scale=2)
+        self.assertEqual(report['scale'], 2)
+        pos, inspire2cds = report['results']
+        self.assertEqual(pos['name'], 'pos')
+        self.assertFalse('error' in pos)
+        self.assertEqual(pos['records'], 2)
+        self.assertEqual(inspire2cds['records'], 10)
+        self.assertTrue(inspire2cds['records_per_sec'] > 0)
+        self.assertTrue(inspire2cds['peak_rss_kb'] > 0)
+        self.assertTrue('inspire2cds' in format_results(report))
+
+    def test_unknown_target(self):
+        """Test an unknown target is refused."""
+        self.assertRaises(KeyError, run_benchmarks, ['nothing'])
+
+    def test_crashed_target(self):
+        """Test a target whose process dies is reported as an error."""
+        def crash(scale, folder):
+            os._exit(3)
+        TARGETS['crash'] = crash
+        try:
+            report = run_benchmarks(['crash'], scale=1)
+        finally:
+            del TARGETS['crash']
+        self.assertEqual(report['results'],
+                         [{'name': 'crash', 'scale': 1,
+                           'error': 'Exited with code 3'}])
+        self.assertTrue('Exited with code 3' in format_results(report))
+
+    def test_format_comparison(self):
+        """Test two reports are compared target by target."""
+        old = {'results': [{'name': 'aps', 'records_per_sec': 10.0}]}
+        new = {'results': [{'name': 'aps', 'records_per_sec': 15.0},
+                           {'name': 'pos', 'records_per_sec': 5.0}]}
+        comparison = format_comparison(old, new)
+        self.assertTrue('+50.0%' in comparison)
+        self.assertFalse('pos' in comparison)
+
+    def test_targets(self):
+        """Test every publisher parser and converter is covered."""
+        for name in ('elsevier.consyn', 'elsevier.scoap3', 'aps',
+                     'world_scientific', 'edpsciences', 'edpsciences.rich',
+                     'jats', 'nlm', 'app', 'pos', 'inspire2cds',
+                     'cds2inspire', 'bibrecord.create_record',
+                     'bibrecord.record_xml_output',
+                     'minidom_utils.xml_to_text'):
+            self.assertTrue(name in TARGETS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Tests for the Elsevier ContrastOut connector."""
+
+import os
+import shutil
+import logging
+import tarfile
+import tempfile
+import unittest
+
+from harvestingkit import contrast_out
+from harvestingkit.contrast_out import ContrastOutConnector
+from harvestingkit.corpus_generator import generate_elsevier_package
+from harvestingkit.harvest_state import (HarvestState,
+                                         STATUS_EXTRACTED,
+                                         STATUS_FAILED)
+
+
+class ContrastOutConnectorTests(unittest.TestCase):
+
+    """Tests for the crawling of the extracted packages."""
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.indexes = contrast_out.CFG_DATASET_INDEXES
+        self.config_path = contrast_out.CFG_CONFIG_PATH
+        contrast_out.CFG_DATASET_INDEXES = os.path.join(self.folder,
+                                                        'indexes')
+        contrast_out.CFG_CONFIG_PATH = os.path.join(self.folder,
+                                                    'user_config.cfg')
+        with open(contrast_out.CFG_CONFIG_PATH, 'w') as config:
+            config.write('[ELSEVIER]\n')
+        generate_elsevier_package(os.path.join(self.folder, 'CERN00001S'), 5,
+                                  articles_per_issue=2, resolved=False)
+        self.conn = self._get_connector()
+
+    def tearDown(self):
+        contrast_out.CFG_DATASET_INDEXES = self.indexes
+        contrast_out.CFG_CONFIG_PATH = self.config_path
+        shutil.rmtree(self.folder)
+
+    def _get_connector(self):
+        conn = ContrastOutConnector(logging.getLogger('contrast_out_tests'))
+        conn.path_unpacked = self.folder
+        conn.files_list = ['CERN00001S.ready.xml']
+        return conn
+
+    def test_get_issues_and_articles(self):
+        """Test the issues and articles are listed from dataset.xml."""
+        issues = self.conn._get_issues()
+        self.assertEqual(len(issues), 3)
+        self.assertEqual(issues[0], os.path.join(self.folder, 'CERN00001S',
+                                                 '03702693', 'v1',
+                                                 'issue.xml'))
+        articles = self.conn._get_metadata_and_fulltex_dir()
+        self.assertEqual(len(articles), 5)
+        for article in articles:
+            self.assertTrue(os.path.exists(article['xml']))
+            self.assertTrue(article['pdf'].endswith('main.pdf'))
+            self.assertTrue(isinstance(article['xml'], str))
+
+    def test_saved_index(self):
+        """Test the manifest is parsed once and its index reused."""
+        self.conn._get_issues()
+        index = os.path.join(self.folder, 'indexes', 'CERN00001S.json')
+        self.assertTrue(os.path.exists(index))
+        articles = self.conn._get_metadata_and_fulltex_dir()
+
+        # A later run reads the saved index
+        conn = self._get_connector()
+        conn._index_dataset = None
+        self.assertEqual(conn._get_metadata_and_fulltex_dir(), articles)
+
+        # A different manifest is parsed again
+        dataset = os.path.join(self.folder, 'CERN00001S', 'dataset.xml')
+        with open(dataset) as manifest:
+            content = manifest.read()
+        with open(dataset, 'w') as manifest:
+            manifest.write(content.replace('<journal-issue>',
+                                           '<journal-issue><ml/>', 1))
+        conn = self._get_connector()
+        self.assertEqual(len(conn._get_issues()), 2)
+
+    def test_extract_packages(self):
+        """Test the articles of each package are listed once extracted."""
+        tar_name = os.path.join(self.folder, 'CERN00001S.tar')
+        with tarfile.open(tar_name, 'w') as tar:
+            tar.add(os.path.join(self.folder, 'CERN00001S'), 'CERN00001S')
+        broken = os.path.join(self.folder, 'CERN00002S.tar')
+        with open(broken, 'w') as tar:
+            tar.write('not a tar file')
+        tmpshareddir = contrast_out.CFG_TMPSHAREDDIR
+        contrast_out.CFG_TMPSHAREDDIR = self.folder
+        self.conn.state = HarvestState()
+        for path in (tar_name, broken):
+            self.conn.state.add_package(os.path.basename(path), path)
+        self.conn.retrieved_packages_unpacked = [tar_name, broken]
+        try:
+            articles = self.conn._get_metadata_and_fulltex_dir(
+                self.conn._extract_packages())
+        finally:
+            contrast_out.CFG_TMPSHAREDDIR = tmpshareddir
+        self.assertEqual(len(articles), 5)
+        unpacked = os.path.join(self.conn.path_unpacked, '0', 'CERN00001S')
+        self.assertEqual(self.conn.package_dirs, {'CERN00001S': unpacked})
+        for article in articles:
+            self.assertTrue(article['xml'].startswith(unpacked))
+            self.assertTrue(os.path.exists(article['xml']))
+        self.assertEqual(self.conn.state.get_packages(STATUS_EXTRACTED),
+                         ['CERN00001S.tar'])
+        self.assertEqual(self.conn.state.get_packages(STATUS_FAILED),
+                         ['CERN00002S.tar'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import unittest
+
+from xml.dom.minidom import parse, parseString
+
+from harvestingkit.bibrecord import BibRecordPackage, record_get_field_values
+from harvestingkit.corpus_generator import (build_app_article,
+                                            build_jats_article,
+                                            generate_elsevier_package,
+                                            generate_marcxml,
+                                            generate_oai_pmh,
+                                            generate_springer_delivery,
+                                            make_archive)
+from harvestingkit.elsevier_package import ElsevierPackage
+from harvestingkit.hindawi_bibfilter import iter_records
+
+
+class CorpusGeneratorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='harvestingkit_corpus_')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_marcxml(self):
+        """Test the MARCXML records have unique recids and DOIs."""
+        path = os.path.join(self.folder, 'records.xml')
+        generate_marcxml(path, 25)
+        package = BibRecordPackage(path)
+        package.parse()
+        records = package.get_records()
+        self.assertEqual(len(records), 25)
+        recids = [record['001'][0][3] for record in records]
+        self.assertEqual(recids, [str(recid) for recid in range(1, 26)])
+        dois = sum([record_get_field_values(record, '024', '7', code='a')
+                    for record in records], [])
+        self.assertEqual(len(dois), len(set(dois)))
+
+    def test_oai_pmh(self):
+        """Test the OAI-PMH response has the requested deleted records."""
+        path = os.path.join(self.folder, 'oai.xml')
+        generate_oai_pmh(path, 200, deleted=0.25, seed=1)
+        with open(path) as oai:
+            records = [node for node in iter_records(oai)
+                       if node.localName == 'record']
+        self.assertEqual(len(records), 200)
+        deleted = [record for record in records
+                   if record.getElementsByTagName('header')[0]
+                   .getAttribute('status') == 'deleted']
+        self.assertTrue(30 < len(deleted) < 70)
+        for record in deleted:
+            self.assertFalse(record.getElementsByTagName('metadata'))
+
+    def test_jats_article(self):
+        """Test the JATS article has the requested authors and references."""
+        document = parseString(build_jats_article(authors=40, references=7))
+        contribs = [contrib for contrib
+                    in document.getElementsByTagName('contrib')
+                    if contrib.getAttribute('contrib-type') == 'author']
+        self.assertEqual(len(contribs), 40)
+        refs = document.getElementsByTagName('ref')
+        self.assertEqual([ref.getAttribute('id') for ref in refs],
+                         ['c%d' % (number,) for number in range(1, 8)])
+
+    def test_app_article(self):
+        """Test the A++ article has the requested authors and citations."""
+        document = parseString(build_app_article(authors=5, references=30))
+        self.assertEqual(len(document.getElementsByTagName('Author')), 5)
+        self.assertEqual(len(document.getElementsByTagName('Citation')), 30)
+        # The affiliations stay after the authors
+        group = document.getElementsByTagName('AuthorGroup')[0]
+        names = [node.tagName for node in group.childNodes
+                 if node.nodeType == node.ELEMENT_NODE]
+        self.assertEqual(names, ['Author'] * 5 + ['Affiliation'] * 2)
+
+    def test_elsevier_package(self):
+        """Test the Elsevier package is crawled like a delivery."""
+        path = os.path.join(self.folder, 'CERN00001')
+        generate_elsevier_package(path, 7, articles_per_issue=3)
+        package = ElsevierPackage(path=path)
+        self.assertEqual(len(package.found_articles), 7)
+        self.assertEqual(len(package._found_issues), 3)
+        self.assertEqual(len(package._dois), 7)
+        for article in package.found_articles:
+            doi = package._get_doi(
+                parse(os.path.join(article, 'resolved_main.xml')))
+            self.assertTrue(doi in package._dois)
+        dataset = parse(os.path.join(path, 'dataset.xml'))
+        self.assertEqual(
+            len(dataset.getElementsByTagName('journal-item')), 7)
+        self.assertEqual(
+            len(dataset.getElementsByTagName('journal-issue')), 3)
+
+    def test_springer_archive(self):
+        """Test the Springer delivery is packed with its PDFs."""
+        path = os.path.join(self.folder, 'JHEP')
+        generate_springer_delivery(path, 3)
+        archive = make_archive(path, os.path.join(self.folder, 'JHEP.zip'))
+        names = zipfile.ZipFile(archive).namelist()
+        self.assertEqual(
+            len([name for name in names if name.endswith('.xml.scoap')]), 3)
+        self.assertTrue('JHEP/JOU=13130/VOL=2017.1/ISU=1/ART=2/BodyRef/PDF/'
+                        '13130_2017_Article_2.pdf' in names)
+
+    def test_elsevier_archive(self):
+        """Test the Elsevier package is packed under its name."""
+        path = os.path.join(self.folder, 'CERN00002')
+        generate_elsevier_package(path, 2, resolved=False)
+        archive = make_archive(path, os.path.join(self.folder,
+                                                  'CERN00002.tar'))
+        names = tarfile.open(archive).getnames()
+        self.assertTrue('CERN00002/dataset.xml' in names)
+        self.assertEqual(
+            len([name for name in names if name.endswith('main.xml')]), 2)
+        self.assertFalse([name for name in names if 'resolved_' in name])
+
+
+if __name__ == '__main__':
+    unittest.main()
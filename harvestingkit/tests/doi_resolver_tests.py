@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import unittest
+import pkg_resources
+
+from harvestingkit.doi_resolver import DictDOIResolver, InvenioDOIResolver
+from harvestingkit.elsevier_package import ElsevierPackage
+
+
+class CountingResolver(DictDOIResolver):
+
+    def __init__(self, *args, **kwargs):
+        super(CountingResolver, self).__init__(*args, **kwargs)
+        self.batches = []
+
+    def _lookup(self, dois):
+        self.batches.append(list(dois))
+        return super(CountingResolver, self)._lookup(dois)
+
+
+class FakeInvenioResolver(InvenioDOIResolver):
+
+    def __init__(self, fields, hits):
+        super(FakeInvenioResolver, self).__init__(run_sql=self.run_sql)
+        self.fields = fields
+        self.hits = hits
+        self.queries = []
+
+    def _search(self, pattern):
+        self.queries.append(pattern)
+        return self.hits
+
+    def run_sql(self, query, params):
+        self.queries.append(query)
+        return self.fields
+
+
+class DOIResolverTests(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = CountingResolver({'10.1/a': 1, '10.1/b': [2, 3]},
+                                         batch_size=2)
+
+    def test_prefetch_in_batches(self):
+        """Test the DOIs are resolved in batches, once each."""
+        self.resolver.prefetch(['10.1/c', '10.1/b', '10.1/a', '10.1/a', ''])
+        self.assertEqual(self.resolver.batches,
+                         [['10.1/a', '10.1/b'], ['10.1/c']])
+        self.assertEqual(self.resolver.get_recids('10.1/a'), [1])
+        self.assertEqual(self.resolver.get_recids('10.1/b'), [2, 3])
+        self.assertEqual(self.resolver.get_recids('10.1/c'), [])
+        self.assertEqual(len(self.resolver.batches), 2)
+
+    def test_get_recids_resolves_missing(self):
+        """Test a DOI which was not prefetched is resolved alone."""
+        self.assertEqual(self.resolver.get_recids('10.1/b'), [2, 3])
+        self.assertEqual(self.resolver.batches, [['10.1/b']])
+        self.resolver.clear()
+        self.resolver.get_recids('10.1/b')
+        self.assertEqual(len(self.resolver.batches), 2)
+
+    def test_invenio_lookup(self):
+        """Test the DOIs of the hits are read at once, ignoring the case."""
+        resolver = FakeInvenioResolver(
+            [(1, 1, '0247_a', '10.1/ABC'), (1, 1, '0247_2', 'DOI'),
+             (2, 1, '0247_a', '10.1/abc'), (2, 2, '0247_a', '10.1/Abc'),
+             (3, 1, '0247_a', '10.1/other')], [1, 2, 3])
+        resolver.prefetch(['10.1/abc', '10.1/aBc', '10.1/d'])
+        self.assertEqual(len(resolver.queries), 2)
+        self.assertEqual(resolver.get_recids('10.1/abc'), [1, 2])
+        self.assertEqual(resolver.get_recids('10.1/aBc'), [1, 2])
+        self.assertEqual(resolver.get_recids('10.1/d'), [])
+
+    def test_elsevier_pdfa_record(self):
+        """Test the Elsevier PDF/A records use the resolver."""
+        resolver = CountingResolver()
+        els = ElsevierPackage(no_harvest=True, doi_resolver=resolver)
+        els._dois = {}
+        source_file = pkg_resources.resource_filename(
+            'harvestingkit.tests',
+            os.path.join('data', 'sample_elsevier_document_output.xml'))
+        xml = els.get_pdfa_record(source_file)
+        self.assertEqual(resolver.batches,
+                         [['10.1016/j.nuclphysb.2015.07.011']])
+        self.assertTrue('10.1016/j.nuclphysb.2015.07.011' in xml)
+        self.assertFalse('<controlfield tag="001">' in xml)
+
+
+if __name__ == '__main__':
+    unittest.main()
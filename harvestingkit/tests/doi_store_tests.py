@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Tests for the store of the issue metadata of the DOIs."""
+
+import os
+import unittest
+
+from xml.dom.minidom import parse
+
+from harvestingkit.doi_store import DOIStore
+from harvestingkit.elsevier_package import ElsevierPackage
+from harvestingkit.corpus_generator import generate_elsevier_package
+from harvestingkit.tests import SQLiteStoreTestMixin
+
+
+class DOIStoreTests(SQLiteStoreTestMixin, unittest.TestCase):
+
+    """Tests for the store of the issue metadata of the DOIs."""
+
+    store_class = DOIStore
+    store_name = 'doi_store.db'
+
+    def test_add_issue(self):
+        """Test the DOIs of an issue are kept across connections."""
+        metadata = ('Phys. Lett. B', '0370-2693', '735', '', '1', '10',
+                    '2014', '2014-07')
+        self.assertEqual(self.store.get_issue('abc'), None)
+        self.store.add_issue('abc', {'10.1/a': metadata})
+        self.store.add_issue('def', {})
+        self.store.close()
+        store = DOIStore(self.db)
+        self.assertEqual(store.get_issue('abc'), {'10.1/a': metadata})
+        self.assertEqual(store.get_issue('def'), {})
+        self.assertEqual(store.get('10.1/a'), metadata)
+        self.assertEqual(store.get('10.1/b'), None)
+        self.assertTrue('10.1/a' in store)
+        store.close()
+
+    def test_update_issue(self):
+        """Test an issue delivered again replaces the older metadata."""
+        self.store.add_issue('abc', {'10.1/a': ('', '', '1', '', '', '',
+                                                '', '')})
+        metadata = ('\xc3\xa9', '', '2', '', '', '', '', '')
+        self.store.add_issue('def', {'10.1/a': metadata,
+                                     '10.1/b': metadata})
+        self.assertEqual(self.store.get('10.1/a'), metadata)
+        self.assertEqual(self.store.get_issue('abc'), None)
+        self.assertEqual(len(self.store.get_issue('def')), 2)
+
+    def test_older_issue(self):
+        """Test an issue which lost DOIs to a newer one is parsed again."""
+        metadata = ('', '', '1', '', '', '', '', '')
+        self.store.add_issue('v1', {'10.1/a': metadata, '10.1/b': metadata})
+        self.store.add_issue('v2', {'10.1/a': metadata})
+        self.assertEqual(self.store.get_issue('v1'), None)
+        self.assertEqual(self.store.get_issue('v2'), {'10.1/a': metadata})
+        self.assertEqual(self.store.get('10.1/b'), metadata)
+        # The older version delivered again is recorded again in full
+        self.store.add_issue('v1', {'10.1/a': metadata, '10.1/b': metadata})
+        self.assertEqual(len(self.store.get_issue('v1')), 2)
+        self.assertEqual(self.store.get_issue('v2'), None)
+
+    def test_elsevier_package(self):
+        """Test the issues read in an earlier run are not parsed again."""
+        path = os.path.join(self.tmpdir, 'CERN00001')
+        generate_elsevier_package(path, 4, articles_per_issue=2)
+        package = ElsevierPackage(path=path, doi_store=self.store)
+        self.assertEqual(len(package._dois), 4)
+
+        def fail(package, issue_path):
+            self.fail("%s is parsed again" % (issue_path,))
+        ElsevierPackage._get_issue_dois, get_issue_dois = (
+            fail, ElsevierPackage._get_issue_dois)
+        try:
+            again = ElsevierPackage(path=path, doi_store=self.store)
+        finally:
+            ElsevierPackage._get_issue_dois = get_issue_dois
+        self.assertEqual(again._dois, package._dois)
+
+        # An article of an issue which is not delivered again
+        article = os.path.join(package.found_articles[0], 'resolved_main.xml')
+        doi = package._get_doi(parse(article))
+        again._dois = {}
+        self.assertEqual(
+            again.get_publication_information(parse(article))[-1], doi)
+        self.assertEqual(again.get_publication_information(parse(article)),
+                         package.get_publication_information(parse(article)))
+
+
+if __name__ == '__main__':
+    unittest.main()
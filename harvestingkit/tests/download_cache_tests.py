@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Tests for the download cache."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import httpretty
+import requests
+
+from harvestingkit.download_cache import DownloadCache
+from harvestingkit.utils import Downloader
+
+
+class DownloadCacheTests(unittest.TestCase):
+
+    """Tests for the download cache."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = DownloadCache(os.path.join(self.tmpdir, 'cache'))
+        self.downloader = Downloader(cache=self.cache)
+        self.requests = []
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.tmpdir)
+
+    def register(self, url, body, etag):
+        def callback(request, uri, headers):
+            self.requests.append((uri, request.headers.get('If-None-Match')))
+            headers['ETag'] = etag
+            if request.headers.get('If-None-Match') == etag:
+                return (304, headers, "")
+            return (200, headers, body)
+        httpretty.register_uri(httpretty.GET, url, body=callback)
+
+    @httpretty.activate
+    def test_revalidation(self):
+        """Test that unchanged files are not downloaded again."""
+        url = "http://example.com/plots.zip"
+        self.register(url, "zip content", '"v1"')
+        self.assertEqual(self.downloader.fetch(url), "zip content")
+        self.assertEqual(self.downloader.fetch(url), "zip content")
+        self.assertEqual(self.requests, [(url, None), (url, '"v1"')])
+
+        self.register(url, "new zip content", '"v2"')
+        self.assertEqual(self.downloader.fetch(url), "new zip content")
+
+    @httpretty.activate
+    def test_error(self):
+        """Test that error pages raise and are not cached."""
+        url = "http://example.com/missing.zip"
+        httpretty.register_uri(httpretty.GET, url, body="Not Found",
+                               status=404)
+        self.assertRaises(requests.HTTPError, self.downloader.fetch, url)
+        self.assertRaises(requests.HTTPError, self.downloader.download, url)
+        self.assertEqual(self.cache.get(url), None)
+        self.assertEqual(self.cache.size(), 0)
+
+    @httpretty.activate
+    def test_evicted_meanwhile(self):
+        """Test that a body evicted before it is read is downloaded again."""
+        url = "http://example.com/plots.zip"
+        self.register(url, "zip content", '"v1"')
+        get = self.cache.get
+
+        def evicting_get(url):
+            path = get(url)
+            os.remove(path)
+            return path
+
+        target = os.path.join(self.tmpdir, 'plots.zip')
+        for read in (self.downloader.fetch,
+                     lambda url: open(self.downloader.download(
+                         url, target)).read()):
+            self.cache.get = get
+            self.downloader.fetch(url)
+            self.requests = []
+            self.cache.get = evicting_get
+            self.assertEqual(read(url), "zip content")
+            self.assertEqual(self.requests, [(url, '"v1"'), (url, None)])
+
+    @httpretty.activate
+    def test_deduplication(self):
+        """Test that the same content is stored only once."""
+        self.register("http://example.com/a.pdf", "same", '"a"')
+        self.register("http://example.com/b.pdf", "same", '"b"')
+        target = os.path.join(self.tmpdir, 'b.pdf')
+        self.downloader.download("http://example.com/a.pdf")
+        self.downloader.download("http://example.com/b.pdf", target)
+        self.assertEqual(open(target).read(), "same")
+        self.assertEqual(self.cache.size(), 4)
+
+    @httpretty.activate
+    def test_eviction(self):
+        """Test that the least recently used files are evicted."""
+        self.cache.max_size = 10
+        for name in ('a', 'b', 'c'):
+            self.register("http://example.com/" + name, name * 4, name)
+        self.downloader.fetch("http://example.com/a")
+        self.downloader.fetch("http://example.com/b")
+        self.cache.get("http://example.com/a")
+        self.downloader.fetch("http://example.com/c")
+        self.assertEqual(self.cache.size(), 8)
+        self.assertTrue(self.cache.get("http://example.com/a"))
+        self.assertEqual(self.cache.get("http://example.com/b"), None)
+        self.assertEqual(self.cache.validators("http://example.com/b"), {})
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(DownloadCacheTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
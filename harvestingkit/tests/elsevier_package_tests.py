@@ -20,11 +20,14 @@
 """Tests for Elsevier."""
 
 import os
+import time
 import unittest
 import pkg_resources
 
+from harvestingkit.bibrecord import create_record
 from harvestingkit.elsevier_package import ElsevierPackage
 from xml.dom.minidom import parse, parseString, Element
+from xml.sax.saxutils import escape
 from harvestingkit.tests import journal_mappings
 
 
@@ -188,6 +191,26 @@ class ElsevierPackageTests(unittest.TestCase):
         for ref in self.els.get_references(self.document):
             self.assertTrue(ref in references)
 
+    def test_references_refextract(self):
+        """Test the unstructured references are extracted in order."""
+        def refextract_callback(textref):
+            time.sleep(0.01 * (len(textref) % 3))
+            return ('<collection xmlns="http://www.loc.gov/MARC21/slim">'
+                    '<record><datafield tag="999" ind1="C" ind2="5">'
+                    '<subfield code="m">%s</subfield></datafield>'
+                    '</record></collection>' % (escape(textref),))
+
+        rec = create_record()
+        self.els._add_references(self.document, rec, refextract_callback)
+        extracted = [dict(field[0]) for field in rec['999']
+                     if ('9', 'refextract') in field[0]]
+        self.assertEqual([field['m'] for field in extracted],
+                         [ref[8] for ref in
+                          self.els.get_references(self.document)
+                          if ref[8] and not ref[1]])
+        self.assertEqual([field['o'] for field in extracted],
+                         ['4', '6', '10', '12', '13', '14'])
+
     def test_get_record(self):
         """Test that the whole record is correct."""
         source_file = pkg_resources.resource_filename(
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Tests for the FTP listing helpers."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from ftplib import error_perm
+
+from harvestingkit.ftp_utils import (FtpHandler,
+                                     FtpListingCache,
+                                     parse_list_line,
+                                     parse_mlsd_line)
+
+
+class FakeFTP(object):
+
+    """Minimal in-memory replacement of ftplib.FTP."""
+
+    def __init__(self, tree, mlsd=True):
+        self.tree = tree
+        self.mlsd = mlsd
+        self.current = '/'
+        self.listed = []
+
+    def pwd(self):
+        return self.current
+
+    def _resolve(self, folder):
+        if folder.startswith('/'):
+            return folder.rstrip('/') or '/'
+        if folder in ('', '.'):
+            return self.current
+        return os.path.join(self.current, folder)
+
+    def cwd(self, folder):
+        folder = self._resolve(folder)
+        if folder not in self.tree:
+            raise error_perm('550 No such directory')
+        self.current = folder
+
+    def retrlines(self, command, callback):
+        if command == 'MLSD' and not self.mlsd:
+            raise error_perm('500 Unknown command')
+        self.listed.append(self.current)
+        modify, entries = self.tree[self.current]
+        for name in sorted(entries):
+            folder = self._resolve(name)
+            if folder in self.tree:
+                if command == 'MLSD':
+                    callback('type=dir;modify=%s; %s'
+                             % (self.tree[folder][0], name))
+                else:
+                    callback('drwxr-xr-x 2 ftp ftp 4096 Jan 1 2014 %s'
+                             % (name,))
+            elif command == 'MLSD':
+                callback('type=file;size=%d;modify=%s; %s'
+                         % (entries[name], modify, name))
+            else:
+                callback('-rw-r--r-- 1 ftp ftp %d Jan 1 2014 %s'
+                         % (entries[name], name))
+
+    def sendcmd(self, command):
+        folder = self._resolve(command.split(' ', 1)[1])
+        return ('250-Listing %s\n type=dir;modify=%s; %s\n250 End'
+                % (folder, self.tree[folder][0], folder))
+
+    def close(self):
+        pass
+
+
+def get_handler(tree, mlsd=True, server='ftp.example.com'):
+    handler = FtpHandler.__new__(FtpHandler)
+    handler._server = server
+    handler._ftp = FakeFTP(tree, mlsd)
+    handler._use_mlsd = True
+    return handler
+
+
+class FtpUtilsTests(unittest.TestCase):
+
+    """Tests for the FTP listing helpers."""
+
+    def setUp(self):
+        self.tree = {'/': ('20140101000000', {'README': 10, 'EPJC': 0}),
+                     '/EPJC': ('20140102000000', {'a.zip': 20, 'old': 0}),
+                     '/EPJC/old': ('20140103000000', {'b.zip': 30})}
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_parse_mlsd_line(self):
+        """Test parsing of MLSD facts."""
+        self.assertEqual(parse_mlsd_line('Type=file;Size=12; a b.zip'),
+                         ('a b.zip', {'type': 'file', 'size': '12'}))
+
+    def test_parse_list_line(self):
+        """Test parsing of Unix LIST output."""
+        self.assertEqual(
+            parse_list_line('drwxr-xr-x 2 ftp ftp 4096 Jan 1 2014 EPJC'),
+            ('EPJC', {'type': 'dir', 'size': '4096'}))
+
+    def test_ls(self):
+        """Test listing with MLSD and with the LIST fallback."""
+        for mlsd in (True, False):
+            handler = get_handler(self.tree, mlsd)
+            self.assertEqual(handler.ls(), (['README'], ['EPJC']))
+            self.assertEqual(handler.ls('EPJC'), (['a.zip'], ['old']))
+            self.assertEqual(handler._use_mlsd, mlsd)
+            self.assertEqual(handler._ftp.pwd(), '/')
+
+    def test_dir(self):
+        """Test the recursive listing keeps the depth-first order."""
+        for workers in (1, 3):
+            handler = get_handler(self.tree)
+            handler.clone = lambda: get_handler(self.tree)
+            self.assertEqual(handler.dir(workers=workers),
+                             ['README', 'EPJC/a.zip', 'EPJC/old/b.zip'])
+
+    def test_dir_cache(self):
+        """Test that unchanged folders are not listed again."""
+        cache_file = os.path.join(self.tmpdir, 'cache.json')
+        handler = get_handler(self.tree)
+        handler.dir(cache=FtpListingCache(cache_file))
+        self.assertEqual(handler._ftp.listed, ['/', '/EPJC', '/EPJC/old'])
+
+        self.tree['/EPJC/old'] = ('20140104000000', {'b.zip': 30, 'c.zip': 1})
+        handler = get_handler(self.tree)
+        self.assertEqual(handler.dir(cache=FtpListingCache(cache_file)),
+                         ['README', 'EPJC/a.zip',
+                          'EPJC/old/b.zip', 'EPJC/old/c.zip'])
+        self.assertEqual(handler._ftp.listed, ['/EPJC/old'])
+
+    def test_dir_cache_keys(self):
+        """Test the cached folders are told apart by server and path."""
+        cache = FtpListingCache()
+        handler = get_handler(self.tree)
+        self.assertEqual(handler.ls('EPJC', cache=cache),
+                         (['a.zip'], ['old']))
+        other = {'/': ('20140101000000', {'in': 0}),
+                 '/in': ('20140101000000', {'EPJC': 0}),
+                 '/in/EPJC': ('20140102000000', {'c.zip': 1})}
+        handler = get_handler(other, server='ftp.example.org')
+        self.assertEqual(handler.ls('in/EPJC', cache=cache), (['c.zip'], []))
+        handler = get_handler(other)
+        handler.cd('in')
+        self.assertEqual(handler.ls('EPJC', cache=cache), (['c.zip'], []))
+        self.assertEqual(sorted(cache._folders),
+                         [u'ftp.example.com:/EPJC',
+                          u'ftp.example.com:/in/EPJC',
+                          u'ftp.example.org:/in/EPJC'])
+
+    def test_cache_unicode(self):
+        """Test the non-ASCII names are returned as listed in the same run."""
+        cache = FtpListingCache()
+        entries = [('caf\xc3\xa9.zip', {'type': 'file', 'size': '1'})]
+        cache.put('ftp.example.com:/EPJC', '20140102000000', entries)
+        self.assertEqual(cache.get('ftp.example.com:/EPJC', '20140102000000'),
+                         entries)
+        cache.put('ftp.example.com:/old', '20140102000000',
+                  [('caf\xe9.zip', {'type': 'file'})])
+        self.assertEqual(cache.get('ftp.example.com:/old', '20140102000000'),
+                         None)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(FtpUtilsTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
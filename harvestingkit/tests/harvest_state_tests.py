@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Tests for the harvest state store."""
+
+import os
+import unittest
+
+from harvestingkit.harvest_state import (HarvestState,
+                                         STATUS_DONE,
+                                         STATUS_DOWNLOADED,
+                                         STATUS_FAILED,
+                                         file_digest)
+from harvestingkit.tests import SQLiteStoreTestMixin
+
+
+class HarvestStateTests(SQLiteStoreTestMixin, unittest.TestCase):
+
+    """Tests for the harvest state store."""
+
+    store_class = HarvestState
+    store_name = 'harvest_state.db'
+
+    def test_filter_new(self):
+        """Test that only unknown packages are returned, in order."""
+        self.assertTrue(self.store.is_empty())
+        self.store.seed(['EPJC/a.zip', 'EPJC/b.zip'])
+        self.assertFalse(self.store.is_empty())
+        names = ['EPJC/c.zip', 'EPJC/b.zip', 'EPJC/a.zip', 'JHEP/a.zip']
+        self.assertEqual(self.store.filter_new(names),
+                         ['EPJC/c.zip', 'JHEP/a.zip'])
+        many = ['%d.zip' % (i,) for i in range(1200)]
+        self.assertEqual(self.store.filter_new(many), many)
+
+    def test_filter_new_failed(self):
+        """Test that the failed packages are downloaded again."""
+        self.store.add_package('EPJC/a.zip')
+        self.store.add_package('EPJC/b.zip')
+        self.store.set_status('EPJC/b.zip', STATUS_FAILED)
+        self.assertEqual(self.store.filter_new(['EPJC/a.zip', 'EPJC/b.zip']),
+                         ['EPJC/b.zip'])
+        self.store.add_package('EPJC/b.zip')
+        self.assertEqual(self.store.filter_new(['EPJC/b.zip']), [])
+
+    def test_add_package(self):
+        """Test that size and digest are taken from the local file."""
+        path = os.path.join(self.tmpdir, 'a.zip')
+        with open(path, 'w') as fd:
+            fd.write('content')
+        self.store.add_package('EPJC/a.zip', path)
+        self.store.add_dois('EPJC/a.zip', ['10.1/a', '10.1/b'])
+        package = self.store.get_package('EPJC/a.zip')
+        self.assertEqual(package['size'], 7)
+        self.assertEqual(package['digest'], file_digest(path))
+        self.assertEqual(package['status'], STATUS_DOWNLOADED)
+        self.assertEqual(package['dois'], ['10.1/a', '10.1/b'])
+        self.assertEqual(self.store.find_package('10.1/b'), 'EPJC/a.zip')
+        self.assertEqual(self.store.get_package('EPJC/b.zip'), None)
+
+    def test_persistence(self):
+        """Test that the state survives between runs."""
+        self.store.add_package('a.zip')
+        self.store.set_status('a.zip', STATUS_DONE)
+        self.store.close()
+        state = HarvestState(self.db)
+        self.assertTrue('a.zip' in state)
+        self.assertEqual(state.get_packages(STATUS_DONE), ['a.zip'])
+        self.assertEqual(state.get_packages(STATUS_DOWNLOADED), [])
+        state.close()
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(HarvestStateTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
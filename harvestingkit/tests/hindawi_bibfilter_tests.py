@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import shutil
+import tempfile
+import unittest
+import pkg_resources
+
+from harvestingkit.bibrecord import (create_records,
+                                     record_get_field_values)
+from harvestingkit.hindawi_bibfilter import bibfilter
+
+
+class HindawiBibfilterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.filename = os.path.join(self.folder, 'hindawi.xml')
+        shutil.copy(pkg_resources.resource_filename(
+            'harvestingkit.tests',
+            os.path.join('data', 'sample_hindawi_oai.xml')), self.filename)
+        self.known = set(['oai:hindawi.com:10.1155/2014/202020',
+                          'oai:hindawi.com:10.1155/2014/303030'])
+        self.lookups = []
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def lookup(self, identifiers):
+        self.lookups.append(identifiers)
+        return self.known.intersection(identifiers)
+
+    def read_records(self, suffix):
+        with open(self.filename + suffix) as marcxml:
+            return [record for record, dummy, dummy
+                    in create_records(marcxml.read())]
+
+    def test_bibfilter(self):
+        """Test the records are split in new and updated ones."""
+        bibfilter(self.filename, lookup=self.lookup, batch_size=3)
+        self.assertEqual([len(batch) for batch in self.lookups], [3, 1])
+
+        new = self.read_records('.insert.xml')
+        self.assertEqual(len(new), 1)
+        self.assertEqual(record_get_field_values(new[0], '245', code='a'),
+                         ['A new article'])
+        self.assertEqual(record_get_field_values(new[0], '035', code='h'),
+                         ['2014-02-11T10:02:51Z'])
+        self.assertTrue('verb="ListRecords"' in
+                        record_get_field_values(new[0], '035', code='u')[0])
+
+        updated = self.read_records('.correct.xml')
+        self.assertEqual(len(updated), 2)
+        self.assertEqual(record_get_field_values(updated[0], '245', code='a'),
+                         ['An updated article'])
+        self.assertEqual(record_get_field_values(updated[1], '980', code='c'),
+                         ['DELETED'])
+
+    def test_no_updates(self):
+        """Test no file is created when there is no record for it."""
+        self.known = set()
+        bibfilter(self.filename, lookup=self.lookup)
+        self.assertTrue(os.path.exists(self.filename + '.insert.xml'))
+        self.assertFalse(os.path.exists(self.filename + '.correct.xml'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,9 +20,13 @@
 """Tests for inspire_cds_package."""
 
 import os
+import zipfile
 import unittest
+import httpretty
 import pkg_resources
 
+from StringIO import StringIO
+
 
 class TestConversions(unittest.TestCase):
 
@@ -943,5 +947,141 @@ class TestINSPIRE2CDSGeneric(unittest.TestCase):
             )
 
 
+class TestCDS2INSPIRELinks(unittest.TestCase):
+
+    """Test the conversion of the 856 links of CDS records."""
+
+    @httpretty.activate
+    def test_update_links_and_ffts(self):
+        """Test figures and plot archives are numbered in field order."""
+        from harvestingkit.bibrecord import (create_record,
+                                             record_add_field,
+                                             record_get_field_instances,
+                                             field_get_subfields)
+        from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+
+        archive = StringIO()
+        zipped = zipfile.ZipFile(archive, "w")
+        zipped.writestr("plots/a.png", "a")
+        zipped.writestr("plots/b.png", "b")
+        zipped.writestr("__MACOSX/plots/._a.png", "")
+        zipped.close()
+        httpretty.register_uri(httpretty.GET,
+                               "http://example.com/plots.zip",
+                               body=archive.getvalue())
+
+        record = create_record()
+        record_add_field(record, "856", ind1="4", subfields=[
+            ("u", "http://example.com/fig1.png"),
+            ("y", "First figure"),
+            ("z", "Figure")])
+        record_add_field(record, "856", ind1="4", subfields=[
+            ("u", "http://example.com/plots.zip")])
+        record_add_field(record, "856", ind1="4", subfields=[
+            ("u", "http://example.com/fulltext.pdf")])
+        record_add_field(record, "856", ind1="4", subfields=[
+            ("u", "http://cds.cern.ch/record/1/files/note.txt")])
+        conversion = CDS2Inspire(record)
+        conversion.update_links_and_ffts()
+
+        self.assertFalse(record_get_field_instances(record, "856", ind1="4"))
+        ffts = [field_get_subfields(field)
+                for field in record_get_field_instances(record, "FFT")]
+        self.assertEqual(len(ffts), 4)
+        self.assertEqual(ffts[0]["d"], ["00001 First figure"])
+        self.assertEqual(ffts[1]["d"], ["00002 a.png"])
+        self.assertEqual(ffts[2]["d"], ["00003 b.png"])
+        self.assertEqual(open(ffts[2]["a"][0]).read(), "b")
+        self.assertEqual(ffts[3]["t"], ["INSPIRE-PUBLIC"])
+
+
+class TestMatchAll(unittest.TestCase):
+
+    """Test the batched matching of records."""
+
+    def setUp(self):
+        """Index two of twenty records, searched through a local stand-in."""
+        from harvestingkit.bibrecord import create_record, record_add_field
+        from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+        self.index = {"035:3": [103], "035:8": [108, 118]}
+        self.searches = []
+        self.queries = []
+        self.conversions = []
+        for recid in range(20):
+            record = create_record()
+            record_add_field(record, "001", controlfield_value=str(recid))
+            self.conversions.append(CDS2Inspire(record))
+
+    def search(self, pattern):
+        self.searches.append(pattern)
+        hits = set()
+        for term in pattern.split(" OR "):
+            hits.update(self.index.get(term.strip("()"), []))
+        return sorted(hits)
+
+    def run_sql(self, query, params):
+        """Return the 035 fields of the indexed records."""
+        self.queries.append(params)
+        recids = params[1:]
+        return [(recid, 1, '035__a', term.split(":", 1)[1])
+                for term, hits in self.index.items() if term.startswith("035:")
+                for recid in hits if recid in recids]
+
+    def test_match_all(self):
+        """Test matches are found with fewer searches than records."""
+        from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+        cache = {}
+        matches = CDS2Inspire.match_all(self.conversions, batch_size=10,
+                                        search=self.search, cache=cache,
+                                        run_sql=self.run_sql)
+        self.assertEqual(matches["3"], [103])
+        self.assertEqual(matches["8"], [108, 118])
+        self.assertEqual(matches["0"], [])
+        self.assertEqual(len(matches), 20)
+        # One search and one query per batch
+        self.assertEqual(len(self.searches), 2)
+        self.assertEqual(len(self.queries), 1)
+
+        # Answers come from the cache the second time
+        self.searches = []
+        CDS2Inspire.match_all(self.conversions, search=self.search,
+                              cache=cache, run_sql=self.run_sql)
+        self.assertEqual(self.searches, [])
+
+    def test_match_all_ingested(self):
+        """Test records which all match still cost a search per batch."""
+        from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+        self.index = dict(("035:%d" % (recid,), [100 + recid])
+                          for recid in range(20))
+        matches = CDS2Inspire.match_all(self.conversions, batch_size=10,
+                                        search=self.search,
+                                        run_sql=self.run_sql)
+        self.assertEqual(matches["7"], [107])
+        self.assertEqual(matches["19"], [119])
+        self.assertEqual(len(self.searches), 2)
+        self.assertEqual(len(self.queries), 2)
+
+    def test_match_all_not_cached(self):
+        """Test the calls without a cache do not share their matches."""
+        from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+        CDS2Inspire.match_all(self.conversions, search=self.search,
+                              run_sql=self.run_sql)
+        self.index = {}
+        matches = CDS2Inspire.match_all(self.conversions, search=self.search,
+                                        run_sql=self.run_sql)
+        self.assertEqual(matches["3"], [])
+
+    def test_match_all_query(self):
+        """Test a query template is used for every record."""
+        from harvestingkit.inspire_cds_package.from_cds import CDS2Inspire
+        self.index = {"970:CDS-4": [204]}
+        matches = CDS2Inspire.match_all(self.conversions,
+                                        query="970:%(prefix)s-%(recid)s",
+                                        prefix="CDS",
+                                        search=self.search, cache={})
+        self.assertEqual(matches["4"], [204])
+        self.assertEqual(matches["5"], [])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import json
+import time
+import unittest
+import pkg_resources
+
+from harvestingkit.bibrecord import BibRecordPackage
+from harvestingkit.instrumentation import (NULL_STAGE,
+                                           Instrumentation,
+                                           stats,
+                                           timed_methods)
+from harvestingkit.inspire_cds_package.from_inspire import Inspire2CDS
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = Instrumentation(enabled=True)
+
+    def test_stage(self):
+        """Test the calls and times of a stage are collected."""
+        for seconds in (0.01, 0.03):
+            with self.stats.stage('sleep'):
+                time.sleep(seconds)
+        stage = self.stats.as_dict()['stages']['sleep']
+        self.assertEqual(stage['calls'], 2)
+        self.assertTrue(stage['seconds'] >= 0.04)
+        self.assertTrue(0.03 <= stage['max_seconds'] < stage['seconds'])
+
+    def test_disabled(self):
+        """Test nothing is collected when disabled."""
+        self.stats.disable()
+        self.assertTrue(self.stats.stage('sleep') is NULL_STAGE)
+        self.stats.count('records')
+
+        @self.stats.timed('function')
+        def function():
+            return 42
+
+        self.assertEqual(function(), 42)
+        self.assertEqual(self.stats.as_dict()['stages'], {})
+        self.assertEqual(self.stats.as_dict()['counters'], {})
+
+    def test_timed_and_counters(self):
+        """Test decorated functions and counters."""
+        @self.stats.timed('function')
+        def function(value):
+            """Documented."""
+            self.stats.count('values', value)
+            return value
+
+        self.assertEqual(function(3) + function(4), 7)
+        self.assertEqual(function.__doc__, "Documented.")
+        data = self.stats.as_dict()
+        self.assertEqual(data['stages']['function']['calls'], 2)
+        self.assertEqual(data['counters'], {'values': 7})
+        summary = self.stats.format_summary()
+        self.assertTrue('function' in summary)
+        self.assertTrue('values' in summary)
+        json.dumps(data)
+
+    def test_timed_methods(self):
+        """Test the methods of a class and of its bases are timed."""
+        class Base(object):
+            def update_base(self):
+                return 'base'
+
+        @timed_methods('child')
+        class Child(Base):
+            def update_child(self):
+                return 'child'
+
+            def other(self):
+                return 'other'
+
+        stats.reset()
+        stats.enable()
+        try:
+            child = Child()
+            self.assertEqual([child.update_base(), child.update_child(),
+                              child.other()], ['base', 'child', 'other'])
+            self.assertEqual(sorted(stats.as_dict()['stages']),
+                             ['child.update_base', 'child.update_child'])
+            self.assertEqual(Base().update_base(), 'base')
+            self.assertEqual(len(stats.as_dict()['stages']), 2)
+        finally:
+            stats.disable()
+            stats.reset()
+
+
+class ConversionInstrumentationTests(unittest.TestCase):
+
+    def setUp(self):
+        stats.reset()
+        stats.enable()
+
+    def tearDown(self):
+        stats.disable()
+        stats.reset()
+
+    def test_inspire2cds_stages(self):
+        """Test the update steps and the MARCXML output are timed."""
+        package = BibRecordPackage(pkg_resources.resource_filename(
+            'harvestingkit.tests', os.path.join('data',
+                                                'sample_inspire_oai.xml')))
+        package.parse()
+        Inspire2CDS.convert_all(package.get_records())
+        stages = stats.as_dict()['stages']
+        records = len(package.get_records())
+        self.assertEqual(stages['inspire2cds.get_record']['calls'], records)
+        self.assertEqual(stages['inspire2cds.update_authors']['calls'],
+                         records)
+        self.assertTrue(stages['bibrecord.record_xml_output']['calls']
+                        >= records)
+
+
+if __name__ == '__main__':
+    unittest.main()
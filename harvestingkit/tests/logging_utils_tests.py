@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import sys
+import shutil
+import logging
+import tempfile
+import unittest
+
+from harvestingkit import logging_utils
+from harvestingkit.logging_utils import (QueueHandler,
+                                         create_logger,
+                                         stop_queued_logging)
+
+
+class CreateLoggerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='harvestingkit_logging_')
+        self.name = 'harvestingkit.tests.%s' % (self.id(),)
+
+    def tearDown(self):
+        stop_queued_logging()
+        logger = logging.getLogger(self.name)
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        logging_utils._destinations.pop(self.name, None)
+        shutil.rmtree(self.folder)
+
+    def test_idempotent(self):
+        """Test the handlers are added once, whatever the calls."""
+        filename = os.path.join(self.folder, 'harvest.log')
+        for dummy in range(5):
+            logger = create_logger(self.name, filename, queued=False)
+        self.assertEqual(len(logger.handlers), 2)
+        create_logger(self.name, os.path.join(self.folder, 'other.log'),
+                      queued=False)
+        self.assertEqual(len(logger.handlers), 3)
+        other = logger.handlers[-1]
+        logger.removeHandler(other)
+        other.close()
+        logger.handlers[-1].stream = sys.stdout
+        logger.info('written once')
+        self.assertEqual(open(filename).read().count('written once'), 1)
+
+    def test_unwritable_file(self):
+        """Test a failing file handler can be retried."""
+        filename = os.path.join(self.folder, 'missing', 'harvest.log')
+        self.assertRaises(IOError, create_logger, self.name, filename,
+                          queued=False)
+        os.mkdir(os.path.dirname(filename))
+        logger = create_logger(self.name, filename, queued=False)
+        self.assertEqual(len(logger.handlers), 2)
+
+    def test_queued(self):
+        """Test the records are written by the listener."""
+        filename = os.path.join(self.folder, 'harvest.log')
+        for dummy in range(3):
+            logger = create_logger(self.name, filename, queued=True)
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertTrue(isinstance(logger.handlers[0], QueueHandler))
+        logging_utils._listeners[self.name].handlers[-1].stream = sys.stdout
+        logger.info('queued %s', 'record')
+        try:
+            raise ValueError('failure')
+        except ValueError:
+            logger.exception('with traceback')
+        stop_queued_logging()
+        content = open(filename).read()
+        self.assertEqual(content.count('queued record'), 1)
+        self.assertTrue('ValueError: failure' in content)
+        self.assertEqual(len(logger.handlers), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
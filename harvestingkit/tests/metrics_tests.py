@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from harvestingkit import metrics
+from harvestingkit.instrumentation import stats
+
+DATA = {
+    'elapsed': 12.5,
+    'counters': {'packages.seen': 3,
+                 'packages.downloaded': 2,
+                 'ftp.download.bytes': 4000,
+                 'articles.converted': 50,
+                 'articles.errors': 1},
+    'stages': {'ftp.download': {'calls': 2, 'seconds': 2.0,
+                                'max_seconds': 1.5},
+               'springer.bibupload': {'calls': 1, 'seconds': 5.0,
+                                      'max_seconds': 5.0}},
+}
+
+
+class MetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp(prefix='harvestingkit_metrics_')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_collect(self):
+        """Test the rates are computed from the counters and stages."""
+        report = metrics.collect('springer', DATA)
+        values = report['metrics']
+        self.assertEqual(values['packages_seen'], 3)
+        self.assertEqual(values['conversion_errors'], 1)
+        self.assertEqual(values['transfer_bytes_per_second'], 2000)
+        self.assertEqual(values['records_per_second'], 10)
+        self.assertEqual(values['run_seconds'], 12.5)
+        self.assertEqual(metrics.collect('oxford', DATA)['metrics']
+                         ['records_per_second'], 0)
+
+    def test_prometheus(self):
+        """Test the textfile format."""
+        text = metrics.format_prometheus(metrics.collect('springer', DATA))
+        lines = text.splitlines()
+        self.assertTrue('# TYPE harvestingkit_articles_converted gauge'
+                        in lines)
+        self.assertTrue('harvestingkit_articles_converted{job="springer"} '
+                        '50.0' in lines)
+        self.assertTrue('harvestingkit_stage_seconds{job="springer",'
+                        'stage="ftp.download"} 2.0' in lines)
+        self.assertEqual(len([line for line in lines
+                              if line.startswith('# TYPE '
+                                                 'harvestingkit_stage_calls')]),
+                         1)
+
+    def test_write(self):
+        """Test the metrics are written in both formats."""
+        path = metrics.write_metrics('springer', self.folder, data=DATA)
+        self.assertEqual(path, os.path.join(self.folder,
+                                            'harvestingkit_springer.prom'))
+        self.assertTrue('harvestingkit_packages_seen' in open(path).read())
+        path = metrics.write_metrics('springer', self.folder, 'json',
+                                     data=DATA)
+        self.assertEqual(json.load(open(path))['metrics']['packages_seen'],
+                         3)
+        self.assertEqual(sorted(os.listdir(self.folder)),
+                         ['harvestingkit_springer.json',
+                          'harvestingkit_springer.prom'])
+
+    def test_write_failures(self):
+        """Test a missing path or folder does not raise."""
+        self.assertEqual(metrics.write_metrics('springer', '', data=DATA),
+                         None)
+        self.assertEqual(metrics.write_metrics(
+            'springer', os.path.join(self.folder, 'missing'), data=DATA),
+            None)
+
+    def test_report_metrics(self):
+        """Test the decorated runs write the metrics, even on errors."""
+        @metrics.report_metrics('oxford')
+        def run():
+            stats.count('packages.seen', 2)
+            raise ValueError()
+
+        previous = metrics.CFG_METRICS_PATH
+        metrics.CFG_METRICS_PATH = self.folder
+        stats.reset()
+        stats.enable()
+        try:
+            self.assertRaises(ValueError, run)
+        finally:
+            metrics.CFG_METRICS_PATH = previous
+            stats.disable()
+            stats.reset()
+        content = open(os.path.join(self.folder,
+                                    'harvestingkit_oxford.prom')).read()
+        self.assertTrue('harvestingkit_packages_seen{job="oxford"} 2.0'
+                        in content)
+
+
+    def test_report_metrics_per_harvest(self):
+        """Test the report of a harvest covers its run and bibupload."""
+        @metrics.report_metrics('oxford', start=True)
+        def run():
+            stats.count('packages.seen')
+            with stats.stage('oxford.harvest'):
+                pass
+
+        @metrics.report_metrics('oxford')
+        def bibupload():
+            stats.count('articles.converted', 3)
+
+        previous = metrics.CFG_METRICS_PATH
+        metrics.CFG_METRICS_PATH = self.folder
+        stats.reset()
+        stats.enable()
+        try:
+            stats.count('packages.seen', 5)
+            run()
+            bibupload()
+            # The next harvest starts again from zero
+            run()
+            run()
+            bibupload()
+            stages = stats.as_dict()['stages']
+        finally:
+            metrics.CFG_METRICS_PATH = previous
+            stats.disable()
+            stats.reset()
+        content = open(os.path.join(self.folder,
+                                    'harvestingkit_oxford.prom')).read()
+        self.assertTrue('harvestingkit_packages_seen{job="oxford"} 1.0'
+                        in content)
+        self.assertTrue('harvestingkit_articles_converted{job="oxford"} 3.0'
+                        in content)
+        self.assertEqual(stages['oxford.harvest']['calls'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
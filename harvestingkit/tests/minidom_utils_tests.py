@@ -17,11 +17,19 @@
 ## along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
 ## 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
 import unittest
-from xml.dom.minidom import parseString
+from os.path import (join,
+                     dirname)
+from xml.dom.minidom import (parse,
+                             parseString)
 from harvestingkit.minidom_utils import (get_inner_xml,
                                          xml_to_text,
                                          get_value_in_tag,
-                                         get_attribute_in_tag)
+                                         get_attribute_in_tag,
+                                         get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         parse_front)
+from harvestingkit.tests import (__file__ as folder,
+                                 edp_test_record)
 
 sample_xml = "<Foo>"\
              "  some text"\
@@ -57,6 +65,44 @@ class MinidomUtilsTests(unittest.TestCase):
         self.assertEqual(get_attribute_in_tag(self.document, "Bar", "A"), [])
         self.assertEqual(get_attribute_in_tag(self.document, "A", "Bar"), [])
 
+    def test_get_elements_by_tag_names(self):
+        document = parseString("<a><b><c>1</c></b><c>2<c>3</c></c><d/></a>")
+        elements = get_elements_by_tag_names(document, ("a", "c", "e"))
+        for tag in ("a", "c", "e"):
+            self.assertEqual(elements[tag],
+                             document.getElementsByTagName(tag))
+        root = document.documentElement
+        elements = get_elements_by_tag_names(root, ("a", "c"))
+        self.assertEqual(elements["a"], [])
+        self.assertEqual(get_value_in_elements(elements, "c"), "1")
+        self.assertEqual(get_value_in_elements(elements, "a"), "")
+
+    def test_xml_to_text_nested(self):
+        document = parseString("<a>" + "<b> x " * 2000 + "</b>" * 2000 +
+                               "</a>")
+        self.assertEqual(xml_to_text(document), " ".join(["x"] * 2000))
+        document = parseString(
+            '<p xmlns:mml="http://www.w3.org/1998/Math/MathML">'
+            '\xc3\xa9nergie <mml:math><mml:mi>E</mml:mi></mml:math>\n</p>')
+        self.assertEqual(xml_to_text(document, delimiter=", "),
+                         '\xc3\xa9nergie, <math><mi>E</mi></math>')
+        self.assertEqual(xml_to_text(document, tag_to_remove="mml"),
+                         '\xc3\xa9nergie')
+
+    def test_parse_front(self):
+        path = join(dirname(folder), edp_test_record)
+        document = parse(path)
+        front = parse_front(path)
+        self.assertEqual(front.getElementsByTagName('back'), [])
+        self.assertEqual(front.getElementsByTagName('ref'), [])
+        self.assertTrue(document.getElementsByTagName('ref'))
+        for tag in ('article-title', 'article-id', 'journal-title', 'aff'):
+            self.assertEqual(xml_to_text(front.getElementsByTagName(tag)[0]),
+                             xml_to_text(document.getElementsByTagName(tag)[0]))
+        front = parse_front(open(path), ('journal-meta',))
+        self.assertTrue(front.getElementsByTagName('journal-title'))
+        self.assertEqual(front.getElementsByTagName('article-meta'), [])
+
 
 if __name__ == '__main__':
     suite = unittest.TestLoader().loadTestsFromTestCase(MinidomUtilsTests)
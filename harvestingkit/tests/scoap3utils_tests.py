@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+"""Tests for the SCOAP3 package utilities."""
+
+import os
+import logging
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from zipfile import ZipFile
+
+from harvestingkit.scoap3utils import (PackageReader,
+                                       FileTypeError,
+                                       extract_packages,
+                                       find_article_dirs)
+
+package_content = {'CERN001/0001/main.xml': '<article><doi>10.1/a</doi></article>',
+                   'CERN001/0001/main.pdf': '%PDF-1.4',
+                   'CERN001/0001/fx1.jpg': 'JPEG',
+                   'CERN001/issue.xml': '<issue/>'}
+
+
+class PackageReaderTests(unittest.TestCase):
+
+    """Tests for reading packages without extracting them."""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        source = os.path.join(self.tmpdir, 'source')
+        for name, content in package_content.items():
+            path = os.path.join(source, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as fd:
+                fd.write(content)
+        self.tar = os.path.join(self.tmpdir, 'CERN001.tar.gz')
+        with tarfile.open(self.tar, 'w:gz') as tar:
+            tar.add(os.path.join(source, 'CERN001'), 'CERN001')
+        self.zip = os.path.join(self.tmpdir, 'CERN001.zip')
+        with ZipFile(self.zip, 'w') as package:
+            for name in package_content:
+                package.write(os.path.join(source, name), name)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_names(self):
+        """Test listing the members matching patterns."""
+        for package in (self.tar, self.zip):
+            with PackageReader(package) as reader:
+                self.assertEqual(sorted(reader.names()),
+                                 sorted(package_content))
+                self.assertEqual(sorted(reader.names('*.xml')),
+                                 ['CERN001/0001/main.xml',
+                                  'CERN001/issue.xml'])
+
+    def test_iter_documents(self):
+        """Test parsing XML members straight from the package."""
+        for package in (self.tar, self.zip):
+            with PackageReader(package) as reader:
+                documents = dict(reader.iter_documents('main.xml'))
+                doc = documents['CERN001/0001/main.xml']
+                self.assertEqual(doc.getElementsByTagName('doi')[0]
+                                 .firstChild.data, '10.1/a')
+                self.assertEqual(reader.open('CERN001/0001/main.pdf').read(),
+                                 '%PDF-1.4')
+
+    def test_extract(self):
+        """Test extracting only some of the members."""
+        for package in (self.tar, self.zip):
+            target = tempfile.mkdtemp(dir=self.tmpdir)
+            with PackageReader(package) as reader:
+                reader.extract(target, 'main.*')
+            self.assertTrue(os.path.exists(
+                os.path.join(target, 'CERN001/0001/main.pdf')))
+            self.assertFalse(os.path.exists(
+                os.path.join(target, 'CERN001/0001/fx1.jpg')))
+            self.assertFalse(os.path.exists(
+                os.path.join(target, 'CERN001/issue.xml')))
+
+    def test_wrong_type(self):
+        """Test that only TAR and ZIP files are accepted."""
+        self.assertRaises(FileTypeError, PackageReader, 'package.rar')
+
+
+    def test_find_article_dirs(self):
+        """Test finding the article directories from file names."""
+        filenames = ['a/main.xml', 'a/main.pdf', 'b/main.xml',
+                     'c/x_nlm.xml', 'issue.xml']
+        self.assertEqual(find_article_dirs(filenames,
+                                           [('main.xml', 'main.pdf')]),
+                         ['a'])
+        self.assertEqual(find_article_dirs(filenames,
+                                           [('main.xml',), ('*nlm.xml',)]),
+                         ['a', 'b', 'c'])
+
+    def test_extract_packages(self):
+        """Test extracting several packages in parallel."""
+        logger = logging.getLogger('scoap3utils_tests')
+        logger.addHandler(logging.NullHandler())
+        packages = [(self.tar, os.path.join(self.tmpdir, 'tar')),
+                    (self.zip, os.path.join(self.tmpdir, 'zip')),
+                    (os.path.join(self.tmpdir, 'missing.zip'),
+                     os.path.join(self.tmpdir, 'missing'))]
+        results = sorted(extract_packages(packages, logger,
+                                          patterns=['main.*'],
+                                          article_markers=[('main.xml',
+                                                            'main.pdf')],
+                                          processes=2))
+        self.assertEqual(results, [
+            (self.tar, packages[0][1],
+             [os.path.join(packages[0][1], 'CERN001/0001')]),
+            (self.zip, packages[1][1],
+             [os.path.join(packages[1][1], 'CERN001/0001')])])
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(PackageReaderTests)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of Harvesting Kit.
+# Copyright (C) 2017 CERN.
+#
+# Harvesting Kit is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as
+# published by the Free Software Foundation; either version 2 of the
+# License, or (at your option) any later version.
+#
+# Harvesting Kit is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Harvesting Kit; if not, write to the Free Software Foundation, Inc.,
+# 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
+
+import time
+import threading
+import unittest
+import httpretty
+
+from xml.dom.minidom import parseString
+
+from harvestingkit.minidom_utils import get_value_in_tag
+from harvestingkit import springer_crawler
+from harvestingkit.springer_crawler import HostThrottle, SpringerCrawler
+from harvestingkit.utils import Downloader
+
+LISTING_PAGE = """<html><body>
+<span class="number-of-pages">%(pages)s</span>
+%(titles)s
+</body></html>"""
+
+CHAPTER_PAGE = """<html><body><div id="content">
+<h1 id="title">Chapter %(number)d</h1>
+<span id="copyright-year">2014</span>
+<dd class="doi">10.1007/978-%(number)d</dd>
+<div class="summary">
+<li itemprop="author"><a>John Smith</a></li>
+</div>
+</div></body></html>"""
+
+
+def register_book(base_url, chapters, per_page, delays=None):
+    """Serve a listing of chapters split over several pages."""
+    delays = delays or {}
+    pages = (chapters + per_page - 1) // per_page
+    for page in range(pages):
+        numbers = range(page * per_page + 1,
+                        min((page + 1) * per_page, chapters) + 1)
+        titles = "\n".join('<h3 class="title"><a href="/chapter/%d">'
+                           'Chapter %d</a></h3>' % (i, i) for i in numbers)
+        url = base_url if page == 0 else "%s/page/%d" % (base_url, page + 1)
+        httpretty.register_uri(httpretty.GET, url,
+                               body=LISTING_PAGE % {'pages': pages,
+                                                    'titles': titles})
+
+    def chapter(number):
+        def body(request, uri, headers):
+            time.sleep(delays.get(number, 0))
+            return 200, headers, CHAPTER_PAGE % {'number': number}
+        return body
+
+    for number in range(1, chapters + 1):
+        httpretty.register_uri(
+            httpretty.GET,
+            "http://link.springer.com/chapter/%d" % (number,),
+            body=chapter(number))
+
+
+class SpringerCrawlerTests(unittest.TestCase):
+
+    @httpretty.activate
+    def test_records_in_listing_order(self):
+        """Test the records keep the listing order, whatever the timing."""
+        register_book("http://link.springer.com/book/1", 5, 3,
+                      delays={1: 0.2, 2: 0.1})
+        crawler = SpringerCrawler(downloader=Downloader(), concurrency=3,
+                                  rate=None)
+        xml = parseString(crawler.get_records(
+            "http://link.springer.com/book/1").encode('utf-8'))
+        records = xml.getElementsByTagName('record')
+        self.assertEqual(len(records), 5)
+        dois = []
+        for record in records:
+            for field in record.getElementsByTagName('datafield'):
+                if field.getAttribute('tag') == '024':
+                    dois.append(get_value_in_tag(field, 'subfield'))
+        self.assertEqual(dois, ['10.1007/978-%d' % (i,) for i in range(1, 6)])
+
+
+class FakeClock(object):
+
+    """Stands for the time module, sleeping without waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class HostThrottleTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        springer_crawler.time = self.clock
+
+    def tearDown(self):
+        springer_crawler.time = time
+
+    def test_rate(self):
+        """Test requests to a host are spaced by the rate."""
+        throttle = HostThrottle(concurrency=5, rate=20)
+        for dummy in range(5):
+            with throttle.request("http://example.com/a"):
+                pass
+        self.assertEqual(len(self.clock.sleeps), 4)
+        self.assertAlmostEqual(sum(self.clock.sleeps), 0.2)
+
+    def test_hosts_are_independent(self):
+        """Test the rate of a host does not delay the others."""
+        throttle = HostThrottle(concurrency=5, rate=1)
+        for host in ("a", "b", "c"):
+            with throttle.request("http://%s.example.com/" % (host,)):
+                pass
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_concurrency(self):
+        """Test no more than concurrency requests run at once per host."""
+        throttle = HostThrottle(concurrency=2, rate=None)
+        lock = threading.Lock()
+        state = {'running': 0, 'highest': 0}
+
+        def request():
+            with throttle.request("http://example.com/"):
+                with lock:
+                    state['running'] += 1
+                    state['highest'] = max(state['highest'],
+                                           state['running'])
+                time.sleep(0.05)
+                with lock:
+                    state['running'] -= 1
+
+        threads = [threading.Thread(target=request) for dummy in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(state['highest'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,8 +18,10 @@
 # 59 Temple Place, Suite 330, Boston, MA 02111-1307, USA.
 
 import os
+import threading
 import unittest
 import httpretty
+import requests
 import tempfile
 import pkg_resources
 
@@ -31,6 +33,7 @@ from harvestingkit.utils import (record_add_field,
                                  escape_for_xml,
                                  fix_dashes,
                                  download_file,
+                                 Downloader,
                                  run_shell_command,
                                  record_xml_output,
                                  fix_title_capitalization,
@@ -38,7 +41,13 @@ from harvestingkit.utils import (record_add_field,
                                  convert_html_subscripts_to_latex,
                                  safe_title,
                                  license_is_oa,
-                                 make_user_agent)
+                                 add_nations_field,
+                                 extract_references,
+                                 get_record_fields,
+                                 get_nations,
+                                 make_user_agent,
+                                 convert_images,
+                                 PNG_SIGNATURE)
 from harvestingkit.tests import journal_mappings
 
 
@@ -184,11 +193,60 @@ class UtilsTests(unittest.TestCase):
         download_file("http://example.com/test.txt", file_name)
         self.assertEqual("Lorem ipsum\n", open(file_name).read())
 
+    @httpretty.activate
+    def test_download_error(self):
+        """Test that download errors raise instead of saving the page."""
+        httpretty.register_uri(httpretty.GET, "http://example.com/missing",
+                               body="Server Error", status=500)
+        folder = tempfile.mkdtemp()
+        file_name = os.path.join(folder, "missing")
+        downloader = Downloader()
+        self.assertRaises(requests.HTTPError, downloader.download,
+                          "http://example.com/missing", file_name)
+        self.assertFalse(os.path.exists(file_name))
+        self.assertRaises(requests.HTTPError, downloader.fetch,
+                          "http://example.com/missing")
+        result = downloader.download_many(["http://example.com/missing"])
+        self.assertTrue(isinstance(result[0], requests.HTTPError))
+
+    @httpretty.activate
+    def test_download_many(self):
+        """Test concurrent downloads keep the order of the URLs."""
+        urls = ["http://example.com/%d.txt" % (i,) for i in range(5)]
+        for i, url in enumerate(urls):
+            httpretty.register_uri(httpretty.GET, url, body="file %d" % (i,))
+        folder = tempfile.mkdtemp()
+        downloads = [(url, os.path.join(folder, str(i)))
+                     for i, url in enumerate(urls)]
+        downloader = Downloader(pool_maxsize=3)
+        results = downloader.download_many(downloads)
+        self.assertEqual(results, [name for dummy, name in downloads])
+        for i, name in enumerate(results):
+            self.assertEqual(open(name).read(), "file %d" % (i,))
+
     def test_run_shell(self):
         """Test if run_shell_command works."""
         code, out, err = run_shell_command(['echo', 'hello world'])
         self.assertEqual(out, "hello world\n")
 
+    def test_run_shell_timeout(self):
+        """Test that run_shell_command kills commands running too long."""
+        code, out, err = run_shell_command(['sleep', '10'], timeout=0.1)
+        self.assertTrue(code < 0)
+        code, out, err = run_shell_command(['echo', 'fast'], timeout=10)
+        self.assertEqual((code, out), (0, "fast\n"))
+
+    def test_convert_images(self):
+        """Test that PNG images are kept and returned in order."""
+        folder = tempfile.mkdtemp()
+        images = []
+        for name in ('b.png', 'a.jpg', 'c.gif'):
+            images.append(os.path.join(folder, name))
+            with open(images[-1], 'wb') as fd:
+                fd.write(PNG_SIGNATURE + 'data')
+        self.assertEqual(convert_images(images + [folder]), images)
+        self.assertEqual(convert_images(images[:1]), images[:1])
+
     def test_run_shell_for_xmllint(self):
         """Test if run_shell_command works for xmllint."""
         xmllint_resources = pkg_resources.resource_filename(
@@ -267,6 +325,95 @@ class UtilsTests(unittest.TestCase):
         self.assertEqual(license_is_oa("not OA"), False)
 
 
+    def test_add_nations_field(self):
+        """Test the countries are found in the affiliations."""
+        subfields = [('a', 'Doe, J.'),
+                     ('v', 'CERN, Geneva, Switzerland'),
+                     ('v', 'Dept. of Physics, Univ. of Tokyo, Japan.'),
+                     ('v', 'University of Georgia, Athens, USA')]
+        add_nations_field(subfields)
+        self.assertEqual(subfields[4:], [('w', 'CERN'), ('w', 'Japan'),
+                                         ('w', 'USA')])
+        subfields = [('v', 'Somewhere')]
+        add_nations_field(subfields)
+        self.assertEqual(subfields[1:], [('w', 'HUMAN CHECK')])
+        # The names are found in the parts, as whole words, when no part
+        # names a country
+        self.assertEqual(get_nations('INFN Sezione di Roma Italy'),
+                         ('Italy',))
+        self.assertEqual(get_nations('Indiana University, Bloomington IN '
+                                     '47405 U.S.A'), ('USA',))
+        self.assertEqual(get_nations('Seoul National University, Seoul '
+                                     '151-747 Republic of Korea'),
+                         ('South Korea',))
+        self.assertEqual(get_nations(u'Instituto de F\xedsica, UNAM, '
+                                     u'M\xe9xico'), (u'M\xe9xico'.encode(
+                                         'utf-8'),))
+        # The ambiguous names only as a whole part
+        self.assertEqual(get_nations('Jordan Hall, Tbilisi State University, '
+                                     'Georgia'), ('Georgia',))
+        self.assertEqual(get_nations('Yarmouk University, Irbid, Jordan'),
+                         ('Jordan',))
+        # A part naming a country is preferred to the names of places
+        self.assertEqual(get_nations('Lebanon Valley College, Annville PA, '
+                                     'USA'), ('USA',))
+        self.assertEqual(get_nations('Brazil Street, Springfield, USA'),
+                         ('USA',))
+        self.assertEqual(get_nations('Dept. of Physics, Brazil Street, '
+                                     'Tokyo 113-0033 Japan'), ('Japan',))
+        self.assertTrue(get_nations('Rome, Italia') is
+                        get_nations('Rome, Italia'))
+
+    def test_extract_references(self):
+        """Test the references are extracted in parallel, in order."""
+        lock = threading.Lock()
+        started = []
+        all_started = threading.Event()
+        # Whether the 4 workers were running when each callback went on
+        concurrent = []
+
+        def refextract_callback(reference):
+            with lock:
+                started.append(reference)
+                if len(started) == 4:
+                    all_started.set()
+            concurrent.append(all_started.wait(5))
+            return (u'<record><datafield tag="999" ind1="C" ind2="5">'
+                    u'<subfield code="r">%s</subfield>'
+                    u'<subfield code="m">caf\xe9</subfield>'
+                    u'</datafield></record>' % (reference,))
+
+        references = [str(number) for number in range(1, 9)]
+        extracted = extract_references(refextract_callback, references,
+                                       workers=4)
+        self.assertEqual(concurrent, [True] * len(references))
+        self.assertEqual(extracted,
+                         [[('r', reference), ('m', u'caf\xe9')]
+                          for reference in references])
+        self.assertEqual(extract_references(refextract_callback, []), [])
+
+    def test_get_record_fields(self):
+        """Test the fields of all the records are read with one query."""
+        queries = []
+
+        def run_sql(query, params):
+            queries.append((query, params))
+            return [(2, 1, '035__a', 'oai:2'), (1, 1, '035__9', 'Hindawi'),
+                    (1, 1, '035__a', 'oai:1'), (1, 2, '035__a', 'oai:3'),
+                    (2, 1, '035__9', 'arXiv')]
+
+        self.assertEqual(get_record_fields([1, 2], '035', run_sql),
+                         [(1, {'9': ['Hindawi'], 'a': ['oai:1']}),
+                          (1, {'a': ['oai:3']}),
+                          (2, {'9': ['arXiv'], 'a': ['oai:2']})])
+        self.assertEqual(len(queries), 1)
+        query, params = queries[0]
+        self.assertTrue('bibrec_bib03x' in query)
+        self.assertEqual(query.count('%s'), 3)
+        self.assertEqual(params, ['035%', 1, 2])
+        self.assertEqual(get_record_fields([], '035', run_sql), [])
+        self.assertEqual(len(queries), 1)
+
     def test_make_user_agent(self):
         """Test User-Agent string from package info."""
         self.assertIn('HarvestingKit/', make_user_agent(), 'test UA product')
@@ -28,13 +28,24 @@ import subprocess
 import logging
 import fnmatch
 import zipfile
+import threading
+import shutil
 
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from tempfile import mkdtemp, mkstemp
 from lxml import etree
 from unidecode import unidecode
 
-from .config import COMMON_ACRONYMS, OA_LICENSES
+from .config import (COMMON_ACRONYMS,
+                     NATIONS_DEFAULT_MAP,
+                     OA_LICENSES,
+                     CFG_DOWNLOAD_CACHE_PATH,
+                     CFG_DOWNLOAD_CACHE_MAX_SIZE,
+                     CFG_HTTP_POOL_CONNECTIONS,
+                     CFG_HTTP_POOL_MAXSIZE,
+                     CFG_REFEXTRACT_WORKERS)
+from .logging_utils import create_logger
 
 
 def make_user_agent(component=None):
@@ -182,26 +193,71 @@ def fix_journal_name(journal, knowledge_base):
     return journal, volume
 
 
+# Countries of the affiliations already seen, by affiliation string
+_nations_cache = {}
+_NATIONS_CACHE_SIZE = 10000
+
+# Names also used for places elsewhere (University of Georgia, Jordan
+# Hall, New England), only taken when they are a whole part of the
+# affiliation
+AMBIGUOUS_NATIONS = ('Georgia', 'Jordan', 'England')
+
+# Any other name of NATIONS_DEFAULT_MAP, as a whole word, for the
+# affiliations without a part naming a country. The longest names come
+# first in the alternation, so that 'Republic of Korea' is found rather
+# than 'Korea'.
+_NATIONS_PATTERN = re.compile(r'(?<!\w)(%s)(?!\w)' % (
+    '|'.join(re.escape(name) for name in
+             sorted(NATIONS_DEFAULT_MAP, key=len, reverse=True)
+             if name not in AMBIGUOUS_NATIONS),))
+
+
+def get_nations(affiliation):
+    """
+    Return the countries mentioned in affiliation, as in NATIONS_DEFAULT_MAP.
+
+    The comma separated parts of the affiliation naming a country are
+    taken first. Only when there is none, the names are looked for as
+    whole words in the last part, e.g. 'Bloomington IN 47405 USA', and
+    then in the whole affiliation, but for AMBIGUOUS_NATIONS. The
+    results are memoized, as the same affiliations are repeated for most
+    authors of a collaboration.
+    """
+    try:
+        return _nations_cache[affiliation]
+    except KeyError:
+        pass
+    # The names of the mapping are UTF-8 encoded
+    text = affiliation
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    parts = [part.replace('.', '') for part in text.split(', ')]
+    nations = [NATIONS_DEFAULT_MAP[part] for part in parts
+               if part in NATIONS_DEFAULT_MAP]
+    if not nations:
+        for scanned in (parts[-1], ', '.join(parts)):
+            nations = [NATIONS_DEFAULT_MAP[name]
+                       for name in _NATIONS_PATTERN.findall(scanned)]
+            if nations:
+                break
+    if 'CERN' in nations and 'Switzerland' in nations:
+        # Don't use remove in case of multiple Switzerlands
+        nations = [x for x in nations if x != 'Switzerland']
+    if len(_nations_cache) >= _NATIONS_CACHE_SIZE:
+        _nations_cache.clear()
+    _nations_cache[affiliation] = nations = tuple(nations)
+    return nations
+
+
 def add_nations_field(authors_subfields):
     """Add correct nations field according to mapping in NATIONS_DEFAULT_MAP."""
-    from .config import NATIONS_DEFAULT_MAP
-    result = []
+    result = set()
     for field in authors_subfields:
         if field[0] == 'v':
-            values = [x.replace('.', '') for x in field[1].split(', ')]
-            possible_affs = filter(lambda x: x is not None,
-                                   map(NATIONS_DEFAULT_MAP.get, values))
-            if 'CERN' in possible_affs and 'Switzerland' in possible_affs:
-                # Don't use remove in case of multiple Switzerlands
-                possible_affs = [x for x in possible_affs
-                                 if x != 'Switzerland']
-
-            result.extend(possible_affs)
-
-    result = sorted(list(set(result)))
+            result.update(get_nations(field[1]))
 
     if result:
-        authors_subfields.extend([('w', res) for res in result])
+        authors_subfields.extend([('w', res) for res in sorted(result)])
     else:
         authors_subfields.append(('w', 'HUMAN CHECK'))
 
@@ -239,52 +295,197 @@ def convert_html_subscripts_to_latex(text):
     return text
 
 
+class Downloader(object):
+    """Download files over a shared HTTP session.
+
+    Connections are pooled per host and kept alive between downloads, so
+    fetching many files from the same server pays the TCP/TLS handshake
+    only once per pooled connection.
+
+    :param pool_connections: number of hosts to keep connection pools for.
+    :param pool_maxsize: maximum number of connections kept per host.
+    :param retry_count: number of retries on connection errors.
+    :param chunk_size: size of the chunks written to disk.
+    :param cache: DownloadCache used to revalidate and deduplicate
+                  the downloaded files.
+    """
+
+    def __init__(self, pool_connections=CFG_HTTP_POOL_CONNECTIONS,
+                 pool_maxsize=CFG_HTTP_POOL_MAXSIZE, retry_count=3,
+                 chunk_size=1024 * 8, cache=None):
+        self.pool_maxsize = pool_maxsize
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry_count)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _get(self, from_url, chunk_size, use_cache=True):
+        """Request URL, revalidating the copy kept in the cache.
+
+        :return: (response, cached): the streamed response, or None and
+                 the path of the cached body when the cache is used.
+        :raises requests.HTTPError: when the server answers an error.
+        """
+        cache = self.cache if use_cache else None
+        headers = {}
+        if cache is not None:
+            headers = cache.validators(from_url)
+        response = self.session.get(from_url, stream=True, headers=headers)
+        if cache is not None and response.status_code == 304:
+            response.close()
+            cached = cache.get(from_url)
+            if cached:
+                return None, cached
+            # evicted in the meantime
+            response = self.session.get(from_url, stream=True)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        if cache is None:
+            return response, None
+        try:
+            return None, cache.store(from_url, response, chunk_size)
+        finally:
+            response.close()
+
+    def download(self, from_url, to_filename=None, chunk_size=None):
+        """Download URL to a file and return the file name.
+
+        :raises requests.HTTPError: when the server answers an error.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        response, cached = self._get(from_url, chunk_size)
+        if not to_filename:
+            to_filename = get_temporary_file()
+        if cached:
+            try:
+                shutil.copyfile(cached, to_filename)
+                return to_filename
+            except IOError:
+                # Evicted by a concurrent download in the meantime
+                response, dummy = self._get(from_url, chunk_size,
+                                            use_cache=False)
+        try:
+            with open(to_filename, 'wb') as fd:
+                for chunk in response.iter_content(chunk_size):
+                    fd.write(chunk)
+        finally:
+            response.close()
+        return to_filename
+
+    def fetch(self, url):
+        """Return the body of URL as a string.
+
+        :raises requests.HTTPError: when the server answers an error.
+        """
+        response, cached = self._get(url, self.chunk_size)
+        if cached:
+            try:
+                with open(cached, 'rb') as fd:
+                    return fd.read()
+            except IOError:
+                # Evicted by a concurrent download in the meantime
+                response, dummy = self._get(url, self.chunk_size,
+                                            use_cache=False)
+        try:
+            return response.content
+        finally:
+            response.close()
+
+    def download_many(self, downloads, workers=None):
+        """Download several URLs concurrently.
+
+        :param downloads: list of URLs or of (URL, filename) tuples.
+        :param workers: number of concurrent downloads, defaults to
+                        the size of the connection pool.
+
+        :return: a list, in the order of downloads, holding for each URL
+                 the downloaded file name or the exception raised.
+        """
+        downloads = [(item, None) if isinstance(item, basestring) else item
+                     for item in downloads]
+
+        def download(args):
+            try:
+                return self.download(*args)
+            except Exception as e:
+                return e
+
+        if len(downloads) < 2:
+            return map(download, downloads)
+        pool = ThreadPool(min(workers or self.pool_maxsize, len(downloads)))
+        try:
+            return pool.map(download, downloads)
+        finally:
+            pool.close()
+
+
+_downloaders = {}
+_downloaders_lock = threading.Lock()
+
+
+def get_downloader(retry_count=3):
+    """Return the Downloader shared by the whole process.
+
+    Downloads go through a DownloadCache when CFG_DOWNLOAD_CACHE_PATH
+    is configured.
+    """
+    from .download_cache import DownloadCache
+    with _downloaders_lock:
+        if retry_count not in _downloaders:
+            if CFG_DOWNLOAD_CACHE_PATH and '_cache' not in _downloaders:
+                _downloaders['_cache'] = DownloadCache(
+                    CFG_DOWNLOAD_CACHE_PATH, CFG_DOWNLOAD_CACHE_MAX_SIZE)
+            _downloaders[retry_count] = Downloader(
+                retry_count=retry_count, cache=_downloaders.get('_cache'))
+        return _downloaders[retry_count]
+
+
 def download_file(from_url, to_filename=None,
-                  chunk_size=1024 * 8, retry_count=3):
-    """Download URL to a file."""
-    if not to_filename:
-        to_filename = get_temporary_file()
-
-    session = requests.Session()
-    adapter = requests.adapters.HTTPAdapter(max_retries=retry_count)
-    session.mount(from_url, adapter)
-    response = session.get(from_url, stream=True)
-    with open(to_filename, 'wb') as fd:
-        for chunk in response.iter_content(chunk_size):
-            fd.write(chunk)
-    return to_filename
-
-
-def run_shell_command(commands, **kwargs):
-    """Run a shell command."""
+                  chunk_size=1024 * 8, retry_count=3, downloader=None):
+    """Download URL to a file.
+
+    The shared downloader is used unless a specific one is given.
+    """
+    if downloader is None:
+        downloader = get_downloader(retry_count)
+    return downloader.download(from_url, to_filename, chunk_size)
+
+
+def run_shell_command(commands, timeout=None, **kwargs):
+    """Run a shell command.
+
+    If timeout (in seconds) is given, the command is killed when it runs
+    for longer than that.
+    """
     p = subprocess.Popen(commands,
                          stdout=subprocess.PIPE,
                          stderr=subprocess.PIPE,
                          **kwargs)
-    output, error = p.communicate()
+    timer = None
+    if timeout is not None:
+        timer = threading.Timer(timeout, _kill_process, (p,))
+        timer.start()
+    try:
+        output, error = p.communicate()
+    finally:
+        if timer:
+            timer.cancel()
     return p.returncode, output, error
 
 
-def create_logger(name,
-                  filename=None,
-                  logging_level=logging.DEBUG):
-    """Create a logger object."""
-    logger = logging.getLogger(name)
-    formatter = logging.Formatter(('%(asctime)s - %(name)s - '
-                                   '%(levelname)-8s - %(message)s'))
-
-    if filename:
-        fh = logging.FileHandler(filename=filename)
-        fh.setFormatter(formatter)
-        logger.addHandler(fh)
-
-    ch = logging.StreamHandler()
-    ch.setFormatter(formatter)
-    logger.addHandler(ch)
-
-    logger.setLevel(logging_level)
-
-    return logger
+def _kill_process(process):
+    try:
+        process.kill()
+    except OSError:  # already finished
+        pass
 
 
 def unzip(zipped_file, output_directory=None,
@@ -418,37 +619,122 @@ def get_converted_image_name(image):
     return os.path.join(img_dir, converted_image)
 
 
-def convert_images(image_list):
+PNG_SIGNATURE = '\x89PNG\r\n\x1a\n'
+
+
+def is_png(image_file):
+    """Return True if the file starts with the PNG signature."""
+    with open(image_file, 'rb') as fd:
+        return fd.read(len(PNG_SIGNATURE)) == PNG_SIGNATURE
+
+
+def _convert_image(args):
+    """Convert a single image to PNG, used by convert_images."""
+    image_file, timeout = args
+    if is_png(image_file):
+        return image_file
+    # we're just going to assume that ImageMagick can convert all
+    # the image types that we may be faced with
+    # for sure it can do EPS->PNG and JPG->PNG and PS->PNG
+    # and PSTEX->PNG
+    converted_image_file = get_converted_image_name(image_file)
+    cmd_list = ['convert', image_file, converted_image_file]
+    exit_code, cmd_out, cmd_err = run_shell_command(cmd_list, timeout=timeout)
+    if exit_code < 0:
+        raise Exception("Timeout while converting %s" % (image_file,))
+    if cmd_err != '':
+        raise Exception(cmd_err)
+    return converted_image_file
+
+
+def convert_images(image_list, processes=4, timeout=120):
     """Convert list of images to PNG format.
 
+    Up to ``processes`` conversions run at the same time, each one being
+    killed after ``timeout`` seconds.
+
     @param: image_list ([string, string, ...]): the list of image files
         extracted from the tarball in step 1
 
     @return: image_list ([str, str, ...]): The list of image files when all
-        have been converted to PNG format.
+        have been converted to PNG format, in the same order.
     """
-    png_output_contains = 'PNG image'
-    ret_list = []
-    for image_file in image_list:
-        if os.path.isdir(image_file):
-            continue
-
-        dummy1, cmd_out, dummy2 = run_shell_command('file %s', (image_file,))
-        if cmd_out.find(png_output_contains) > -1:
-            ret_list.append(image_file)
-        else:
-            # we're just going to assume that ImageMagick can convert all
-            # the image types that we may be faced with
-            # for sure it can do EPS->PNG and JPG->PNG and PS->PNG
-            # and PSTEX->PNG
-            converted_image_file = get_converted_image_name(image_file)
-            cmd_list = ['convert', image_file, converted_image_file]
-            dummy1, cmd_out, cmd_err = run_shell_command(cmd_list)
-            if cmd_err == '':
-                ret_list.append(converted_image_file)
-            else:
-                raise Exception(cmd_err)
-    return ret_list
+    tasks = [(image_file, timeout) for image_file in image_list
+             if not os.path.isdir(image_file)]
+    if len(tasks) < 2:
+        return map(_convert_image, tasks)
+    pool = ThreadPool(min(processes, len(tasks)))
+    try:
+        return pool.map(_convert_image, tasks)
+    finally:
+        pool.close()
+
+
+def get_refextract_subfields(marcxml):
+    """Return the (code, value) subfields of the first datafield of marcxml."""
+    if isinstance(marcxml, unicode):
+        marcxml = marcxml.encode('utf-8')
+    root = etree.fromstring(marcxml)
+    datafield = next(root.iter('{*}datafield'))
+    return [(subfield.get('code'), unicode(subfield.text or ''))
+            for subfield in datafield.iter('{*}subfield')]
+
+
+def extract_references(refextract_callback, references,
+                       workers=CFG_REFEXTRACT_WORKERS):
+    """Extract the unstructured references with refextract_callback.
+
+    Up to ``workers`` references are given to the callback at the same
+    time, refextract being slow.
+
+    @param: refextract_callback (callable): returns the MARCXML of the
+        reference given as a string.
+    @param: references ([string, string, ...]): the unstructured references.
+
+    @return: ([[(code, value), ...], ...]): the subfields extracted from
+        each reference, in the same order.
+    """
+    def extract(reference):
+        return get_refextract_subfields(refextract_callback(reference))
+
+    if len(references) < 2 or workers < 2:
+        return map(extract, references)
+    pool = ThreadPool(min(workers, len(references)))
+    try:
+        return pool.map(extract, references)
+    finally:
+        pool.close()
+
+
+def get_record_fields(recids, tag, run_sql=None):
+    """Read the tag fields of many Invenio records with a single query.
+
+    @param: recids ([int, ...]): the records to read.
+    @param: tag (string): the tag of the fields, possibly followed by
+        indicators, e.g. '035' or '0247'.
+    @param: run_sql (callable): runs the query, invenio.dbquery.run_sql
+        by default.
+
+    @return: ([(recid, {code: [value, ...]}), ...]): one item per field,
+        with its subfield values by code.
+    """
+    recids = list(recids)
+    if not recids:
+        return []
+    if run_sql is None:
+        from invenio.dbquery import run_sql
+    table = "bib%sx" % (tag[:2],)
+    query = ("SELECT r.id_bibrec, r.field_number, b.tag, b.value"
+             " FROM bibrec_%s AS r JOIN %s AS b ON b.id = r.id_bibxxx"
+             " WHERE b.tag LIKE %%s AND r.id_bibrec IN (%s)"
+             % (table, table, ", ".join(["%s"] * len(recids))))
+    fields = {}
+    for recid, field_number, field_tag, value in run_sql(
+            query, [tag + "%"] + recids):
+        subfields = fields.setdefault(
+            (recid, field_tag[:5], field_number), {})
+        subfields.setdefault(field_tag[5:], []).append(value)
+    return [(key[0], fields[key]) for key in sorted(fields)]
 
 
 def get_temporary_file(prefix="tmp_",
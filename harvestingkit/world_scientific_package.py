@@ -25,7 +25,10 @@ import datetime
 
 from xml.dom.minidom import parse
 
-from harvestingkit.minidom_utils import (get_value_in_tag,
+from harvestingkit.minidom_utils import (get_elements_by_tag_names,
+                                         get_value_in_elements,
+                                         get_value_in_tag,
+                                         parse_front,
                                          xml_to_text)
 from harvestingkit.utils import (
     collapse_initials,
@@ -39,6 +42,10 @@ from harvestingkit.bibrecord import (
     record_xml_output,
 )
 from harvestingkit.jats_package import JatsPackage
+from harvestingkit.instrumentation import timed
+
+# Elements of a contrib read for its author
+AUTHOR_TAGS = ('surname', 'given-names', 'aff', 'email', 'collab')
 
 
 class DateNotFoundException(Exception):
@@ -83,7 +90,8 @@ class WorldScientific(JatsPackage):
     def get_date(self, filename):
         """Return the date of the article in file."""
         try:
-            self.document = parse(filename)
+            # The dates are in the front matter, the rest is not parsed
+            self.document = parse_front(filename)
             return self._get_date()
         except DateNotFoundException:
             print("Date problem found in {0}".format(filename))
@@ -94,20 +102,16 @@ class WorldScientific(JatsPackage):
         authors = []
         for contrib in self.document.getElementsByTagName('contrib'):
             if contrib.getAttribute('contrib-type') == 'author':
-                surname = get_value_in_tag(contrib, 'surname')
-                given_names = get_value_in_tag(contrib, 'given-names')
+                elements = get_elements_by_tag_names(contrib, AUTHOR_TAGS)
+                surname = get_value_in_elements(elements, 'surname')
+                given_names = get_value_in_elements(elements, 'given-names')
                 given_names = collapse_initials(given_names)
                 name = '%s, %s' % (surname, given_names)
                 name = safe_title(name)
-                affiliations = []
-                for aff in contrib.getElementsByTagName('aff'):
-                    affiliations.append(xml_to_text(aff))
-                emails = []
-                for email in contrib.getElementsByTagName('email'):
-                    emails.append(xml_to_text(email))
-                collaborations = []
-                for collaboration in contrib.getElementsByTagName("collab"):
-                    collaborations.append(xml_to_text(collaboration))
+                affiliations = [xml_to_text(aff) for aff in elements['aff']]
+                emails = [xml_to_text(email) for email in elements['email']]
+                collaborations = [xml_to_text(collaboration)
+                                  for collaboration in elements['collab']]
                 authors.append((name, affiliations, emails, collaborations))
         return authors
 
@@ -158,6 +162,7 @@ class WorldScientific(JatsPackage):
         else:
             return [('a', 'HEP'), ('a', 'Published')]
 
+    @timed('world_scientific.get_record')
     def get_record(self, filename, ref_extract_callback=None):
         """Get the MARCXML of the files in xaml_jp directory.
 